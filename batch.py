@@ -0,0 +1,180 @@
+"""
+Headless batch question answering: questions from a JSONL file go through the same pipeline as
+the chat box (domain check, name extraction, PokeAPI fetch, Gemini) without building the UI,
+and every answer is written as one JSONL line as soon as it is ready.
+
+    python batch.py questions.jsonl -o answers.jsonl
+    python batch.py questions.jsonl -o answers.jsonl --workers 16 --language ms
+    cat questions.jsonl | python batch.py - > answers.jsonl
+
+Input lines are objects with a "question" and optionally an "id" (default: the line number)
+and a "language" (en, ms, zh); a plain JSON string is a question on its own.
+Output lines carry id, question, language, status (ok, blocked, empty, unavailable, error),
+path, pokemon, answer and seconds. They are written in completion order, not input order.
+
+Resuming: with -o, ids already answered in the output file (status ok, blocked or empty)
+are skipped and new answers are appended, so an interrupted run is continued by running the
+same command again. --restart truncates the file instead.
+
+Questions run --workers at a time. PokeAPI lookups are shared across the whole batch:
+concurrent fetches of the same resource go out once and the response cache keeps them (on
+disk too, under POKE_DATA_DIR). Instead of the "busy" answer, a batch waits for a rate
+limiter slot (GEMINI_MAX_WAIT and POKEAPI_MAX_WAIT default to 300 s here).
+
+As a library:
+
+    from batch import answer_all
+    for result in answer_all([{'id': 1, 'question': 'Who is Pikachu?'}], workers=4):
+        print(result['id'], result['answer'])
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+DEFAULT_WORKERS = 8
+DONE_STATUSES = frozenset({'ok', 'blocked', 'empty'})  # 'unavailable' and 'error' are retried on resume
+
+
+# ============== INPUT / CHECKPOINT ==============
+
+def read_questions(lines, skip=frozenset()):
+    """Question dicts (id, question, optional language) from JSONL lines, minus ids in skip"""
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            item = json.loads(line)
+        except json.JSONDecodeError as e:
+            print(f"⚠️ Warning: skipping line {number}, not JSON ({e})", file=sys.stderr)
+            continue
+        if isinstance(item, str):
+            item = {'question': item}
+        if not isinstance(item, dict) or not isinstance(item.get('question'), str):
+            print(f"⚠️ Warning: skipping line {number}, no question", file=sys.stderr)
+            continue
+        item.setdefault('id', number)
+        if item['id'] not in skip:
+            yield item
+
+
+def load_checkpoint(path):
+    """Ids already answered in an earlier run's output file"""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # a line cut short when the run was interrupted
+            if isinstance(result, dict) and result.get('status') in DONE_STATUSES:
+                done.add(result.get('id'))
+    return done
+
+
+def open_output(path, restart=False):
+    """Output file for appending, starting on a fresh line if the last run stopped mid-write"""
+    if restart or not os.path.exists(path):
+        return open(path, 'w', encoding='utf-8')
+    torn = False
+    with open(path, 'rb') as f:
+        if f.seek(0, os.SEEK_END):
+            f.seek(-1, os.SEEK_END)
+            torn = f.read(1) != b'\n'
+    out = open(path, 'a', encoding='utf-8')
+    if torn:
+        out.write('\n')
+    return out
+
+
+# ============== ANSWERING ==============
+
+def answer_one(main, item, language='en'):
+    started = time.perf_counter()
+    language = item.get('language') or language
+    try:
+        result = main.answer_question(item['question'], language)
+        result.pop('state', None)
+    except Exception as e:
+        result = {'question': item['question'], 'language': language, 'status': 'error', 'error': f"{type(e).__name__}: {e}"}
+    result = {'id': item['id'], **result}
+    result['seconds'] = round(time.perf_counter() - started, 3)
+    return result
+
+
+def answer_all(items, workers=DEFAULT_WORKERS, language='en'):
+    """Answer question dicts ({'id', 'question', 'language'?}) with at most `workers` running at a
+    time, yielding each result as it completes. items may be a lazy iterable; only about
+    2 x workers questions are read ahead."""
+    import main
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='batch') as pool:
+        pending = set()
+        for item in items:
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+            pending.add(pool.submit(answer_one, main, item, language))
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+
+# ============== MAIN ==============
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('input', help="questions JSONL file, or - for stdin")
+    parser.add_argument('-o', '--output', help='answers JSONL file (default: stdout, no resuming)')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='questions answered at once')
+    parser.add_argument('--language', default='en', choices=('en', 'ms', 'zh'), help='language of questions without one')
+    parser.add_argument('--restart', action='store_true', help='ignore answers already in the output file')
+    args = parser.parse_args()
+
+    # Set before main reads its configuration: wait for the rate limiters rather than shed
+    os.environ.setdefault('GEMINI_MAX_WAIT', '300')
+    os.environ.setdefault('POKEAPI_MAX_WAIT', '300')
+    # Batch questions are independent of each other, so no follow-up prefetching
+    os.environ.setdefault('PREFETCH_ENABLED', '0')
+
+    done = load_checkpoint(args.output) if args.output and not args.restart else set()
+    if done:
+        print(f"↩️ Resuming: {len(done)} questions already answered", file=sys.stderr)
+    source = sys.stdin if args.input == '-' else open(args.input, encoding='utf-8')
+    out = open_output(args.output, args.restart) if args.output else sys.stdout
+    statuses = Counter()
+    started = time.perf_counter()
+    try:
+        # The app logs with print(); keep that off stdout, which may be carrying the answers
+        with contextlib.redirect_stdout(sys.stderr):
+            for result in answer_all(read_questions(source, done), args.workers, args.language):
+                out.write(json.dumps(result, ensure_ascii=False) + '\n')
+                out.flush()
+                statuses[result['status']] += 1
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if out is not sys.stdout:
+            out.close()
+
+    summary = ', '.join(f"{status}: {count}" for status, count in sorted(statuses.items())) or 'nothing to do'
+    print(f"✅ {sum(statuses.values())} answers in {time.perf_counter() - started:.1f}s ({summary})", file=sys.stderr)
+    if 'main' in sys.modules:
+        stats = sys.modules['main'].get_cache_stats()
+        print(f"📦 PokeAPI cache: {stats['misses']} fetched, {stats['coalesced']} shared, "
+              f"{stats['hits'] + stats['disk_hits']} hits", file=sys.stderr)
+    return 0 if not statuses.keys() - DONE_STATUSES else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main_cli())
@@ -0,0 +1,265 @@
+"""
+Chat pipeline benchmark, fully offline: chat_response / random_pokemon_handler against local
+PokeAPI and Gemini stand-ins (see fakes.py).
+
+    python benchmarks/bench_chat.py
+    python benchmarks/bench_chat.py --iterations 200 --pokeapi-latency 40 --gemini-first-token 300
+    python benchmarks/bench_chat.py --pokeapi-error-rate 0.05 --gemini-error-rate 0.05 --json
+    python benchmarks/bench_chat.py --scenario single --scenario vs --cold
+
+Scenarios:
+  single     - "Tell me about <name>"
+  vs         - "<a> vs <b>" comparisons
+  follow_up  - "What are its moves?" right after a lookup (only the follow-up is timed)
+  random     - the RANDOM button
+  blocked    - off-topic input stopped by the domain guard
+
+For every scenario it reports latency percentiles (whole generator drained), time to the
+first frame, calls per request to each fake service, and tracemalloc allocation peaks
+(measured in a separate pass so tracing does not skew the timings).
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fakes import FakeGenAI, FakePokeAPI  # noqa: E402
+
+NAMES = ('pikachu', 'charizard', 'garchomp', 'gengar', 'lucario', 'snorlax', 'eevee', 'dragonite', 'greninja', 'mewtwo')
+OFF_TOPIC = (
+    "Can you help me with my math homework?",
+    "What's a good pasta recipe for dinner?",
+    "Who will win the next election?",
+    "Explain the stock market to me",
+)
+
+
+# ============== SCENARIOS ==============
+# Each scenario is (setup, run): setup(i) -> (session, state) is not timed, run(i, session, state) returns the generator
+
+def _scenarios(main):
+    def fresh(i):
+        return main.SessionState(f"bench-{i}"), None
+
+    def single(i, session, state):
+        return main.chat_response(f"Tell me about {NAMES[i % len(NAMES)]}", False, state, 'en', session)
+
+    def versus(i, session, state):
+        a, b = NAMES[i % len(NAMES)], NAMES[(i + 3) % len(NAMES)]
+        return main.chat_response(f"{a} vs {b}", False, state, 'en', session)
+
+    def follow_up_setup(i):
+        session = main.SessionState(f"bench-{i}")
+        name = NAMES[i % len(NAMES)]
+        for _ in main.chat_response(f"Tell me about {name}", False, None, 'en', session):
+            pass
+        return session, name
+
+    def follow_up(i, session, state):
+        return main.chat_response("What are its moves?", False, state, 'en', session)
+
+    def random_button(i, session, state):
+        return main.random_pokemon_handler(False, state, 'en', session)
+
+    def blocked(i, session, state):
+        return main.chat_response(OFF_TOPIC[i % len(OFF_TOPIC)], False, state, 'en', session)
+
+    return {
+        'single': (fresh, single),
+        'vs': (fresh, versus),
+        'follow_up': (follow_up_setup, follow_up),
+        'random': (fresh, random_button),
+        'blocked': (fresh, blocked),
+    }
+
+
+# ============== MEASUREMENT ==============
+
+def clear_pokeapi_caches(main):
+    for cache in (main.pokeapi_cache, main.record_cache, main.learnset_cache):
+        cache.clear()
+
+
+def drain(generator):
+    """(total seconds, seconds to first frame, frames)"""
+    started = time.perf_counter()
+    first, frames = None, 0
+    for _ in generator:
+        frames += 1
+        if first is None:
+            first = time.perf_counter() - started
+    return time.perf_counter() - started, first or 0.0, frames
+
+
+def percentiles(values):
+    if len(values) < 2:
+        v = values[0] if values else 0.0
+        return {'p50': v, 'p95': v, 'p99': v}
+    cuts = statistics.quantiles(values, n=100, method='inclusive')
+    return {'p50': cuts[49], 'p95': cuts[94], 'p99': cuts[98]}
+
+
+def run_scenario(main, name, setup, run, args, pokeapi, genai):
+    for i in range(args.warmup):
+        session, state = setup(i)
+        drain(run(i, session, state))
+
+    latencies, first_frames, frame_counts, errors = [], [], [], 0
+    pokeapi_calls, genai_calls = Counter(), Counter()
+    for i in range(args.iterations):
+        session, state = setup(i)
+        if args.cold:
+            clear_pokeapi_caches(main)
+        # Count only what the timed part uses (follow_up's setup does a lookup of its own)
+        pokeapi_before, genai_before = Counter(pokeapi.calls), Counter(genai.calls)
+        try:
+            total, first, frames = drain(run(i, session, state))
+        except Exception:
+            errors += 1
+            continue
+        finally:
+            pokeapi_calls.update(Counter(pokeapi.calls) - pokeapi_before)
+            genai_calls.update(Counter(genai.calls) - genai_before)
+        latencies.append(total)
+        first_frames.append(first)
+        frame_counts.append(frames)
+
+    allocations = measure_allocations(main, setup, run, args) if args.alloc_iterations else None
+    n = max(len(latencies), 1)
+    return {
+        'scenario': name,
+        'requests': len(latencies),
+        'errors': errors,
+        'latency_ms': {k: v * 1000 for k, v in percentiles(latencies).items()},
+        'mean_ms': statistics.fmean(latencies) * 1000 if latencies else 0.0,
+        'first_frame_ms': {k: v * 1000 for k, v in percentiles(first_frames).items()},
+        'frames_per_request': statistics.fmean(frame_counts) if frame_counts else 0.0,
+        'pokeapi_calls_per_request': {k: v / n for k, v in sorted(pokeapi_calls.items())},
+        'gemini_calls_per_request': {k: v / n for k, v in sorted(genai_calls.items())},
+        'allocations': allocations,
+    }
+
+
+def measure_allocations(main, setup, run, args):
+    """Mean tracemalloc peak and retained bytes per request"""
+    peaks, retained = [], []
+    tracemalloc.start()
+    try:
+        for i in range(args.alloc_iterations):
+            session, state = setup(i)
+            if args.cold:
+                clear_pokeapi_caches(main)
+            base = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            try:
+                drain(run(i, session, state))
+            except Exception:
+                continue
+            current, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - base)
+            retained.append(current - base)
+    finally:
+        tracemalloc.stop()
+    if not peaks:
+        return None
+    return {'peak_kib': statistics.fmean(peaks) / 1024, 'retained_kib': statistics.fmean(retained) / 1024}
+
+
+# ============== MAIN ==============
+
+def load_main(args, pokeapi, genai, data_dir):
+    os.environ['POKEAPI_BASE_URL'] = pokeapi.base_url
+    os.environ['POKE_DATA_DIR'] = data_dir
+    os.environ['ANSWER_CACHE_ENABLED'] = '1' if args.answer_cache else '0'
+    if not args.rate_limits:
+        # The upstream rate limiters would otherwise set the pace of the benchmark
+        os.environ['POKEAPI_RATE'] = '0'
+        os.environ['GEMINI_RPM'] = '0'
+    os.environ.setdefault('GEMINI_API_KEY', 'offline-benchmark')
+    if args.snapshot:
+        shutil.copy(args.snapshot, os.path.join(data_dir, 'dex.bin'))
+
+    import main
+    main._genai = genai  # get_genai() returns the fake from now on
+    main.get_name_index()  # built from the fake server into the temp data dir
+    main.build_evolution_index()  # likewise, instead of in the background during the first scenario
+    return main
+
+
+def print_table(results):
+    header = f"{'scenario':<10} {'n':>5} {'p50':>8} {'p95':>8} {'p99':>8} {'first':>8} {'pokeapi':>8} {'gemini':>7} {'err':>4} {'peak KiB':>9} {'kept KiB':>9}"
+    print(header)
+    print('-' * len(header))
+    for r in results:
+        lat, alloc = r['latency_ms'], r['allocations'] or {}
+        print(
+            f"{r['scenario']:<10} {r['requests']:>5} {lat['p50']:>6.1f}ms {lat['p95']:>6.1f}ms {lat['p99']:>6.1f}ms "
+            f"{r['first_frame_ms']['p50']:>6.1f}ms {sum(r['pokeapi_calls_per_request'].values()):>8.2f} "
+            f"{sum(r['gemini_calls_per_request'].values()):>7.2f} {r['errors']:>4} "
+            f"{alloc.get('peak_kib', 0):>9.1f} {alloc.get('retained_kib', 0):>9.1f}"
+        )
+    print("\n(pokeapi / gemini = calls per request to each fake service; first = p50 time to first frame)")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenario', action='append', choices=('single', 'vs', 'follow_up', 'random', 'blocked'),
+                        help='run only these scenarios (repeatable); default all')
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--alloc-iterations', type=int, default=10, help='requests traced with tracemalloc (0 to skip)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--cold', action='store_true', help='clear the PokeAPI caches before every request')
+    parser.add_argument('--answer-cache', action='store_true', help='leave the LLM answer cache enabled')
+    parser.add_argument('--rate-limits', action='store_true', help='keep the PokeAPI/Gemini rate limiters on')
+    parser.add_argument('--snapshot', help='serve lookups from this offline dex snapshot (dex.bin)')
+    parser.add_argument('--pokeapi-latency', type=float, default=0.0, help='ms per PokeAPI response')
+    parser.add_argument('--pokeapi-jitter', type=float, default=0.0, help='extra random ms per PokeAPI response')
+    parser.add_argument('--pokeapi-error-rate', type=float, default=0.0)
+    parser.add_argument('--gemini-first-token', type=float, default=0.0, help='ms before the first Gemini chunk')
+    parser.add_argument('--gemini-chunk-latency', type=float, default=0.0, help='ms between Gemini chunks')
+    parser.add_argument('--gemini-chunks', type=int, default=8)
+    parser.add_argument('--gemini-error-rate', type=float, default=0.0)
+    parser.add_argument('--json', action='store_true')
+    parser.add_argument('--verbose', action='store_true', help="show the app's own log output")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    pokeapi = FakePokeAPI(args.pokeapi_latency / 1000, args.pokeapi_jitter / 1000, args.pokeapi_error_rate, seed=args.seed)
+    genai = FakeGenAI(args.gemini_first_token / 1000, args.gemini_chunk_latency / 1000, args.gemini_chunks,
+                      args.gemini_error_rate, seed=args.seed)
+    data_dir = tempfile.mkdtemp(prefix='bench-chat-')
+    log = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+
+    results = []
+    try:
+        with pokeapi, log:
+            main = load_main(args, pokeapi, genai, data_dir)
+            scenarios = _scenarios(main)
+            for name in args.scenario or scenarios:
+                setup, run = scenarios[name]
+                results.append(run_scenario(main, name, setup, run, args, pokeapi, genai))
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_table(results)
+
+
+if __name__ == '__main__':
+    main_cli()
@@ -0,0 +1,107 @@
+"""
+Startup benchmark: cold import of main.py and time-to-ready, each run in a fresh interpreter.
+
+    python benchmarks/bench_startup.py                # 5 runs
+    python benchmarks/bench_startup.py --runs 10 --json
+    python benchmarks/bench_startup.py --importtime   # also list the slowest imports
+
+Phases per run:
+  process      - wall time of the whole child process (interpreter start included)
+  import       - `import main`
+  create_demo  - building the Gradio UI
+  name_index   - loading the local name index
+  ready        - import + create_demo + name_index, i.e. everything before demo.launch()
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ('gradio', 'google.generativeai', 'requests', 'numpy', 'starlette')
+PHASES = ('process', 'import', 'create_demo', 'name_index', 'ready')
+
+CHILD = r'''
+import json, sys, time
+sys.path.insert(0, {root!r})
+t0 = time.perf_counter()
+import main
+t1 = time.perf_counter()
+loaded = [m for m in {heavy!r} if m in sys.modules]
+main.create_demo()
+t2 = time.perf_counter()
+main.get_name_index()
+t3 = time.perf_counter()
+print("BENCH " + json.dumps({{
+    "import": t1 - t0, "create_demo": t2 - t1, "name_index": t3 - t2, "ready": t3 - t0,
+    "loaded_by_import": loaded,
+}}))
+'''
+
+
+def run_once(importtime=False):
+    code = CHILD.format(root=ROOT, heavy=HEAVY_MODULES)
+    cmd = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', code]
+    started = time.perf_counter()
+    proc = subprocess.run(cmd, cwd=ROOT, capture_output=True, text=True)
+    elapsed = time.perf_counter() - started
+    if proc.returncode != 0:
+        raise RuntimeError(f"child failed:\n{proc.stderr[-2000:]}")
+    line = next(l for l in reversed(proc.stdout.splitlines()) if l.startswith('BENCH '))
+    result = json.loads(line[len('BENCH '):])
+    result['process'] = elapsed
+    return result, proc.stderr
+
+
+def slowest_imports(stderr, top=15):
+    """Parse `-X importtime` output into [(cumulative seconds, module)] for top-level packages"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, name = line.split(':', 1)[1].split('|')
+        name = name[1:]  # one separator space; further indentation marks nested imports
+        if not name.startswith(' '):
+            rows.append((int(cumulative_us) / 1e6, name))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--json', action='store_true', help='print the raw per-run results as JSON')
+    parser.add_argument('--importtime', action='store_true', help='list the slowest imports of the first run')
+    args = parser.parse_args()
+
+    runs, import_log = [], None
+    for i in range(args.runs):
+        result, stderr = run_once(importtime=args.importtime and i == 0)
+        if args.importtime and i == 0:
+            import_log = stderr
+            continue  # -X importtime skews the timings, keep that run out of the stats
+        runs.append(result)
+    if not runs:
+        runs.append(run_once()[0])
+
+    if args.json:
+        print(json.dumps(runs, indent=2))
+        return
+
+    print(f"{'phase':<12} {'min':>9} {'median':>9} {'max':>9}   ({len(runs)} runs)")
+    for phase in PHASES:
+        values = [r[phase] * 1000 for r in runs]
+        print(f"{phase:<12} {min(values):>7.1f}ms {statistics.median(values):>7.1f}ms {max(values):>7.1f}ms")
+    print(f"heavy modules loaded by `import main`: {', '.join(runs[0]['loaded_by_import']) or 'none'}")
+
+    if import_log:
+        print("\nslowest imports (cumulative):")
+        for seconds, name in slowest_imports(import_log):
+            print(f"  {seconds * 1000:>8.1f}ms  {name}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,306 @@
+"""
+Deterministic local stand-ins for PokeAPI and Gemini, for benchmarks that must run offline.
+
+FakePokeAPI is a threaded HTTP server with a generated dex (ids 1-898, a few real
+names at their real ids) and configurable latency, jitter and error rate. It also
+serves placeholder sprites and cries under /media, so the asset proxy stays offline too.
+FakeGenAI mimics the parts of google.generativeai that main.py uses
+(configure, GenerativeModel.generate_content with and without stream=True).
+Both count the calls they receive and seed their randomness, so two runs with the
+same settings see the same latencies and the same injected failures.
+"""
+
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+DEX_SIZE = 898
+REAL_NAMES = {
+    1: 'bulbasaur', 4: 'charmander', 6: 'charizard', 7: 'squirtle', 25: 'pikachu', 26: 'raichu',
+    94: 'gengar', 133: 'eevee', 143: 'snorlax', 149: 'dragonite', 150: 'mewtwo',
+    445: 'garchomp', 448: 'lucario', 658: 'greninja',
+}
+TYPES = ('normal', 'fire', 'water', 'electric', 'grass', 'ice', 'fighting', 'poison', 'ground',
+         'flying', 'psychic', 'bug', 'rock', 'ghost', 'dragon', 'dark', 'steel', 'fairy')
+STAT_NAMES = ('hp', 'attack', 'defense', 'special-attack', 'special-defense', 'speed')
+MOVES = ('tackle', 'thunderbolt', 'flamethrower', 'surf', 'earthquake', 'ice-beam', 'psychic', 'shadow-ball')
+ABILITIES = ('static', 'blaze', 'torrent', 'overgrow', 'levitate', 'intimidate')
+# 1x1 transparent PNG; cries get a few bytes of an Ogg header, enough for a cache entry
+PLACEHOLDER_PNG = bytes.fromhex(
+    '89504e470d0a1a0a0000000d4948445200000001000000010806000000'
+    '1f15c4890000000b49444154789c6360000200000500017a5eab3f0000'
+    '000049454e44ae426082'
+)
+PLACEHOLDER_OGG = b'OggS' + bytes(60)
+
+
+# ============== FAKE POKEAPI ==============
+
+def pokemon_name(pid):
+    return REAL_NAMES.get(pid, f"fakemon{pid}")
+
+
+def make_pokemon(pid, base_url):
+    rng = random.Random(pid)
+    name = pokemon_name(pid)
+    types = rng.sample(TYPES, rng.choice((1, 2)))
+    media = base_url.rsplit('/api/v2', 1)[0] + '/media'
+    art = f"{media}/sprites/{pid}"
+    return {
+        'id': pid,
+        'name': name,
+        'height': rng.randint(3, 30),
+        'weight': rng.randint(20, 2000),
+        'base_experience': rng.randint(50, 300),
+        'species': {'name': name, 'url': f"{base_url}/pokemon-species/{pid}/"},
+        'stats': [{'base_stat': rng.randint(30, 150), 'effort': 0, 'stat': {'name': s}} for s in STAT_NAMES],
+        'types': [{'slot': i + 1, 'type': {'name': t}} for i, t in enumerate(types)],
+        'abilities': [{'ability': {'name': rng.choice(ABILITIES)}, 'is_hidden': False, 'slot': 1}],
+        'moves': [{'move': {'name': m}} for m in rng.sample(MOVES, 4)],
+        'sprites': {
+            'front_default': f"{art}.png", 'front_shiny': f"{art}-shiny.png",
+            'other': {'official-artwork': {'front_default': f"{art}-art.png", 'front_shiny': f"{art}-art-shiny.png"}},
+        },
+        'cries': {'latest': f"{media}/cries/{pid}.ogg", 'legacy': None},
+    }
+
+
+def chain_members(chain_id):
+    """Generated evolution lines are runs of three ids: 1 -> 2 -> 3, 4 -> 5 -> 6, ..."""
+    return [pid for pid in range(3 * chain_id - 2, 3 * chain_id + 1) if pid <= DEX_SIZE]
+
+
+def make_species(pid, base_url):
+    chain_id = (pid + 2) // 3
+    parent = pid - 1 if pid > chain_members(chain_id)[0] else None
+    return {
+        'id': pid,
+        'name': pokemon_name(pid),
+        'generation': {'name': 'generation-i'},
+        'is_legendary': pid == 150,
+        'is_mythical': False,
+        'is_baby': False,
+        'capture_rate': 45,
+        'evolves_from_species': {'name': pokemon_name(parent)} if parent else None,
+        'evolution_chain': {'url': f"{base_url}/evolution-chain/{chain_id}/"},
+        'flavor_text_entries': [{'flavor_text': f"A generated Pokémon (#{pid}).", 'language': {'name': 'en'}}],
+    }
+
+
+def make_evolution_chain(chain_id, base_url):
+    node = None
+    for step, pid in reversed(list(enumerate(chain_members(chain_id)))):
+        details = [{'trigger': {'name': 'level-up'}, 'min_level': 16 * step}] if step else []
+        node = {
+            'species': {'name': pokemon_name(pid), 'url': f"{base_url}/pokemon-species/{pid}/"},
+            'evolution_details': details,
+            'evolves_to': [node] if node else [],
+        }
+    return {'id': chain_id, 'chain': node}
+
+
+def make_ability(name):
+    return {'name': name, 'effect_entries': [{'short_effect': f"Generated effect of {name}.", 'language': {'name': 'en'}}]}
+
+
+class FakePokeAPI:
+    """
+    Local PokeAPI on 127.0.0.1. `base_url` is what POKEAPI_BASE_URL should be set to.
+      latency     - seconds added to every response
+      jitter      - extra uniform random delay in [0, jitter)
+      error_rate  - fraction of requests answered with 503
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, seed=0, port=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.calls = Counter()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), self._make_handler())
+        self._server.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self._server.server_address[1]}/api/v2"
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-pokeapi', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset_counts(self):
+        with self._lock:
+            self.calls.clear()
+
+    def _draw(self):
+        """(delay, fail) for the next request, from the seeded generator"""
+        with self._lock:
+            delay = self.latency + (self._rng.random() * self.jitter if self.jitter else 0.0)
+            fail = self.error_rate > 0 and self._rng.random() < self.error_rate
+        return delay, fail
+
+    def _resolve(self, path):
+        parts = [p for p in urlparse(path).path.split('/') if p]
+        if len(parts) < 3 or parts[:2] != ['api', 'v2']:
+            return None, None
+        endpoint, key = parts[2], parts[3] if len(parts) > 3 else None
+        if endpoint == 'ability' and key in ABILITIES:
+            return endpoint, make_ability(key)
+        if endpoint == 'evolution-chain' and key and key.isdigit():
+            return endpoint, make_evolution_chain(int(key), self.base_url) if 1 <= int(key) <= (DEX_SIZE + 2) // 3 else None
+        if key is None:
+            names = {
+                'pokemon': [(pokemon_name(i), i) for i in range(1, DEX_SIZE + 1)],
+                'pokemon-species': [(pokemon_name(i), i) for i in range(1, DEX_SIZE + 1)],
+                'move': [(m, i + 1) for i, m in enumerate(MOVES)],
+                'ability': [(a, i + 1) for i, a in enumerate(ABILITIES)],
+                'evolution-chain': [(f"chain{i}", i) for i in range(1, (DEX_SIZE + 2) // 3 + 1)],
+            }.get(endpoint)
+            if names is None:
+                return endpoint, None
+            return endpoint, {
+                'count': len(names),
+                'results': [{'name': n, 'url': f"{self.base_url}/{endpoint}/{i}/"} for n, i in names],
+            }
+        pid = int(key) if key.isdigit() else next((i for i, n in REAL_NAMES.items() if n == key), None)
+        if pid is None and key.startswith('fakemon') and key[7:].isdigit():
+            pid = int(key[7:])
+        if pid is None or not 1 <= pid <= DEX_SIZE:
+            return endpoint, None
+        if endpoint == 'pokemon':
+            return endpoint, make_pokemon(pid, self.base_url)
+        if endpoint == 'pokemon-species':
+            return endpoint, make_species(pid, self.base_url)
+        return endpoint, None
+
+    def _make_handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.startswith('/media/'):
+                    # Asset downloads are not counted as API calls and never fail
+                    data = PLACEHOLDER_OGG if self.path.endswith('.ogg') else PLACEHOLDER_PNG
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'audio/ogg' if self.path.endswith('.ogg') else 'image/png')
+                    self.send_header('Content-Length', str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                    return
+                endpoint, body = api._resolve(self.path)
+                with api._lock:
+                    api.calls[endpoint or 'other'] += 1
+                delay, fail = api._draw()
+                if delay:
+                    time.sleep(delay)
+                if fail:
+                    self._send(503, {'detail': 'injected failure'})
+                elif body is None:
+                    self._send(404, {'detail': 'Not found.'})
+                else:
+                    self._send(200, body)
+
+            def _send(self, status, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+# ============== FAKE GEMINI ==============
+
+class _Usage:
+    def __init__(self, prompt_token_count):
+        self.prompt_token_count = prompt_token_count
+
+
+class _Chunk:
+    def __init__(self, text, usage=None):
+        self.text = text
+        self.usage_metadata = usage
+
+
+class FakeGenAI:
+    """
+    Drop-in for the google.generativeai module as used by main.py (assign it to main._genai).
+      first_token_latency - seconds before the first chunk (or the whole blocking answer)
+      chunk_latency       - seconds between streamed chunks
+      chunks              - number of chunks per streamed answer
+      error_rate          - fraction of calls that raise
+    Guard prompts (the ALLOWED/BLOCKED check) are answered "ALLOWED".
+    """
+
+    def __init__(self, first_token_latency=0.0, chunk_latency=0.0, chunks=8, error_rate=0.0, seed=0):
+        self.first_token_latency = first_token_latency
+        self.chunk_latency = chunk_latency
+        self.chunks = chunks
+        self.error_rate = error_rate
+        self.calls = Counter()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        fake = self
+
+        class GenerativeModel:
+            def __init__(self, model_name, **kwargs):
+                self.model_name = model_name
+
+            def generate_content(self, prompt, stream=False, **kwargs):
+                return fake._generate(prompt, stream)
+
+        self.GenerativeModel = GenerativeModel
+
+    def configure(self, **kwargs):
+        pass
+
+    def reset_counts(self):
+        with self._lock:
+            self.calls.clear()
+
+    def _fails(self):
+        with self._lock:
+            return self.error_rate > 0 and self._rng.random() < self.error_rate
+
+    def _generate(self, prompt, stream):
+        guard = '"ALLOWED" or "BLOCKED"' in prompt
+        with self._lock:
+            self.calls['guard' if guard else 'stream' if stream else 'generate'] += 1
+        fails = self._fails()
+        usage = _Usage(len(prompt) // 4)
+
+        if not stream:
+            time.sleep(self.first_token_latency)
+            if fails:
+                raise RuntimeError("injected Gemini failure")
+            return _Chunk("ALLOWED" if guard else "A generated answer about Pokémon.", usage)
+
+        def chunks():
+            time.sleep(self.first_token_latency)
+            for i in range(self.chunks):
+                if fails and i == self.chunks // 2:
+                    raise RuntimeError("injected Gemini failure mid-stream")
+                if i:
+                    time.sleep(self.chunk_latency)
+                yield _Chunk(f"Part {i + 1} of a generated answer. ", usage if i == 0 else None)
+        return chunks()
@@ -0,0 +1,603 @@
+"""
+Offline Pokédex snapshot.
+
+    python dex_snapshot.py build              # download PokeAPI once -> data/dex.bin
+    python dex_snapshot.py serve --port 8765  # replay the snapshot as a local PokeAPI
+
+The snapshot is a compact columnar file: stats live in fixed-width integer
+arrays, types and abilities are small enums and every name sits in one
+string blob addressed through an offset table. main.py memory-maps it at
+startup and serves get_pokemon_data-style lookups straight from it.
+Learnsets are stored CSR-style (one offset per Pokémon into flat move, level
+and learn-method columns) and evolution chains are rebuilt from the species
+columns, so the replay server covers every endpoint the app calls; evolution
+conditions (level, item, ...) are not kept.
+Point the app at the replay server with
+POKEAPI_BASE_URL=http://127.0.0.1:8765/api/v2 to run with no network at all.
+"""
+import argparse
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+DATA_DIR = os.getenv("POKE_DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
+DEFAULT_SNAPSHOT_PATH = os.path.join(DATA_DIR, "dex.bin")
+POKEAPI_BASE_URL = os.getenv("POKEAPI_BASE_URL", "https://pokeapi.co/api/v2").rstrip("/")
+
+MAGIC = b'PDEX'
+VERSION = 2
+HEADER = struct.Struct('<4sHH')
+SECTION_ENTRY = struct.Struct('<24sII')
+
+STAT_NAMES = ('hp', 'attack', 'defense', 'special-attack', 'special-defense', 'speed')
+NONE_U8 = 0xFF
+NONE_U16 = 0xFFFF
+
+# Per-Pokémon flags for which sprite/cry assets exist upstream
+HAS_FRONT, HAS_FRONT_SHINY, HAS_ARTWORK, HAS_ARTWORK_SHINY, HAS_CRY_LATEST, HAS_CRY_LEGACY = (1 << i for i in range(6))
+# Per-species flags
+IS_LEGENDARY, IS_MYTHICAL, IS_BABY = 1, 2, 4
+
+SPRITE_BASE = "https://raw.githubusercontent.com/PokeAPI/sprites/master/sprites/pokemon"
+CRY_BASE = "https://raw.githubusercontent.com/PokeAPI/cries/main/cries/pokemon"
+
+# How a move is learned; anything else PokeAPI lists (form changes, event moves) is 'other'
+LEARN_METHODS = ('level-up', 'machine', 'egg', 'tutor', 'other')
+
+# name -> array typecode; the order here is the order on disk
+SECTIONS = (
+    ('pokemon_ids', 'I'), ('pokemon_names', 'I'), ('pokemon_species', 'H'), ('pokemon_flags', 'B'),
+    ('height', 'H'), ('weight', 'H'), ('base_exp', 'H'),
+    ('stats', 'B'), ('types', 'B'), ('abilities', 'H'),
+    ('species_ids', 'H'), ('species_names', 'I'), ('species_generation', 'B'), ('species_flags', 'B'),
+    ('species_capture', 'B'), ('species_chain', 'H'), ('species_from', 'H'),
+    ('type_ids', 'H'), ('type_names', 'I'), ('damage', 'B'),
+    ('ability_ids', 'H'), ('ability_names', 'I'), ('ability_effects', 'I'),
+    ('move_ids', 'H'), ('move_names', 'I'),
+    ('learnset_start', 'I'), ('learnset_moves', 'H'), ('learnset_levels', 'B'), ('learnset_methods', 'B'),
+    ('strings', 'B'),
+)
+
+ROMAN = {'i': 1, 'ii': 2, 'iii': 3, 'iv': 4, 'v': 5, 'vi': 6, 'vii': 7, 'viii': 8, 'ix': 9, 'x': 10}
+
+
+def _id_from_url(url):
+    return int(url.rstrip('/').rsplit('/', 1)[1])
+
+
+# ============== BUILDER ==============
+
+def download_dex(base_url=POKEAPI_BASE_URL, workers=16):
+    """Fetch every Pokémon, species, type and ability record from PokeAPI (move names and ids
+    come from the Pokémon records' move lists)."""
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_maxsize=workers, max_retries=Retry(total=5, backoff_factor=0.5,
+                                                                  status_forcelist=(429, 500, 502, 503, 504)))
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+
+    def get(url):
+        res = session.get(url, timeout=30)
+        res.raise_for_status()
+        return res.json()
+
+    records = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for endpoint in ('pokemon', 'pokemon-species', 'type', 'ability'):
+            listing = get(f"{base_url}/{endpoint}?limit=100000")['results']
+            print(f"⬇️  {endpoint}: {len(listing)} records")
+            records[endpoint] = list(pool.map(get, [r['url'] for r in listing]))
+    return records
+
+
+class _StringTable:
+    def __init__(self):
+        self.blob = bytearray()
+
+    def offsets(self, values):
+        offsets = array('I')
+        for value in values:
+            offsets.append(len(self.blob))
+            self.blob += (value or '').encode('utf-8')
+        offsets.append(len(self.blob))
+        return offsets
+
+
+def _learned(entry):
+    """(level, learn method row) of a /pokemon move entry: the level-up level in the last version
+    group listed, else the last listed method with level 0 (same rule as main.learnset_from_pokeapi)"""
+    details = entry.get('version_group_details') or []
+    methods = [(d.get('move_learn_method') or {}).get('name') for d in details]
+    levels = [d.get('level_learned_at') or 0 for d, method in zip(details, methods) if method == 'level-up']
+    if levels:
+        return min(levels[-1], 255), 0
+    method = methods[-1] if methods else None
+    return 0, LEARN_METHODS.index(method) if method in LEARN_METHODS else len(LEARN_METHODS) - 1
+
+
+def compile_snapshot(records):
+    """Turn raw PokeAPI JSON records into the columnar sections of a snapshot file."""
+    pokemon = sorted(records['pokemon'], key=lambda p: p['id'])
+    species = sorted(records['pokemon-species'], key=lambda s: s['id'])
+    types = sorted(records['type'], key=lambda t: t['id'])
+    abilities = sorted(records['ability'], key=lambda a: a['id'])
+
+    move_ids = {}
+    for p in pokemon:
+        for entry in p.get('moves', []):
+            move = entry['move']
+            if move['name'] not in move_ids:
+                move_ids[move['name']] = _id_from_url(move['url']) if move.get('url') else 0
+    moves = sorted(move_ids, key=lambda name: (move_ids[name], name))
+    move_row = {name: i for i, name in enumerate(moves)}
+
+    species_row = {s['name']: i for i, s in enumerate(species)}
+    type_row = {t['name']: i for i, t in enumerate(types)}
+    ability_row = {a['name']: i for i, a in enumerate(abilities)}
+    strings = _StringTable()
+    cols = {name: array(code) for name, code in SECTIONS}
+
+    for p in pokemon:
+        cols['pokemon_ids'].append(p['id'])
+        cols['pokemon_species'].append(species_row.get(p['species']['name'], NONE_U16))
+        cols['height'].append(p.get('height') or 0)
+        cols['weight'].append(p.get('weight') or 0)
+        cols['base_exp'].append(p['base_experience'] if p.get('base_experience') is not None else NONE_U16)
+
+        stats = {s['stat']['name']: s['base_stat'] for s in p['stats']}
+        cols['stats'].extend(min(stats.get(name, 0), 255) for name in STAT_NAMES)
+
+        slots = [NONE_U8, NONE_U8]
+        for t in p['types'][:2]:
+            slots[t['slot'] - 1] = type_row[t['type']['name']]
+        cols['types'].extend(slots)
+
+        ability_slots = [NONE_U16] * 3
+        for a in p['abilities']:
+            ability_slots[min(a['slot'], 3) - 1] = ability_row.get(a['ability']['name'], NONE_U16)
+        cols['abilities'].extend(ability_slots)
+
+        sprites, artwork = p['sprites'], p['sprites']['other']['official-artwork']
+        cries = p.get('cries') or {}
+        flags = 0
+        for bit, present in ((HAS_FRONT, sprites.get('front_default')), (HAS_FRONT_SHINY, sprites.get('front_shiny')),
+                             (HAS_ARTWORK, artwork.get('front_default')), (HAS_ARTWORK_SHINY, artwork.get('front_shiny')),
+                             (HAS_CRY_LATEST, cries.get('latest')), (HAS_CRY_LEGACY, cries.get('legacy'))):
+            if present:
+                flags |= bit
+        cols['pokemon_flags'].append(flags)
+
+        cols['learnset_start'].append(len(cols['learnset_moves']))
+        for entry in p.get('moves', []):
+            level, method = _learned(entry)
+            cols['learnset_moves'].append(move_row[entry['move']['name']])
+            cols['learnset_levels'].append(level)
+            cols['learnset_methods'].append(method)
+    cols['learnset_start'].append(len(cols['learnset_moves']))
+    cols['pokemon_names'] = strings.offsets(p['name'] for p in pokemon)
+    cols['move_ids'] = array('H', (move_ids[name] for name in moves))
+    cols['move_names'] = strings.offsets(moves)
+
+    for s in species:
+        cols['species_ids'].append(s['id'])
+        generation = s['generation']['name'].split('-')[-1]
+        cols['species_generation'].append(ROMAN.get(generation, 0))
+        cols['species_flags'].append((IS_LEGENDARY if s.get('is_legendary') else 0)
+                                     | (IS_MYTHICAL if s.get('is_mythical') else 0)
+                                     | (IS_BABY if s.get('is_baby') else 0))
+        cols['species_capture'].append(s.get('capture_rate') or 0)
+        chain = s.get('evolution_chain')
+        cols['species_chain'].append(_id_from_url(chain['url']) if chain else NONE_U16)
+        parent = s.get('evolves_from_species')
+        cols['species_from'].append(species_row.get(parent['name'], NONE_U16) if parent else NONE_U16)
+    cols['species_names'] = strings.offsets(s['name'] for s in species)
+
+    # Damage multipliers stored x2 so 0, 0.5, 1 and 2 fit in a byte; row = attacker, column = defender
+    damage = array('B', [2] * (len(types) * len(types)))
+    for t in types:
+        relations = t.get('damage_relations') or {}
+        for key, value in (('no_damage_to', 0), ('half_damage_to', 1), ('double_damage_to', 4)):
+            for target in relations.get(key, []):
+                if target['name'] in type_row:
+                    damage[type_row[t['name']] * len(types) + type_row[target['name']]] = value
+    cols['damage'] = damage
+    cols['type_ids'] = array('H', (t['id'] for t in types))
+    cols['type_names'] = strings.offsets(t['name'] for t in types)
+
+    def short_effect(ability):
+        entry = next((e for e in ability.get('effect_entries', []) if e['language']['name'] == 'en'), None)
+        return entry['short_effect'] if entry else ''
+    cols['ability_ids'] = array('H', (a['id'] for a in abilities))
+    cols['ability_names'] = strings.offsets(a['name'] for a in abilities)
+    cols['ability_effects'] = strings.offsets(short_effect(a) for a in abilities)
+
+    cols['strings'] = array('B', bytes(strings.blob))
+    return cols
+
+
+def write_snapshot(cols, path=DEFAULT_SNAPSHOT_PATH):
+    """Write compiled sections to disk (little-endian, 8-byte aligned sections)."""
+    header_size = HEADER.size + SECTION_ENTRY.size * len(SECTIONS)
+    body = bytearray()
+    table = []
+    for name, _ in SECTIONS:
+        data = cols[name]
+        if sys.byteorder != 'little':
+            data = array(data.typecode, data)
+            data.byteswap()
+        body += b'\0' * (-(header_size + len(body)) % 8)
+        table.append((name, header_size + len(body), len(data)))
+        body += data.tobytes()
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(SECTIONS)))
+        for name, offset, length in table:
+            f.write(SECTION_ENTRY.pack(name.encode(), offset, length))
+        f.write(body)
+    os.replace(tmp_path, path)
+    return header_size + len(body)
+
+
+def build_snapshot(path=DEFAULT_SNAPSHOT_PATH, base_url=POKEAPI_BASE_URL, workers=16):
+    records = download_dex(base_url, workers)
+    size = write_snapshot(compile_snapshot(records), path)
+    print(f"✅ Wrote {path} ({size / 1024:.0f} KB, {len(records['pokemon'])} Pokémon)")
+
+
+# ============== READER ==============
+
+class DexSnapshot:
+    """Read-only, memory-mapped view of a snapshot file. Lookups decode only the
+    row they need; columns are exposed as memoryviews for vectorised consumers."""
+
+    def __init__(self, path=DEFAULT_SNAPSHOT_PATH):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} dex snapshot (rebuild it with `python dex_snapshot.py build`)")
+
+        codes = dict(SECTIONS)
+        view = memoryview(self._mm)
+        self._cols = {}
+        for i in range(count):
+            raw_name, offset, length = SECTION_ENTRY.unpack_from(self._mm, HEADER.size + i * SECTION_ENTRY.size)
+            name = raw_name.rstrip(b'\0').decode()
+            code = codes[name]
+            size = array(code).itemsize
+            column = view[offset:offset + length * size]
+            if sys.byteorder == 'little' or size == 1:
+                column = column.cast(code)
+            else:
+                swapped = array(code, column.tobytes())
+                swapped.byteswap()
+                column = memoryview(swapped)
+            self._cols[name] = column
+
+        self._pokemon_rows = {self._string('pokemon_names', i): i for i in range(len(self._cols['pokemon_ids']))}
+        self._pokemon_ids = {pid: i for i, pid in enumerate(self._cols['pokemon_ids'])}
+        self._species_rows = {self._string('species_names', i): i for i in range(len(self._cols['species_ids']))}
+        self._species_ids = {sid: i for i, sid in enumerate(self._cols['species_ids'])}
+        self.type_names = [self._string('type_names', i) for i in range(len(self._cols['type_ids']))]
+        self._type_rows = {name: i for i, name in enumerate(self.type_names)}
+        self._type_ids = {tid: i for i, tid in enumerate(self._cols['type_ids'])}
+        self._ability_rows = {self._string('ability_names', i): i for i in range(len(self._cols['ability_ids']))}
+        self._ability_ids = {aid: i for i, aid in enumerate(self._cols['ability_ids'])}
+        self._move_rows = {self._string('move_names', i): i for i in range(len(self._cols['move_ids']))}
+        self._move_ids = {mid: i for i, mid in enumerate(self._cols['move_ids'])}
+        self._chain_rows = {}  # evolution chain id -> species rows
+        for row, chain in enumerate(self._cols['species_chain']):
+            if chain != NONE_U16:
+                self._chain_rows.setdefault(chain, []).append(row)
+
+    def __len__(self):
+        return len(self._cols['pokemon_ids'])
+
+    def close(self):
+        for column in self._cols.values():
+            column.release()
+        self._cols = {}
+        self._mm.close()
+        self._file.close()
+
+    def column(self, name):
+        """Raw column (memoryview) - e.g. np.frombuffer(snapshot.column('stats'), np.uint8)"""
+        return self._cols[name]
+
+    def _string(self, section, i):
+        offsets = self._cols[section]
+        return bytes(self._cols['strings'][offsets[i]:offsets[i + 1]]).decode('utf-8')
+
+    # ---- lookups ----
+
+    @staticmethod
+    def _find(name_or_id, rows, ids):
+        key = str(name_or_id).lower()
+        if key.isdigit():
+            return ids.get(int(key))
+        return rows.get(key)
+
+    def pokemon_row(self, name_or_id):
+        return self._find(name_or_id, self._pokemon_rows, self._pokemon_ids)
+
+    def species_row(self, name_or_id):
+        return self._find(name_or_id, self._species_rows, self._species_ids)
+
+    def pokemon_names(self):
+        return list(self._pokemon_rows)
+
+    def species_names(self):
+        return list(self._species_rows)
+
+    def pokemon_listing(self):
+        """[(name, id), ...] in id order, same shape as the name index lists"""
+        return [(self._string('pokemon_names', i), pid) for i, pid in enumerate(self._cols['pokemon_ids'])]
+
+    def species_listing(self):
+        return [(self._string('species_names', i), sid) for i, sid in enumerate(self._cols['species_ids'])]
+
+    def type_listing(self):
+        return list(zip(self.type_names, self._cols['type_ids']))
+
+    def ability_listing(self):
+        return [(name, self._cols['ability_ids'][row]) for name, row in self._ability_rows.items()]
+
+    def move_listing(self):
+        return [(name, self._cols['move_ids'][row]) for name, row in self._move_rows.items()]
+
+    def evolution_chain_listing(self):
+        """[(None, chain id), ...]: PokeAPI lists evolution chains by URL only"""
+        return [(None, chain) for chain in sorted(self._chain_rows)]
+
+    def damage_multiplier(self, attacking_type, defending_type):
+        n = len(self.type_names)
+        return self._cols['damage'][self._type_rows[attacking_type] * n + self._type_rows[defending_type]] / 2
+
+    def pokemon(self, name_or_id):
+        """/pokemon/{name}-shaped dict (without the move list), or None"""
+        row = self.pokemon_row(name_or_id)
+        if row is None:
+            return None
+        cols = self._cols
+        pid = cols['pokemon_ids'][row]
+        flags = cols['pokemon_flags'][row]
+
+        def asset(bit, url):
+            return url if flags & bit else None
+
+        types = [
+            {'slot': slot + 1, 'type': {'name': self.type_names[t]}}
+            for slot, t in enumerate(cols['types'][row * 2:row * 2 + 2]) if t != NONE_U8
+        ]
+        abilities = [
+            {'ability': {'name': self._string('ability_names', a)}, 'is_hidden': slot == 2, 'slot': slot + 1}
+            for slot, a in enumerate(cols['abilities'][row * 3:row * 3 + 3]) if a != NONE_U16
+        ]
+        stats = [
+            {'base_stat': value, 'effort': 0, 'stat': {'name': name}}
+            for name, value in zip(STAT_NAMES, cols['stats'][row * 6:row * 6 + 6])
+        ]
+        species = cols['pokemon_species'][row]
+        base_exp = cols['base_exp'][row]
+        return {
+            'id': pid,
+            'name': self._string('pokemon_names', row),
+            'height': cols['height'][row],
+            'weight': cols['weight'][row],
+            'base_experience': None if base_exp == NONE_U16 else base_exp,
+            'species': {'name': self._string('species_names', species) if species != NONE_U16 else None},
+            'types': types,
+            'abilities': abilities,
+            'stats': stats,
+            'sprites': {
+                'front_default': asset(HAS_FRONT, f"{SPRITE_BASE}/{pid}.png"),
+                'front_shiny': asset(HAS_FRONT_SHINY, f"{SPRITE_BASE}/shiny/{pid}.png"),
+                'other': {'official-artwork': {
+                    'front_default': asset(HAS_ARTWORK, f"{SPRITE_BASE}/other/official-artwork/{pid}.png"),
+                    'front_shiny': asset(HAS_ARTWORK_SHINY, f"{SPRITE_BASE}/other/official-artwork/shiny/{pid}.png"),
+                }},
+            },
+            'cries': {
+                'latest': asset(HAS_CRY_LATEST, f"{CRY_BASE}/latest/{pid}.ogg"),
+                'legacy': asset(HAS_CRY_LEGACY, f"{CRY_BASE}/legacy/{pid}.ogg"),
+            },
+        }
+
+    def learnset(self, name_or_id):
+        """[[move, level], ...] in the shape of main.learnset_from_pokeapi, or None"""
+        row = self.pokemon_row(name_or_id)
+        if row is None:
+            return None
+        cols = self._cols
+        start, end = cols['learnset_start'][row], cols['learnset_start'][row + 1]
+        return [[self._string('move_names', m), level]
+                for m, level in zip(cols['learnset_moves'][start:end], cols['learnset_levels'][start:end])]
+
+    def moves(self, name_or_id):
+        """The move list of a /pokemon/{name} response (one version group detail per move), or None"""
+        row = self.pokemon_row(name_or_id)
+        if row is None:
+            return None
+        cols = self._cols
+        start, end = cols['learnset_start'][row], cols['learnset_start'][row + 1]
+        return [
+            {'move': {'name': self._string('move_names', m), 'url': f"{POKEAPI_BASE_URL}/move/{cols['move_ids'][m]}/"},
+             'version_group_details': [{'level_learned_at': level, 'move_learn_method': {'name': LEARN_METHODS[method]}}]}
+            for m, level, method in zip(cols['learnset_moves'][start:end], cols['learnset_levels'][start:end],
+                                        cols['learnset_methods'][start:end])
+        ]
+
+    def species(self, name_or_id):
+        """/pokemon-species/{name}-shaped dict (subset), or None"""
+        row = self.species_row(name_or_id)
+        if row is None:
+            return None
+        cols = self._cols
+        flags = cols['species_flags'][row]
+        chain = cols['species_chain'][row]
+        parent = cols['species_from'][row]
+        generation = next((k for k, v in ROMAN.items() if v == cols['species_generation'][row]), None)
+        return {
+            'id': cols['species_ids'][row],
+            'name': self._string('species_names', row),
+            'generation': {'name': f"generation-{generation}"} if generation else None,
+            'is_legendary': bool(flags & IS_LEGENDARY),
+            'is_mythical': bool(flags & IS_MYTHICAL),
+            'is_baby': bool(flags & IS_BABY),
+            'capture_rate': cols['species_capture'][row],
+            'evolution_chain': {'url': f"{POKEAPI_BASE_URL}/evolution-chain/{chain}/"} if chain != NONE_U16 else None,
+            'evolves_from_species': {'name': self._string('species_names', parent)} if parent != NONE_U16 else None,
+        }
+
+    def evolution_chain(self, chain_id):
+        """/evolution-chain/{id}-shaped dict rebuilt from the species columns (empty
+        evolution_details), or None"""
+        rows = self._chain_rows.get(int(chain_id)) if str(chain_id).isdigit() else None
+        if not rows:
+            return None
+        cols = self._cols
+        in_chain = set(rows)
+
+        def node(row):
+            return {
+                'species': {'name': self._string('species_names', row),
+                            'url': f"{POKEAPI_BASE_URL}/pokemon-species/{cols['species_ids'][row]}/"},
+                'evolution_details': [],
+                'evolves_to': [node(child) for child in rows if cols['species_from'][child] == row],
+            }
+        root = next(row for row in rows if cols['species_from'][row] not in in_chain)
+        return {'id': int(chain_id), 'chain': node(root)}
+
+    def move(self, name_or_id):
+        """/move/{name}-shaped dict (id and name only), or None"""
+        row = self._find(name_or_id, self._move_rows, self._move_ids)
+        if row is None:
+            return None
+        return {'id': self._cols['move_ids'][row], 'name': self._string('move_names', row)}
+
+    def type(self, name_or_id):
+        """/type/{name}-shaped dict with the attacking damage relations, or None"""
+        row = self._find(name_or_id, self._type_rows, self._type_ids)
+        if row is None:
+            return None
+        names = self.type_names
+        n = len(names)
+        relations = {'no_damage_to': [], 'half_damage_to': [], 'double_damage_to': []}
+        for target, value in enumerate(self._cols['damage'][row * n:row * n + n]):
+            key = {0: 'no_damage_to', 1: 'half_damage_to', 4: 'double_damage_to'}.get(value)
+            if key:
+                relations[key].append({'name': names[target]})
+        return {'id': self._cols['type_ids'][row], 'name': names[row], 'damage_relations': relations}
+
+    def ability(self, name_or_id):
+        """/ability/{name}-shaped dict with the English short effect, or None"""
+        row = self._find(name_or_id, self._ability_rows, self._ability_ids)
+        if row is None:
+            return None
+        return {
+            'id': self._cols['ability_ids'][row],
+            'name': self._string('ability_names', row),
+            'effect_entries': [{'short_effect': self._string('ability_effects', row), 'language': {'name': 'en'}}],
+        }
+
+
+# ============== REPLAY SERVER ==============
+
+def make_replay_handler(snapshot):
+    """HTTP handler that answers the PokeAPI endpoints this app uses from a snapshot."""
+    listings = {
+        'pokemon': snapshot.pokemon_listing,
+        'pokemon-species': snapshot.species_listing,
+        'type': snapshot.type_listing,
+        'ability': snapshot.ability_listing,
+        'move': snapshot.move_listing,
+        'evolution-chain': snapshot.evolution_chain_listing,
+    }
+
+    def pokemon(name_or_id):
+        data = snapshot.pokemon(name_or_id)
+        return dict(data, moves=snapshot.moves(name_or_id)) if data else None
+
+    details = {'pokemon': pokemon, 'pokemon-species': snapshot.species, 'type': snapshot.type,
+               'ability': snapshot.ability, 'move': snapshot.move, 'evolution-chain': snapshot.evolution_chain}
+
+    class ReplayHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            match = re.fullmatch(r'/api/v2/([a-z-]+)(?:/([^/]+))?/?', url.path)
+            body = None
+            if match and match.group(1) in details:
+                endpoint, key = match.groups()
+                if key:
+                    body = details[endpoint](key)
+                else:
+                    query = parse_qs(url.query)
+                    limit = int(query.get('limit', ['20'])[0])
+                    offset = int(query.get('offset', ['0'])[0])
+                    base = f"http://{self.headers.get('Host', 'localhost')}/api/v2/{endpoint}"
+                    items = listings[endpoint]()
+                    body = {
+                        'count': len(items), 'next': None, 'previous': None,
+                        'results': [{'name': name, 'url': f"{base}/{rid}/"} for name, rid in items[offset:offset + limit]],
+                    }
+            self._send(200 if body is not None else 404, body if body is not None else {'detail': 'Not found.'})
+
+        def _send(self, status, payload):
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return ReplayHandler
+
+
+def serve(snapshot_path=DEFAULT_SNAPSHOT_PATH, host='127.0.0.1', port=8765):
+    snapshot = DexSnapshot(snapshot_path)
+    server = ThreadingHTTPServer((host, port), make_replay_handler(snapshot))
+    print(f"🛰️  Replaying {snapshot_path} at http://{host}:{port}/api/v2")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        snapshot.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or replay the offline Pokédex snapshot")
+    sub = parser.add_subparsers(dest='command', required=True)
+    build_cmd = sub.add_parser('build', help="download PokeAPI and write the snapshot file")
+    build_cmd.add_argument('--output', default=DEFAULT_SNAPSHOT_PATH)
+    build_cmd.add_argument('--workers', type=int, default=16)
+    serve_cmd = sub.add_parser('serve', help="serve the snapshot as a local stand-in for PokeAPI")
+    serve_cmd.add_argument('--snapshot', default=DEFAULT_SNAPSHOT_PATH)
+    serve_cmd.add_argument('--host', default='127.0.0.1')
+    serve_cmd.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        build_snapshot(args.output, workers=args.workers)
+    else:
+        serve(args.snapshot, args.host, args.port)
@@ -1,29 +1,54 @@
 import os
-import requests
-import google.generativeai as genai
-import gradio as gr
 from dotenv import load_dotenv
+from dex_snapshot import DexSnapshot, IS_LEGENDARY, IS_MYTHICAL, NONE_U16, STAT_NAMES
+import metrics
 import random
 import json
 import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
 from datetime import datetime
-import base64  # <--- ADDED: To handle audio encoding
+from email.utils import formatdate
+import functools
+import hashlib
+import hmac
+import secrets
+from http.cookies import CookieError, SimpleCookie
+import io
 
 # Load environment variables
 load_dotenv()
 
-# Configure Gemini
+# Gemini is imported and configured on first use (see get_genai), so importing helpers stays cheap
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if not GEMINI_API_KEY:
-    raise ValueError("❌ Please set GEMINI_API_KEY in your .env file!")
-
-genai.configure(api_key=GEMINI_API_KEY)
-
-# Global state for search history and favorites
-search_history = []
-favorites = []
-conversation_history = []  # Store conversation context for intelligent responses
-chat_display_history = []  # NEW: Store formatted chat messages for display
+_genai = None
+_genai_lock = threading.Lock()
+
+def get_genai():
+    """google.generativeai, configured with GEMINI_API_KEY the first time it is needed"""
+    global _genai
+    with _genai_lock:
+        if _genai is None:
+            if not GEMINI_API_KEY:
+                raise ValueError("❌ Please set GEMINI_API_KEY in your .env file!")
+            import google.generativeai as genai
+            genai.configure(api_key=GEMINI_API_KEY)
+            _genai = genai
+        return _genai
+
+# PokeAPI endpoint and local data directory (name index, caches)
+POKEAPI_BASE_URL = os.getenv("POKEAPI_BASE_URL", "https://pokeapi.co/api/v2").rstrip("/")
+DATA_DIR = os.getenv("POKE_DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
+NAME_INDEX_PATH = os.path.join(DATA_DIR, "pokemon_names.json")
+EVOLUTION_INDEX_PATH = os.path.join(DATA_DIR, "evolution_graph.json")
+POKEAPI_CACHE_PATH = os.path.join(DATA_DIR, "pokeapi_cache.sqlite3")
+DEX_SNAPSHOT_PATH = os.path.join(DATA_DIR, "dex.bin")
+ANSWER_CACHE_PATH = os.path.join(DATA_DIR, "answer_cache.sqlite3")
 
 # Language translations
 TRANSLATIONS = {
@@ -45,7 +70,9 @@ TRANSLATIONS = {
         'no_history': 'No conversation history yet',
         'added_fav': '❤️ Added {name} to favorites!',
         'removed_fav': '💔 Removed {name} from favorites',
-        'history_cleared': '✅ Chat history cleared!'
+        'history_cleared': '✅ Chat history cleared!',
+        'matchups': '🛡️ TYPE MATCHUPS',
+        'best_counters': '⚔️ BEST COUNTERS'
     },
     'ms': {
         'title': 'PokéAssistant',
@@ -65,7 +92,9 @@ TRANSLATIONS = {
         'no_history': 'Tiada sejarah perbualan lagi',
         'added_fav': '❤️ Menambah {name} ke kegemaran!',
         'removed_fav': '💔 Membuang {name} daripada kegemaran',
-        'history_cleared': '✅ Sejarah sembang dipadam!'
+        'history_cleared': '✅ Sejarah sembang dipadam!',
+        'matchups': '🛡️ PADANAN JENIS',
+        'best_counters': '⚔️ LAWAN TERBAIK'
     },
     'zh': {
         'title': 'PokéAssistant',
@@ -85,11 +114,14 @@ TRANSLATIONS = {
         'no_history': '还没有对话记录',
         'added_fav': '❤️ 已将{name}添加到收藏！',
         'removed_fav': '💔 已从收藏中移除{name}',
-        'history_cleared': '✅ 聊天记录已清除！'
+        'history_cleared': '✅ 聊天记录已清除！',
+        'matchups': '🛡️ 属性相克',
+        'best_counters': '⚔️ 最佳克制'
     }
 }
 
 # Refined System Prompt with Formatting Rules (with language support)
+@functools.lru_cache(maxsize=None)  # static per language, built once
 def get_system_prompt(language='en'):
     lang_instruction = ""
     if language == 'ms':
@@ -116,17 +148,17 @@ Provide accurate, strategic, and engaging Pokémon advice. You have access to re
 You strictly discuss Pokémon, Nintendo, and related gaming culture. If a user asks about non-Pokémon topics (like math, cooking, politics), politely steer the conversation back to Pokémon (e.g., "I'm better at baking Poffins than cakes! Let's talk about your team.").
 """
 
-# Type effectiveness (simplified)
+# Type effectiveness: attacking type -> {defending type: multiplier}, 1x entries omitted
 type_chart = {
     'fire': {'water': 0.5, 'grass': 2, 'ice': 2, 'bug': 2, 'rock': 0.5, 'dragon': 0.5, 'fire': 0.5, 'steel': 2},
-    'water': {'fire': 2, 'water': 0.5, 'grass': 0.5, 'ground': 2, 'rock': 2},
+    'water': {'fire': 2, 'water': 0.5, 'grass': 0.5, 'ground': 2, 'rock': 2, 'dragon': 0.5},
     'grass': {'fire': 0.5, 'water': 2, 'grass': 0.5, 'poison': 0.5, 'flying': 0.5, 'bug': 0.5, 'dragon': 0.5, 'steel': 0.5, 'ground': 2, 'rock': 2},
-    'electric': {'water': 2, 'electric': 0.5, 'grass': 0.5, 'ground': 0, 'flying': 2},
+    'electric': {'water': 2, 'electric': 0.5, 'grass': 0.5, 'ground': 0, 'flying': 2, 'dragon': 0.5},
     'ice': {'fire': 0.5, 'water': 0.5, 'grass': 2, 'ice': 0.5, 'ground': 2, 'flying': 2, 'dragon': 2, 'steel': 0.5},
-    'fighting': {'normal': 2, 'ice': 2, 'poison': 0.5, 'flying': 0.5, 'psychic': 0.5, 'rock': 2, 'steel': 2, 'fairy': 0.5, 'ghost': 0, 'dark': 2},
-    'poison': {'grass': 2, 'poison': 0.5, 'ground': 0.5, 'rock': 0.5, 'steel': 0, 'fairy': 2},
+    'fighting': {'normal': 2, 'ice': 2, 'poison': 0.5, 'flying': 0.5, 'psychic': 0.5, 'bug': 0.5, 'rock': 2, 'steel': 2, 'fairy': 0.5, 'ghost': 0, 'dark': 2},
+    'poison': {'grass': 2, 'poison': 0.5, 'ground': 0.5, 'rock': 0.5, 'ghost': 0.5, 'steel': 0, 'fairy': 2},
     'ground': {'fire': 2, 'electric': 2, 'grass': 0.5, 'poison': 2, 'flying': 0, 'bug': 0.5, 'rock': 2, 'steel': 2},
-    'flying': {'electric': 0.5, 'ice': 0.5, 'rock': 0.5, 'grass': 2, 'fighting': 2, 'bug': 2},
+    'flying': {'electric': 0.5, 'rock': 0.5, 'steel': 0.5, 'grass': 2, 'fighting': 2, 'bug': 2},
     'psychic': {'fighting': 2, 'poison': 2, 'psychic': 0.5, 'steel': 0.5, 'dark': 0},
     'bug': {'fire': 0.5, 'grass': 2, 'fighting': 0.5, 'poison': 0.5, 'flying': 0.5, 'psychic': 2, 'ghost': 0.5, 'steel': 0.5, 'fairy': 0.5, 'dark': 2},
     'rock': {'fire': 2, 'ice': 2, 'fighting': 0.5, 'ground': 0.5, 'flying': 2, 'bug': 2, 'steel': 0.5},
@@ -147,99 +179,1806 @@ TYPE_COLORS = {
     'steel': '#B8B8D0', 'fairy': '#EE99AC'
 }
 
+# ============== HTTP CLIENT ==============
+
+POKEAPI_TIMEOUT = float(os.getenv("POKEAPI_TIMEOUT", "5"))
+POKEAPI_RETRIES = int(os.getenv("POKEAPI_RETRIES", "2"))
+POKEAPI_POOL_SIZE = int(os.getenv("POKEAPI_POOL_SIZE", "16"))
+FETCH_WORKERS = int(os.getenv("FETCH_WORKERS", "8"))
+BACKGROUND_WORKERS = int(os.getenv("BACKGROUND_WORKERS", "4"))
+
+EXTERNAL_CALLS = metrics.counter('pokeassistant_external_calls_total', 'Network calls to PokeAPI and Gemini', ('service', 'outcome'))
+
+def create_http_session():
+    """requests.Session with keep-alive connection pooling and retries on transient errors"""
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    session = requests.Session()
+    retry = Retry(
+        total=POKEAPI_RETRIES,
+        read=0,  # a read timeout is not retried, so a slow API costs one timeout per call (see Deadline)
+        backoff_factor=0.3,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset({'GET'})
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POKEAPI_POOL_SIZE, max_retries=retry)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers['User-Agent'] = 'PokeAssistant/1.0'
+    return session
+
+# One client and one bounded worker pool shared by the PokeAPI fetches of requests
+_http_session = None
+_http_session_lock = threading.Lock()
+
+def get_http_session():
+    """The shared PokeAPI client, created on first use"""
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            _http_session = create_http_session()
+        return _http_session
+
+fetch_executor = ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix='fetch')
+# Everything else (cache refreshes, asset downloads, RANDOM pool refills, the LLM domain guard) gets
+# its own workers, so slow downloads or refills cannot hold up the fetches a request is waiting on
+background_executor = ThreadPoolExecutor(max_workers=BACKGROUND_WORKERS, thread_name_prefix='background')
+
+def fetch_concurrently(fn, *args):
+    """Call fn on each argument in parallel on the shared pool; results keep argument order"""
+    if len(args) <= 1:
+        return [fn(arg) for arg in args]
+    return list(fetch_executor.map(fn, args))
+
+# ============== RATE LIMITING ==============
+
+# Gradio queue: handlers running at once, chat handlers (send/enter/random) sharing one limit, and
+# the most requests allowed to wait; beyond that Gradio turns new requests away with "queue full"
+QUEUE_CONCURRENCY = int(os.getenv("QUEUE_CONCURRENCY", "8"))
+CHAT_CONCURRENCY = int(os.getenv("CHAT_CONCURRENCY", str(QUEUE_CONCURRENCY)))
+QUEUE_MAX_SIZE = int(os.getenv("QUEUE_MAX_SIZE", "64"))
+
+UPSTREAM_WAIT = metrics.histogram('pokeassistant_upstream_wait_seconds', 'Time a call waited for an upstream rate limiter slot', ('upstream',))
+CHAT_IN_FLIGHT = metrics.gauge('pokeassistant_chat_in_flight', 'Chat requests being handled right now')
+UPSTREAM_SHED = metrics.counter('pokeassistant_upstream_shed_total', 'Calls refused because the upstream queue was too long', ('upstream',))
+
+class UpstreamBusy(Exception):
+    """Raised when a call would wait longer than its limiter's max_wait"""
+
+class RateLimiter:
+    """
+    Token bucket (rate calls per second, up to burst at once) plus a cap on calls in flight, for one upstream.
+    Calls queue for a token and a slot; a call whose expected wait is over max_wait is shed with UpstreamBusy
+    straight away, so a burst degrades into quick "busy" answers instead of a pile of upstream 429s.
+    rate <= 0 or max_concurrent <= 0 switch that limit off.
+    """
+
+    def __init__(self, name, rate, burst, max_concurrent, max_wait):
+        self.name = name
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.max_concurrent = max_concurrent
+        self.max_wait = max_wait
+        self.tokens = float(self.burst)
+        self.in_flight = 0
+        self.waiting = 0
+        self.stats = {'admitted': 0, 'shed': 0}
+        self._updated = time.monotonic()
+        self._cond = threading.Condition()
+
+    def _refill(self, now):
+        # Caller holds the lock
+        if self.rate > 0:
+            self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _ready(self):
+        return (self.rate <= 0 or self.tokens >= 1) and (self.max_concurrent <= 0 or self.in_flight < self.max_concurrent)
+
+    def _shed(self):
+        # Caller holds the lock
+        self.stats['shed'] += 1
+        UPSTREAM_SHED.inc(upstream=self.name)
+        raise UpstreamBusy(f"{self.name} is busy, try again shortly")
+
+    def acquire(self):
+        started = time.monotonic()
+        with self._cond:
+            self._refill(started)
+            # Everyone already waiting needs a token first
+            if self.rate > 0 and (self.waiting + 1 - self.tokens) / self.rate > self.max_wait:
+                self._shed()
+            self.waiting += 1
+            try:
+                while not self._ready():
+                    now = time.monotonic()
+                    remaining = started + self.max_wait - now
+                    if remaining <= 0:
+                        self._shed()
+                    if self.rate > 0 and self.tokens < 1:
+                        remaining = min(remaining, (1 - self.tokens) / self.rate)
+                    self._cond.wait(remaining)
+                    self._refill(time.monotonic())
+            finally:
+                self.waiting -= 1
+            if self.rate > 0:
+                self.tokens -= 1
+            self.in_flight += 1
+            self.stats['admitted'] += 1
+        UPSTREAM_WAIT.observe(time.monotonic() - started, upstream=self.name)
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+        return False
+
+pokeapi_limiter = RateLimiter(
+    'pokeapi',
+    rate=float(os.getenv("POKEAPI_RATE", "20")),
+    burst=int(os.getenv("POKEAPI_BURST", "20")),
+    max_concurrent=int(os.getenv("POKEAPI_MAX_CONCURRENT", str(POKEAPI_POOL_SIZE))),
+    max_wait=float(os.getenv("POKEAPI_MAX_WAIT", "2"))
+)
+
+# Gemini quotas are per minute; streams hold their slot until the last chunk
+gemini_limiter = RateLimiter(
+    'gemini',
+    rate=float(os.getenv("GEMINI_RPM", "60")) / 60,
+    burst=int(os.getenv("GEMINI_BURST", "5")),
+    max_concurrent=int(os.getenv("GEMINI_MAX_CONCURRENT", "8")),
+    max_wait=float(os.getenv("GEMINI_MAX_WAIT", "5"))
+)
+
+def get_limiter_stats():
+    return {
+        limiter.name: dict(limiter.stats, in_flight=limiter.in_flight, waiting=limiter.waiting)
+        for limiter in (pokeapi_limiter, gemini_limiter)
+    }
+
+# ============== CIRCUIT BREAKERS & DEADLINES ==============
+
+REQUEST_DEADLINE = float(os.getenv("REQUEST_DEADLINE", "20"))  # whole chat request, answer included
+DATA_DEADLINE = float(os.getenv("DATA_DEADLINE", "4"))  # of which: names, data and domain guard, before the card
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", "15"))
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "5"))
+BREAKER_RESET = float(os.getenv("BREAKER_RESET", "30"))
+
+class CircuitOpen(Exception):
+    """Raised instead of calling an upstream whose breaker is open"""
+
+class DeadlineExceeded(Exception):
+    """Raised when a request has no time left for another upstream call"""
+
+class Deadline:
+    """Time budget of one request. Stages take min(their own timeout, what is left);
+    stage(seconds) carves out a shorter budget that still ends no later than this one."""
+
+    def __init__(self, seconds, expires_at=None):
+        self.expires_at = expires_at if expires_at is not None else time.monotonic() + seconds
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def timeout(self, cap):
+        left = self.remaining()
+        if left <= 0:
+            raise DeadlineExceeded("request deadline exceeded")
+        return min(cap, left)
+
+    def stage(self, seconds):
+        return Deadline(seconds, min(self.expires_at, time.monotonic() + seconds))
+
+class CircuitBreaker:
+    """
+    closed: calls go through; failure_threshold failures in a row open the breaker.
+    open: calls fail fast with CircuitOpen for reset_timeout seconds.
+    half_open: one trial call goes through; success closes the breaker, failure opens it again.
+    As a context manager, an exception raised inside counts as a failure (except shed or expired calls).
+    """
+
+    def __init__(self, name, failure_threshold=BREAKER_FAILURES, reset_timeout=BREAKER_RESET):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.stats = {'opened': 0, 'rejected': 0}
+        self._opened_at = 0.0
+        self._trial_at = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == 'closed':
+                return
+            now = time.monotonic()
+            if self.state == 'open' and now - self._opened_at >= self.reset_timeout:
+                self.state, self._trial_at = 'half_open', None
+            # A trial whose caller never reported back (e.g. an abandoned stream) is retried after reset_timeout
+            if self.state == 'half_open' and (self._trial_at is None or now - self._trial_at >= self.reset_timeout):
+                self._trial_at = now
+                return
+            self.stats['rejected'] += 1
+        EXTERNAL_CALLS.inc(service=self.name, outcome='circuit_open')
+        raise CircuitOpen(f"{self.name} circuit is open")
+
+    def record_success(self):
+        with self._lock:
+            if self.state != 'closed':
+                print(f"✅ {self.name} is back, circuit closed")
+            self.state, self.failures = 'closed', 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == 'half_open' or (self.state == 'closed' and self.failures >= self.failure_threshold):
+                if self.state == 'closed':
+                    print(f"⚠️ Warning: {self.name} failed {self.failures} times in a row, circuit opened for {self.reset_timeout:.0f}s")
+                self.state, self._opened_at = 'open', time.monotonic()
+                self.stats['opened'] += 1
+
+    def __enter__(self):
+        self.allow()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.record_success()
+        elif issubclass(exc_type, Exception) and not issubclass(exc_type, (UpstreamBusy, DeadlineExceeded)):
+            self.record_failure()
+        return False
+
+pokeapi_breaker = CircuitBreaker('pokeapi')
+gemini_breaker = CircuitBreaker('gemini')
+
+def pokeapi_get(url, timeout=POKEAPI_TIMEOUT, deadline=None):
+    """GET a PokeAPI URL through its circuit breaker and rate limiter, within the deadline if given.
+    Fails fast with CircuitOpen, UpstreamBusy or DeadlineExceeded; 5xx and 429 count as breaker failures."""
+    if deadline is not None:
+        timeout = deadline.timeout(timeout)
+    with pokeapi_breaker, pokeapi_limiter:
+        try:
+            res = get_http_session().get(url, timeout=timeout)
+        except Exception:
+            EXTERNAL_CALLS.inc(service='pokeapi', outcome='error')
+            raise
+        if res.status_code >= 500 or res.status_code == 429:
+            EXTERNAL_CALLS.inc(service='pokeapi', outcome='error')
+            res.raise_for_status()
+    EXTERNAL_CALLS.inc(service='pokeapi', outcome='ok')
+    return res
+
+def gemini_request_options(deadline=None):
+    """request_options for generate_content: GEMINI_TIMEOUT, cut short by the request deadline"""
+    return {'timeout': deadline.timeout(GEMINI_TIMEOUT) if deadline is not None else GEMINI_TIMEOUT}
+
+def get_breaker_stats():
+    return {
+        breaker.name: dict(breaker.stats, state=breaker.state, failures=breaker.failures)
+        for breaker in (pokeapi_breaker, gemini_breaker)
+    }
+
+# ============== OFFLINE DEX ==============
+
+def load_dex_snapshot(path=DEX_SNAPSHOT_PATH):
+    """Memory-map the offline dex built by `python dex_snapshot.py build`, if there is one"""
+    if not os.path.exists(path):
+        return None
+    try:
+        snapshot = DexSnapshot(path)
+        print(f"📦 Loaded offline dex snapshot: {len(snapshot)} Pokémon")
+        return snapshot
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Warning: could not load dex snapshot {path} ({e})")
+        return None
+
+offline_dex = load_dex_snapshot()
+
+# ============== TYPE ENGINE ==============
+
+# Fixed row/column order of the type matrix
+TYPE_ORDER = tuple(TYPE_COLORS)
+TYPE_INDEX = {t: i for i, t in enumerate(TYPE_ORDER)}
+MULTIPLIER_BUCKETS = (4.0, 2.0, 0.5, 0.25, 0.0)
+MAX_COUNTERS = 6
+
+@functools.lru_cache(maxsize=None)
+def get_type_matrix():
+    """type_chart as a dense 18x18 array: rows are attacking types, columns defending types"""
+    import numpy as np
+
+    matrix = np.ones((len(TYPE_ORDER), len(TYPE_ORDER)), dtype=np.float32)
+    for attacker, row in type_chart.items():
+        for defender, multiplier in row.items():
+            matrix[TYPE_INDEX[attacker], TYPE_INDEX[defender]] = multiplier
+    matrix.setflags(write=False)
+    return matrix
+
+def _type_columns(types):
+    return [TYPE_INDEX[t] for t in types if t in TYPE_INDEX]
+
+def defensive_profile(types):
+    """Multiplier every attacking type deals to this (single or dual) typing, in TYPE_ORDER"""
+    return get_type_matrix()[:, _type_columns(types)].prod(axis=1)
+
+def weakness_table(types):
+    """{multiplier: [attacking types]} for every multiplier other than 1x"""
+    import numpy as np
+
+    profile = defensive_profile(types)
+    return {
+        bucket: [TYPE_ORDER[i] for i in np.flatnonzero(profile == bucket)]
+        for bucket in MULTIPLIER_BUCKETS
+        if (profile == bucket).any()
+    }
+
+@functools.lru_cache(maxsize=None)
+def get_dex_table():
+    """Types and base stats of every battle-relevant Pokémon as arrays, straight from the snapshot columns"""
+    import numpy as np
+
+    if offline_dex is None:
+        return None
+    ids = np.asarray(offline_dex.column('pokemon_ids'))
+    names = np.array([name for name, _ in offline_dex.pokemon_listing()])
+
+    # Snapshot type ids -> TYPE_INDEX; "no second type" and non-battle types become -1
+    remap = np.full(256, -1, dtype=np.int16)
+    for row, type_name in enumerate(offline_dex.type_names):
+        if type_name in TYPE_INDEX:
+            remap[row] = TYPE_INDEX[type_name]
+    types = remap[np.asarray(offline_dex.column('types')).reshape(-1, 2)]
+    stats = np.asarray(offline_dex.column('stats')).reshape(-1, 6).astype(np.float32)
+
+    # Species flags per Pokémon; a species that something evolves from is not fully evolved
+    species = np.asarray(offline_dex.column('pokemon_species')).astype(np.int32)
+    has_species = species != NONE_U16
+    species = np.where(has_species, species, -1 - np.arange(len(species)))  # formless entries stay unique
+    species_flags = np.asarray(offline_dex.column('species_flags'))
+    parents = np.asarray(offline_dex.column('species_from'))
+    evolves = np.zeros(len(species_flags), dtype=bool)
+    evolves[parents[parents != NONE_U16]] = True
+    rows = np.where(has_species, species, 0)
+    legendary = has_species & (species_flags[rows] & (IS_LEGENDARY | IS_MYTHICAL) != 0)
+    fully_evolved = ~(has_species & evolves[rows])
+
+    # Default forms plus regional variants; megas, gmax and totem forms are not everyday counters
+    regional = np.array([name.rsplit('-', 1)[-1] in REGIONAL_FORMS for name in names], dtype=bool)
+    keep = ((ids < 10000) | regional) & (types[:, 0] >= 0)
+    return {
+        'names': names[keep], 'types': types[keep], 'stats': stats[keep],
+        'species': species[keep], 'standard': (fully_evolved & ~legendary)[keep]
+    }
+
+@functools.lru_cache(maxsize=512)
+def _rank_counters(defender_types):
+    import numpy as np
+
+    dex = get_dex_table()
+    matrix = get_type_matrix()
+    cols = _type_columns(defender_types)
+    first, second = dex['types'][:, 0], dex['types'][:, 1]
+    dual = second >= 0
+    second = np.where(dual, second, 0)
+
+    # Best STAB hit each candidate lands on the target
+    hit = matrix[:, cols].prod(axis=1)
+    offense = np.maximum(hit[first], np.where(dual, hit[second], 0))
+    # Worst STAB hit the target lands back on each candidate
+    target_rows = matrix[cols]
+    taken = (target_rows[:, first] * np.where(dual, target_rows[:, second], 1)).max(axis=0)
+
+    stats = dex['stats']  # hp, attack, defense, special-attack, special-defense, speed
+    power = np.maximum(stats[:, 1], stats[:, 3])
+    bulk = stats[:, 0] + (stats[:, 2] + stats[:, 4]) / 2
+    score = offense / np.maximum(taken, 0.25) * (power + 0.5 * stats[:, 5] + 0.5 * bulk)
+    score[offense < 2] = 0
+
+    top = np.argsort(-score, kind='stable')[:MAX_COUNTERS + 1]
+    return tuple((str(dex['names'][i]), float(offense[i]), float(taken[i])) for i in top if score[i] > 0)
+
+def best_counters(types, exclude=None):
+    """Top counters across the whole dex: [(name, damage dealt x, damage taken x)]; empty without a snapshot"""
+    types = tuple(types)
+    if get_dex_table() is None or not _type_columns(types):
+        return []
+    return [c for c in _rank_counters(types) if c[0] != exclude][:MAX_COUNTERS]
+
+# ============== TEAM BUILDER ==============
+
+TEAM_SEARCHES = int(os.getenv("TEAM_SEARCHES", "4"))  # starting anchors tried per team, within TEAM_TIMEOUT
+TEAM_TIMEOUT = float(os.getenv("TEAM_TIMEOUT", "0.8"))
+LEGENDARY_WORDS = ('legendary', 'legendaries', 'mythical', 'ubers', 'uber')
+
+TEAM_BUILD_SECONDS = metrics.histogram('pokeassistant_team_build_seconds', 'Time the team optimizer took per team-building question')
+
+_team_optimizer = None
+_team_optimizer_lock = threading.Lock()
+
+def get_team_optimizer():
+    """Shared optimizer over the offline dex (None without a snapshot)"""
+    global _team_optimizer
+    with _team_optimizer_lock:
+        if _team_optimizer is None:
+            dex = get_dex_table()
+            if dex is None:
+                return None
+            from team_builder import TeamOptimizer
+            _team_optimizer = TeamOptimizer(
+                type_chart, get_type_matrix(), TYPE_ORDER,
+                dex['names'], dex['types'], dex['stats'], dex['species'], dex['standard'],
+                searches=TEAM_SEARCHES, timeout=TEAM_TIMEOUT
+            )
+        return _team_optimizer
+
+def build_team_context(user_input, pokemon_data=None):
+    """Optimized team as a verified-data block for team-building questions; empty without an offline dex"""
+    optimizer = get_team_optimizer()
+    if optimizer is None:
+        return ""
+    locked = [pokemon_data.name] if pokemon_data else []
+    allow_legendary = any(w in user_input.lower() for w in LEGENDARY_WORDS)
+    team = optimizer.build(locked, allow_legendary)
+    coverage = team['coverage']
+    TEAM_BUILD_SECONDS.observe(team['elapsed'])
+
+    members = "\n".join(
+        f"        - {name} ({'/'.join(types)})" for name, types in zip(team['members'], team['types'])
+    )
+    offense = f"{len(TYPE_ORDER) - len(coverage['offense_gaps'])}/{len(TYPE_ORDER)} types"
+    if coverage['offense_gaps']:
+        offense += f" (missing: {', '.join(coverage['offense_gaps'])})"
+    defense = f"{len(TYPE_ORDER) - len(coverage['defense_gaps'])}/{len(TYPE_ORDER)}"
+    if coverage['defense_gaps']:
+        defense += f" (none resist: {', '.join(coverage['defense_gaps'])})"
+    return f"""
+        [SYSTEM: OPTIMIZED TEAM]
+        This team was computed from type coverage and base stats across the whole Pokédex. Recommend it and explain the roles:
+{members}
+        - Super-effective STAB coverage: {offense}
+        - Attacking types resisted by at least one member: {defense}
+        - Shared weaknesses (3+ members): {', '.join(coverage['stacked_weaknesses']) or 'none'}
+        """
+
+# ============== NAME INDEX ==============
+
+STOP_WORDS = frozenset({
+    'what', 'is', 'the', 'best', 'counter', 'for', 'against', 'how', 'to',
+    'beat', 'defeat', 'a', 'an', 'can', 'i', 'find', 'me', 'about', 'tell',
+    'show', 'give', 'info', 'information', 'on', 'of', 'with', 'good', 'are',
+    'which', 'pokemon', 'pokémon', 'type', 'types', 'weak', 'weakness',
+    'strong', 'strength', 'stats', 'moves', 'move', 'and', 'or', 'vs', 'versus',
+    'color', 'colour', 'colored', 'coloured', 'tall', 'height', 'high', 'size',
+    'heavy', 'weight', 'weigh', 'much', 'does', 'mass', 'physical', 'body',
+    'appearance', 'look', 'looks', 'like', 'describe', 'description', 'compare',
+    'comparison', 'between', 'battle', 'fight', 'would', 'win', 'trivia', 'fact',
+    'facts', 'fun', 'interesting', 'scenario', 'if', 'my', 'facing', 'should',
+    'do', 'abilities', 'ability', 'evolution', 'evolve', 'evolves', 'location',
+    'where', 'catch', 'found', 'habitat', 'team', 'build'
+})
+
+# Regional form suffixes used by PokeAPI and the adjective people actually type
+REGIONAL_FORMS = {'alola': 'alolan', 'galar': 'galarian', 'hisui': 'hisuian', 'paldea': 'paldean'}
+
+# Longest alias (in words) we try to match, e.g. "urshifu rapid strike gmax"
+MAX_NAME_WORDS = 4
+
+_name_index = None
+_name_index_failed_at = 0.0
+_name_index_lock = threading.Lock()
+
+def _normalize_name_text(text):
+    """Lowercase, strip accents/possessives and turn the text into space separated tokens"""
+    text = unicodedata.normalize('NFKD', text.lower().replace('’', "'"))
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    text = text.replace('♀', ' f ').replace('♂', ' m ')
+    text = re.sub(r"'s\b", '', text)        # "garchomp's" -> "garchomp"
+    text = re.sub(r"[.']", '', text)         # "mr. mime" -> "mr mime", "farfetch'd" -> "farfetchd"
+    return re.findall(r'[a-z0-9]+', text)
+
+def _id_from_url(url):
+    return int(url.rstrip('/').rsplit('/', 1)[1])
+
+def build_name_index(path=NAME_INDEX_PATH):
+    """Download the full Pokémon, species, move and ability lists once and store them on disk."""
+    def fetch_list(endpoint):
+        res = pokeapi_get(f"{POKEAPI_BASE_URL}/{endpoint}?limit=100000", timeout=15)
+        res.raise_for_status()
+        return [[r['name'], _id_from_url(r['url'])] for r in res.json()['results']]
+
+    pokemon, species, moves, abilities = fetch_concurrently(fetch_list, 'pokemon', 'pokemon-species', 'move', 'ability')
+    raw_index = {
+        'built_at': datetime.now().isoformat(timespec='seconds'),
+        'pokemon': pokemon,
+        'species': species,
+        'moves': [name for name, _ in moves],
+        'abilities': [name for name, _ in abilities],
+    }
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(raw_index, f)
+    os.replace(tmp_path, path)
+    print(f"📇 Built Pokémon name index: {len(raw_index['pokemon'])} Pokémon, {len(raw_index['species'])} species")
+    return raw_index
+
+def _name_aliases(name):
+    """Alternative spellings for a PokeAPI name ('raichu-alola' -> 'alolan raichu', ...)"""
+    parts = name.split('-')
+    aliases = [' '.join(parts), ''.join(parts)]
+    for i, part in enumerate(parts):
+        if i == 0 or part not in REGIONAL_FORMS and part not in ('mega', 'gmax'):
+            continue
+        base, rest = ' '.join(parts[:i]), ' '.join(parts[i + 1:])
+        prefixes = [part]
+        if part in REGIONAL_FORMS:
+            prefixes.append(REGIONAL_FORMS[part])
+        elif part == 'gmax':
+            prefixes.append('gigantamax')
+        for prefix in prefixes:
+            # "galarian darmanitan" resolves to the first (default) galarian form
+            aliases.append(f"{prefix} {base} {rest}".strip())
+            aliases.append(f"{prefix} {base}")
+    return aliases
+
+def _compile_name_index(raw_index):
+    """Turn the on-disk lists into an in-memory alias -> canonical name lookup"""
+    pokemon = raw_index['pokemon']
+    names = {name: pid for name, pid in pokemon}
+    aliases = {}
+
+    first_form = {}
+    for name, _ in pokemon:
+        aliases[' '.join(name.split('-'))] = name
+        parts = name.split('-')
+        for i in range(1, len(parts)):
+            first_form.setdefault('-'.join(parts[:i]), name)
+    # Species whose default form has a suffix ('giratina' -> 'giratina-altered')
+    for species_name, _ in raw_index['species']:
+        if species_name in names:
+            continue
+        default_form = first_form.get(species_name)
+        if default_form:
+            aliases.setdefault(' '.join(species_name.split('-')), default_form)
+            aliases.setdefault(species_name.replace('-', ''), default_form)
+    for name, _ in pokemon:
+        for alias in _name_aliases(name):
+            aliases.setdefault(alias, name)
+
+    # Move and ability names ("swords dance", "intimidate") for the domain classifier
+    vocabulary = {}
+    for kind in ('moves', 'abilities'):
+        for name in raw_index.get(kind, []):
+            vocabulary.setdefault(' '.join(name.split('-')), kind)
+
+    return {
+        'names': names,
+        'aliases': aliases,
+        'species': {name: sid for name, sid in raw_index['species']},
+        'vocabulary': vocabulary,
+        # Default forms (ids below 10000) of the whole dex, for the RANDOM button
+        'default_forms': [name for name, pid in pokemon if pid < 10000],
+        'max_words': min(MAX_NAME_WORDS, max(len(alias.split()) for alias in aliases)),
+    }
+
+def get_name_index():
+    """Return the compiled name index, loading it from disk (or building it once) on first use."""
+    global _name_index, _name_index_failed_at
+    if _name_index is not None:
+        return _name_index
+
+    with _name_index_lock:
+        if _name_index is not None:
+            return _name_index
+        # Don't hammer the network on every message if the first build failed
+        if _name_index_failed_at and time.time() - _name_index_failed_at < 300:
+            return None
+        try:
+            raw_index = {}
+            if os.path.exists(NAME_INDEX_PATH):
+                with open(NAME_INDEX_PATH, encoding='utf-8') as f:
+                    raw_index = json.load(f)
+            elif offline_dex is None:
+                raw_index = build_name_index()
+            if offline_dex is not None:
+                raw_index.update(
+                    pokemon=offline_dex.pokemon_listing(),
+                    species=offline_dex.species_listing(),
+                    abilities=[name for name, _ in offline_dex.ability_listing()],
+                    moves=[name for name, _ in offline_dex.move_listing()]
+                )
+            _name_index = _compile_name_index(raw_index)
+        except Exception as e:
+            print(f"⚠️ Warning: Pokémon name index unavailable ({e}), falling back to API lookups.")
+            _name_index_failed_at = time.time()
+            return None
+    return _name_index
+
+def _match_phrases(tokens, table, max_words, skip_words=frozenset()):
+    """Longest-first n-gram lookup of tokens in table: [(value, words matched), ...] in order"""
+    found = []
+    i = 0
+    while i < len(tokens):
+        matched = 0
+        # Prefer the longest match so "mr mime" wins over "mime"
+        for n in range(min(max_words, len(tokens) - i), 0, -1):
+            if n == 1 and tokens[i] in skip_words:
+                break
+            value = table.get(' '.join(tokens[i:i + n]))
+            if value:
+                found.append((value, n))
+                matched = n
+                break
+        i += matched or 1
+    return found
+
+def resolve_pokemon_names(text, index=None):
+    """Return every Pokémon mentioned in text (canonical PokeAPI names), in order of appearance."""
+    index = index or get_name_index()
+    if index is None:
+        return []
+    matches = _match_phrases(_normalize_name_text(text), index['aliases'], index['max_words'], STOP_WORDS)
+    return list(dict.fromkeys(name for name, _ in matches))
+
+# ============== EVOLUTION INDEX ==============
+# Every species with a parent pointer (the species it evolves from) and how it evolves, stored as
+# two flat lists in evolution_graph.json. Compiled into arrays: parent, children (CSR offsets +
+# list) and family root, so "evolves from/into" and whole-family questions are O(1) lookups.
+
+EVOLUTION_BUILD_WORKERS = 4  # the one-time download must not tie up the shared fetch pool
+NO_PARENT = -1
+
+_evolution_index = None
+_evolution_index_failed_at = 0.0
+_evolution_index_building = False
+_evolution_index_lock = threading.Lock()
+
+def _evolution_condition(details):
+    """Short description of an evolution_details list: 'level 16', 'use thunder-stone', 'trade, holding metal-coat'"""
+    if not details:
+        return ""
+    d = details[0]
+    trigger = (d.get('trigger') or {}).get('name', '')
+    parts = []
+    if d.get('min_level'):
+        parts.append(f"level {d['min_level']}")
+    elif trigger == 'level-up':
+        parts.append("level up")
+    if trigger == 'use-item' and d.get('item'):
+        parts.append(f"use {d['item']['name']}")
+    elif trigger not in ('level-up', 'use-item', ''):
+        parts.append(trigger.replace('-', ' '))
+    for key, label in (('held_item', 'holding'), ('known_move', 'knowing'), ('location', 'at')):
+        if d.get(key):
+            parts.append(f"{label} {d[key]['name']}")
+    if d.get('known_move_type'):
+        parts.append(f"knowing a {d['known_move_type']['name']} move")
+    if d.get('min_happiness'):
+        parts.append(f"happiness {d['min_happiness']}")
+    if d.get('min_affection'):
+        parts.append(f"affection {d['min_affection']}")
+    if d.get('time_of_day'):
+        parts.append(f"during the {d['time_of_day']}")
+    return ', '.join(parts)
+
+def build_evolution_index(path=EVOLUTION_INDEX_PATH):
+    """Download every evolution chain once and store the dex-wide graph on disk."""
+    def get(url):
+        # Waits out the rate limiter instead of failing; the build runs in the background
+        for _ in range(60):
+            try:
+                res = pokeapi_get(url, timeout=15)
+                res.raise_for_status()
+                return res.json()
+            except UpstreamBusy:
+                time.sleep(1.0)
+        raise UpstreamBusy(f"{url}: PokeAPI stayed busy")
+
+    listing = get(f"{POKEAPI_BASE_URL}/evolution-chain?limit=100000")['results']
+    with ThreadPoolExecutor(max_workers=EVOLUTION_BUILD_WORKERS, thread_name_prefix='evolution') as pool:
+        chains = list(pool.map(get, [r['url'] for r in listing]))
+
+    nodes = {}  # species name -> (species id, parent name, how)
+    def walk(node, parent):
+        species = node['species']
+        nodes[species['name']] = (_id_from_url(species['url']), parent, _evolution_condition(node.get('evolution_details')))
+        for child in node.get('evolves_to', []):
+            walk(child, species['name'])
+    for chain in chains:
+        walk(chain['chain'], None)
+
+    names = sorted(nodes, key=lambda name: nodes[name][0])
+    row = {name: i for i, name in enumerate(names)}
+    raw_index = {
+        'built_at': datetime.now().isoformat(timespec='seconds'),
+        'species': names,
+        'parent': [row[nodes[name][1]] if nodes[name][1] else NO_PARENT for name in names],
+        'how': [nodes[name][2] for name in names],
+    }
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(raw_index, f)
+    os.replace(tmp_path, path)
+    print(f"🧬 Built evolution index: {len(names)} species in {len(chains)} families")
+    return raw_index
+
+def _evolution_index_from_snapshot(dex):
+    """Same shape as build_evolution_index's output from the offline dex (no evolution conditions)"""
+    names = [name for name, _ in dex.species_listing()]
+    parents = dex.column('species_from')
+    return {
+        'species': names,
+        'parent': [NO_PARENT if p == NONE_U16 else p for p in parents],
+        'how': [""] * len(names),
+    }
+
+def _compile_evolution_index(raw_index):
+    names = raw_index['species']
+    parent = array('h', raw_index['parent'])
+    how = raw_index.get('how') or [""] * len(names)
+
+    child_lists = [[] for _ in names]
+    for i, p in enumerate(parent):
+        if p != NO_PARENT:
+            child_lists[p].append(i)
+    child_start = array('H', [0])
+    children = array('H')
+    for kids in child_lists:
+        children.extend(kids)
+        child_start.append(len(children))
+
+    root = array('H', range(len(names)))
+    for i in range(len(names)):
+        r, hops = i, 0
+        while parent[r] != NO_PARENT and hops < 16:  # chains are at most 3 deep; hops guards bad data
+            r, hops = parent[r], hops + 1
+        root[i] = r
+
+    # Root -> every root-to-leaf line of the family, e.g. ('eevee → vaporeon', 'eevee → jolteon', ...)
+    lines = {}
+    def walk(i, path):
+        path = path + (names[i],)
+        kids = children[child_start[i]:child_start[i + 1]]
+        if not kids:
+            lines.setdefault(root[i], []).append(' → '.join(path))
+        for k in kids:
+            walk(k, path)
+    for i, p in enumerate(parent):
+        if p == NO_PARENT:
+            walk(i, ())
+
+    return {
+        'rows': {name: i for i, name in enumerate(names)},
+        'names': names,
+        'how': how,
+        'parent': parent,
+        'child_start': child_start,
+        'children': children,
+        'root': root,
+        'lines': {r: tuple(family) for r, family in lines.items()},
+    }
+
+def _build_evolution_index_in_background():
+    global _evolution_index, _evolution_index_failed_at, _evolution_index_building
+    try:
+        compiled = _compile_evolution_index(build_evolution_index())
+        with _evolution_index_lock:
+            _evolution_index = compiled
+    except Exception as e:
+        print(f"⚠️ Warning: evolution index unavailable ({e}), evolution facts come from per-question fetches.")
+        _evolution_index_failed_at = time.time()
+    finally:
+        _evolution_index_building = False
+
+def get_evolution_index():
+    """The compiled evolution index: from disk, from the offline dex, or None while it is first
+    downloaded in the background (callers fall back to fetching the chain)."""
+    global _evolution_index, _evolution_index_building
+    if _evolution_index is not None:
+        return _evolution_index
+
+    with _evolution_index_lock:
+        if _evolution_index is not None or _evolution_index_building:
+            return _evolution_index
+        if _evolution_index_failed_at and time.time() - _evolution_index_failed_at < 300:
+            return None
+        try:
+            if os.path.exists(EVOLUTION_INDEX_PATH):
+                with open(EVOLUTION_INDEX_PATH, encoding='utf-8') as f:
+                    _evolution_index = _compile_evolution_index(json.load(f))
+            elif offline_dex is not None:
+                _evolution_index = _compile_evolution_index(_evolution_index_from_snapshot(offline_dex))
+            else:
+                _evolution_index_building = True
+                threading.Thread(target=_build_evolution_index_in_background, name='evolution-index', daemon=True).start()
+        except Exception as e:
+            print(f"⚠️ Warning: evolution index unreadable ({e})")
+    return _evolution_index
+
+def evolution_info(species_name, index=None):
+    """{'from': (name, how) | None, 'into': [(name, how), ...], 'lines': family lines} for a species,
+    or None when it (or the index) is unknown. O(1) apart from copying the results out."""
+    index = index or get_evolution_index()
+    i = index['rows'].get(species_name) if index else None
+    if i is None:
+        return None
+    names, how, parent = index['names'], index['how'], index['parent']
+    kids = index['children'][index['child_start'][i]:index['child_start'][i + 1]]
+    return {
+        'from': (names[parent[i]], how[i]) if parent[i] != NO_PARENT else None,
+        'into': [(names[k], how[k]) for k in kids],
+        'lines': list(index['lines'][index['root'][i]]),
+    }
+
+# ============== POKEAPI CACHE ==============
+
+class ResponseCache:
+    """Bounded in-memory LRU backed by an optional persistent SQLite store, both with TTLs.
+
+    With stale_ttl, entries are kept that long past their TTL: get_or_fetch answers with the
+    stale value at once and refreshes it in the background (on refresh_executor, or a thread).
+    Concurrent misses for the same key share one fetch. encode/decode convert values to and from
+    their JSON form on disk, so memory can hold objects (see PokemonRecord)."""
+
+    def __init__(self, db_path=None, max_entries=128, ttl=7 * 24 * 3600, table='responses', stale_ttl=0, refresh_executor=None,
+                 encode=None, decode=None):
+        self.max_entries = max_entries
+        self.encode = encode
+        self.decode = decode
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.table = table
+        self.refresh_executor = refresh_executor
+        self.stats = {'hits': 0, 'disk_hits': 0, 'stale_hits': 0, 'misses': 0, 'evictions': 0, 'expired': 0,
+                      'refreshes': 0, 'refresh_errors': 0, 'coalesced': 0}
+        self._memory = OrderedDict()  # key -> (expires_at, value)
+        self._refreshing = set()
+        self._fetching = {}  # key -> [done Event, value] of the miss being fetched
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path:
+            try:
+                os.makedirs(os.path.dirname(db_path), exist_ok=True)
+                self._db = sqlite3.connect(db_path, check_same_thread=False)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute(f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)")
+                self._db.execute(f"DELETE FROM {table} WHERE expires_at < ?", (time.time() - stale_ttl,))
+                self._db.commit()
+            except sqlite3.Error as e:
+                print(f"⚠️ Warning: persistent cache disabled ({e})")
+                self._db = None
+
+    def _lookup(self, key, now):
+        """(value, expires_at, source) from memory or disk, or (None, None, None); drops entries
+        past their stale window. Caller holds the lock."""
+        entry = self._memory.get(key)
+        if entry is not None:
+            if entry[0] + self.stale_ttl > now:
+                self._memory.move_to_end(key)
+                return entry[1], entry[0], 'hits'
+            del self._memory[key]
+            self.stats['expired'] += 1
+
+        if self._db is not None:
+            row = self._db.execute(f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                if row[1] + self.stale_ttl > now:
+                    value = json.loads(row[0])
+                    if self.decode is not None:
+                        value = self.decode(value)
+                    self._remember(key, value, row[1])
+                    return value, row[1], 'disk_hits'
+                self._db.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                self._db.commit()
+                self.stats['expired'] += 1
+        return None, None, None
+
+    def get(self, key, allow_stale=False):
+        """Fresh value for key, or None; with allow_stale an entry still within its stale window will do"""
+        now = time.time()
+        with self._lock:
+            value, expires_at, source = self._lookup(key, now)
+            if value is not None and expires_at > now:
+                self.stats[source] += 1
+                return value
+            if value is not None and allow_stale:
+                self.stats['stale_hits'] += 1
+                return value
+            self.stats['misses'] += 1
+            return None
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + (ttl or self.ttl)
+        with self._lock:
+            self._remember(key, value, expires_at)
+            if self._db is not None:
+                stored = self.encode(value) if self.encode is not None else value
+                self._db.execute(f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)",
+                                 (key, json.dumps(stored), expires_at))
+                self._db.commit()
+
+    def get_or_fetch(self, key, fetch, ttl=None, refresh=None):
+        """Return the cached value for key, calling fetch() and storing its result on a miss.
+        A stale value is returned as is while refresh() (default: fetch) revalidates it in the background."""
+        now = time.time()
+        with self._lock:
+            value, expires_at, source = self._lookup(key, now)
+            if value is not None and expires_at > now:
+                self.stats[source] += 1
+                return value
+            start_refresh = leader = False
+            if value is not None:
+                self.stats['stale_hits'] += 1
+                start_refresh = key not in self._refreshing
+                self._refreshing.add(key)
+            else:
+                flight = self._fetching.get(key)
+                if flight is not None:
+                    self.stats['coalesced'] += 1
+                else:
+                    self.stats['misses'] += 1
+                    flight = self._fetching[key] = [threading.Event(), None]
+                    leader = True
+
+        if value is None:
+            if not leader:
+                # Another caller is fetching this key; its result (None if it failed) is ours too
+                flight[0].wait()
+                return flight[1]
+            try:
+                value = fetch()
+                if value is not None:
+                    self.set(key, value, ttl)
+                flight[1] = value
+                return value
+            finally:
+                with self._lock:
+                    self._fetching.pop(key, None)
+                flight[0].set()
+        if start_refresh:
+            if self.refresh_executor is not None:
+                self.refresh_executor.submit(self._refresh, key, refresh or fetch, ttl)
+            else:
+                threading.Thread(target=self._refresh, args=(key, refresh or fetch, ttl), daemon=True).start()
+        return value
+
+    def _refresh(self, key, fetch, ttl):
+        try:
+            value = fetch()
+            if value is not None:
+                self.set(key, value, ttl)
+            outcome = 'refreshes' if value is not None else 'refresh_errors'
+        except Exception:
+            outcome = 'refresh_errors'  # keep serving the stale value
+        with self._lock:
+            self.stats[outcome] += 1
+            self._refreshing.discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute(f"DELETE FROM {self.table}")
+                self._db.commit()
+
+    def discard_prefix(self, prefix):
+        """Drop every entry whose key starts with prefix, from memory and disk"""
+        with self._lock:
+            for key in [k for k in self._memory if k.startswith(prefix)]:
+                del self._memory[key]
+            if self._db is not None:
+                self._db.execute(f"DELETE FROM {self.table} WHERE substr(key, 1, ?) = ?", (len(prefix), prefix))
+                self._db.commit()
+
+    def migrate(self, version, step):
+        """Run step() once per database file: PRAGMA user_version records the last version applied,
+        so later starts (and other processes sharing the file) only read it"""
+        if self._db is None:
+            return
+        with self._lock:
+            if self._db.execute("PRAGMA user_version").fetchone()[0] >= version:
+                return
+        step()
+        with self._lock:
+            self._db.execute(f"PRAGMA user_version = {int(version)}")
+            self._db.commit()
+
+    def __len__(self):
+        """Entries held in memory (stale ones included)"""
+        return len(self._memory)
+
+    def _remember(self, key, value, expires_at):
+        # Caller holds the lock
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.stats['evictions'] += 1
+
+# Expired entries stay usable for POKEAPI_CACHE_STALE_TTL more: served at once while refreshed in the background
+pokeapi_cache = ResponseCache(
+    POKEAPI_CACHE_PATH,
+    max_entries=int(os.getenv("POKEAPI_CACHE_SIZE", "128")),
+    ttl=int(os.getenv("POKEAPI_CACHE_TTL", str(7 * 24 * 3600))),
+    table='pokeapi',
+    stale_ttl=int(os.getenv("POKEAPI_CACHE_STALE_TTL", str(30 * 24 * 3600))),
+    refresh_executor=background_executor
+)
+
+def fetch_pokeapi(path, timeout=POKEAPI_TIMEOUT, deadline=None, cache=None, transform=None):
+    """GET a PokeAPI resource (e.g. 'pokemon/pikachu') through a response cache (default pokeapi_cache);
+    transform turns the JSON into what is cached and returned"""
+    url = f"{POKEAPI_BASE_URL}/{path}"
+    def fetch():
+        res = pokeapi_get(url, timeout, deadline)
+        res.raise_for_status()
+        return transform(res.json()) if transform else res.json()
+    def refresh():
+        # Background revalidation is not bound by the request's deadline
+        res = pokeapi_get(url, timeout)
+        res.raise_for_status()
+        return transform(res.json()) if transform else res.json()
+    try:
+        return (cache if cache is not None else pokeapi_cache).get_or_fetch(path, fetch, refresh=refresh)
+    except:
+        return None
+
+def get_cache_stats(cache=None):
+    """Hit/miss/eviction counters plus current in-memory size of one cache, or summed over the
+    PokeAPI caches (raw responses, Pokémon records, learnsets) by default"""
+    if cache is not None:
+        return dict(cache.stats, size=len(cache))
+    totals = {}
+    for cache in (pokeapi_cache, record_cache, learnset_cache):
+        for key, value in get_cache_stats(cache).items():
+            totals[key] = totals.get(key, 0) + value
+    return totals
+
+# ============== POKÉMON RECORDS ==============
+
+class PokemonRecord:
+    """The part of a /pokemon response the app uses, parsed once per Pokémon. A raw response is
+    a few hundred KB of nested dicts, mostly the move list (kept apart, see get_learnset); a
+    record is well under 1 KB. Base stats are an array in STAT_NAMES order."""
+
+    __slots__ = ('id', 'name', 'species', 'types', 'base_stats', 'abilities', 'height', 'weight',
+                 'artwork', 'artwork_shiny', 'sprite', 'sprite_shiny', 'cry')
+
+    def __init__(self, id, name, species, types, base_stats, abilities, height, weight,
+                 artwork=None, artwork_shiny=None, sprite=None, sprite_shiny=None, cry=None):
+        self.id = id
+        self.name = name
+        self.species = species or name
+        self.types = tuple(types)
+        self.base_stats = array('H', base_stats)
+        self.abilities = tuple((ability, bool(hidden)) for ability, hidden in abilities)  # (name, is_hidden)
+        self.height = height  # decimetres
+        self.weight = weight  # hectograms
+        self.artwork = artwork
+        self.artwork_shiny = artwork_shiny
+        self.sprite = sprite
+        self.sprite_shiny = sprite_shiny
+        self.cry = cry
+
+    @classmethod
+    def from_pokeapi(cls, data):
+        """From a /pokemon/{name}-shaped dict (PokeAPI or DexSnapshot.pokemon)"""
+        sprites = data.get('sprites') or {}
+        artwork = (sprites.get('other') or {}).get('official-artwork') or {}
+        stats = {s['stat']['name']: s['base_stat'] for s in data.get('stats', [])}
+        return cls(
+            data['id'],
+            data['name'],
+            (data.get('species') or {}).get('name'),
+            [t['type']['name'] for t in data.get('types', [])],
+            [stats.get(stat, 0) for stat in STAT_NAMES],
+            [(a['ability']['name'], a.get('is_hidden')) for a in data.get('abilities', [])],
+            data.get('height') or 0,
+            data.get('weight') or 0,
+            artwork.get('front_default'),
+            artwork.get('front_shiny'),
+            sprites.get('front_default'),
+            sprites.get('front_shiny'),
+            (data.get('cries') or {}).get('latest'),
+        )
+
+    def to_row(self):
+        """Flat JSON-able list, the on-disk form in record_cache"""
+        return [self.id, self.name, self.species, list(self.types), list(self.base_stats),
+                [list(a) for a in self.abilities], self.height, self.weight,
+                self.artwork, self.artwork_shiny, self.sprite, self.sprite_shiny, self.cry]
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(*row)
+
+    @property
+    def stats(self):
+        """{stat name: base value}"""
+        return dict(zip(STAT_NAMES, self.base_stats))
+
+    @property
+    def total(self):
+        return sum(self.base_stats)
+
+    def __repr__(self):
+        return f"PokemonRecord({self.id}, {self.name!r})"
+
+
+def learnset_from_pokeapi(data):
+    """[[move, level], ...] from a /pokemon response; level is where it is learned by level-up in
+    the last version group listed, 0 if it is only learned some other way (TM, egg, tutor)"""
+    moves = []
+    for entry in data.get('moves', []):
+        levels = [d['level_learned_at'] for d in entry.get('version_group_details', [])
+                  if (d.get('move_learn_method') or {}).get('name') == 'level-up']
+        moves.append([entry['move']['name'], levels[-1] if levels else 0])
+    return moves
+
+
+def _record_from_pokeapi(data):
+    # One parse of the raw response: the learnset is cached on the side so a moves question later
+    # does not fetch the Pokémon again, and only the record is kept for everything else
+    learnset_cache.set(f"pokemon/{data['name']}", learnset_from_pokeapi(data))
+    return PokemonRecord.from_pokeapi(data)
+
+
+# Records are small, so many more of them fit in memory than raw responses did
+record_cache = ResponseCache(
+    POKEAPI_CACHE_PATH,
+    max_entries=int(os.getenv("POKEMON_RECORD_CACHE_SIZE", "2048")),
+    ttl=pokeapi_cache.ttl,
+    table='pokemon_records',
+    stale_ttl=pokeapi_cache.stale_ttl,
+    refresh_executor=background_executor,
+    encode=PokemonRecord.to_row,
+    decode=PokemonRecord.from_row
+)
+learnset_cache = ResponseCache(
+    POKEAPI_CACHE_PATH,
+    max_entries=int(os.getenv("LEARNSET_CACHE_SIZE", "64")),
+    ttl=pokeapi_cache.ttl,
+    table='learnsets',
+    stale_ttl=pokeapi_cache.stale_ttl,
+    refresh_executor=background_executor
+)
+try:
+    # Raw /pokemon responses cached by earlier versions are never read again
+    pokeapi_cache.migrate(1, lambda: pokeapi_cache.discard_prefix('pokemon/'))
+except sqlite3.Error as e:
+    print(f"⚠️ Warning: could not drop old cached Pokémon responses ({e})")
+
+# ============== SESSION STATE ==============
+
+MAX_SEARCH_HISTORY = 10
+MAX_FAVORITES = 50
+MAX_CONVERSATION_TURNS = 20
+MAX_CHAT_DISPLAY = 50
+# Sessions are keyed on a long-lived client id cookie (Gradio's session_hash changes on every page load)
+SESSION_COOKIE = "pokeassistant_client"
+SESSION_COOKIE_MAX_AGE = int(os.getenv("SESSION_COOKIE_MAX_AGE", str(365 * 24 * 3600)))
+SESSION_DB_TTL = int(os.getenv("SESSION_DB_TTL", str(30 * 24 * 3600)))  # saved sessions unused this long are deleted
+CLIENT_ID_PATTERN = re.compile(r'[A-Za-z0-9_-]{16,64}')
+
+class SessionState:
+    """Search history, favorites and conversation of one browser session (all bounded)"""
+
+    def __init__(self, session_id=None, data=None):
+        data = data or {}
+        self.session_id = session_id
+        self.search_history = data.get('search_history', [])
+        self.favorites = data.get('favorites', [])
+        self.conversation_history = data.get('conversation_history', [])  # context for intelligent responses
+        self.summary_lines = data.get('summary_lines', [])  # rolling summary of turns folded out of the context
+        self.chat_display_history = data.get('chat_display_history', [])  # formatted chat messages for display
+        self.last_seen = time.time()
+        self.persistent = session_id is not None  # saved by SessionStore.save
+        self.lock = threading.RLock()
+        # Bumped whenever a sidebar list changes; `rendered` remembers what the page `tab` (a Gradio
+        # session hash) was last sent (see mark_rendered), so unchanged outputs can be skipped.
+        # None of these is persisted.
+        self.versions = {'history': 0, 'favorites': 0, 'chat': 0}
+        self.rendered = {}
+        self.tab = None
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                'search_history': list(self.search_history),
+                'favorites': list(self.favorites),
+                'conversation_history': list(self.conversation_history),
+                'summary_lines': list(self.summary_lines),
+                'chat_display_history': list(self.chat_display_history),
+            }
+
+    def add_search(self, pokemon_name):
+        with self.lock:
+            if pokemon_name not in self.search_history:
+                self.search_history.insert(0, pokemon_name)
+                del self.search_history[MAX_SEARCH_HISTORY:]
+                self.versions['history'] += 1
+
+    def toggle_favorite(self, pokemon_name):
+        """Returns True if the Pokémon is now a favorite"""
+        with self.lock:
+            self.versions['favorites'] += 1
+            if pokemon_name in self.favorites:
+                self.favorites.remove(pokemon_name)
+                return False
+            self.favorites.append(pokemon_name)
+            del self.favorites[:-MAX_FAVORITES]
+            return True
+
+    def add_exchange(self, user_message, assistant_response):
+        with self.lock:
+            self.conversation_history.append({'user': user_message, 'assistant': assistant_response})
+            overflow = len(self.conversation_history) - MAX_CONVERSATION_TURNS
+            if overflow > 0:
+                self.fold_turns(overflow)
+
+    def fold_turns(self, count):
+        """Move the oldest `count` turns out of the verbatim context into the rolling summary"""
+        with self.lock:
+            self.summary_lines.extend(summarize_turn(entry) for entry in self.conversation_history[:count])
+            del self.conversation_history[:count]
+            while self.summary_lines and estimate_tokens('\n'.join(self.summary_lines)) > SUMMARY_TOKEN_BUDGET:
+                self.summary_lines.pop(0)
+
+    def add_chat_entry(self, entry):
+        with self.lock:
+            self.chat_display_history.append(entry)
+            del self.chat_display_history[:-MAX_CHAT_DISPLAY]
+            self.versions['chat'] += 1
+
+    def clear_chat(self):
+        with self.lock:
+            self.chat_display_history = []
+            self.conversation_history = []
+            self.summary_lines = []
+            self.versions['chat'] += 1
+
+class SessionStore:
+    """Per-session state keyed by client id (see get_session), with LRU/idle eviction and an
+    optional SQLite backend so evicted or restarted sessions can be restored. Saved sessions
+    unused for db_ttl seconds are deleted."""
+
+    def __init__(self, max_sessions=1000, idle_ttl=3600, db_path=None, db_ttl=SESSION_DB_TTL):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.db_ttl = db_ttl
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_sweep = time.time()
+        self._last_purge = 0.0
+        self._db = None
+        if db_path:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+                self._db = sqlite3.connect(db_path, check_same_thread=False)
+                self._db.execute("CREATE TABLE IF NOT EXISTS sessions (session_id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)")
+                self._db.execute("CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions (updated_at)")
+                self._db.commit()
+                with self._lock:
+                    self._purge(time.time())
+            except sqlite3.Error as e:
+                print(f"⚠️ Warning: persistent sessions disabled ({e})")
+                self._db = None
+
+    def get(self, session_id, persistent=True):
+        """Session for session_id; persistent=False keeps it in memory only (never saved or loaded)"""
+        now = time.time()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = SessionState(session_id, self._load(session_id) if persistent else None)
+                session.persistent = persistent
+                self._sessions[session_id] = session
+            self._sessions.move_to_end(session_id)
+            session.last_seen = now
+
+            if now - self._last_sweep > 60:
+                self._last_sweep = now
+                while self._sessions:
+                    oldest = next(iter(self._sessions.values()))
+                    if now - oldest.last_seen < self.idle_ttl:
+                        break
+                    self._sessions.popitem(last=False)
+                if now - self._last_purge > 3600:
+                    self._purge(now)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            return session
+
+    def save(self, session):
+        if self._db is None or session.session_id is None or not session.persistent:
+            return
+        data = json.dumps(session.to_dict())
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO sessions (session_id, data, updated_at) VALUES (?, ?, ?)",
+                             (session.session_id, data, time.time()))
+            self._db.commit()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _load(self, session_id):
+        # Caller holds the lock
+        if self._db is None:
+            return None
+        row = self._db.execute("SELECT data FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _purge(self, now):
+        # Caller holds the lock
+        self._last_purge = now
+        if self._db is None:
+            return
+        try:
+            self._db.execute("DELETE FROM sessions WHERE updated_at < ?", (now - self.db_ttl,))
+            self._db.commit()
+        except sqlite3.Error as e:
+            print(f"⚠️ Warning: could not expire saved sessions ({e})")
+
+session_store = SessionStore(
+    max_sessions=int(os.getenv("MAX_SESSIONS", "1000")),
+    idle_ttl=int(os.getenv("SESSION_IDLE_TTL", "3600")),
+    db_path=os.getenv("SESSION_DB_PATH")
+)
+
+def _client_id_from_header(cookie_header):
+    jar = SimpleCookie()
+    try:
+        jar.load(cookie_header or '')
+    except CookieError:
+        return None
+    morsel = jar.get(SESSION_COOKIE)
+    return morsel.value if morsel and CLIENT_ID_PATTERN.fullmatch(morsel.value) else None
+
+def client_id(request):
+    """The browser's SESSION_COOKIE value (set by ClientIdMiddleware), or None"""
+    cookies = getattr(request, 'cookies', None)
+    if cookies is None:
+        return _client_id_from_header((getattr(request, 'headers', None) or {}).get('cookie'))
+    value = cookies.get(SESSION_COOKIE)
+    return value if value and CLIENT_ID_PATTERN.fullmatch(value) else None
+
+def get_session(request=None):
+    """Session state for a Gradio request: shared by every page load of the same browser (client id
+    cookie), in memory only for the page (session hash) when there is no cookie, throwaway when
+    there is no request"""
+    tab = getattr(request, 'session_hash', None)
+    client = client_id(request) if request is not None else None
+    if client is not None:
+        session = session_store.get(client)
+    elif tab is not None:
+        session = session_store.get(f"tab:{tab}", persistent=False)
+    else:
+        return SessionState()
+    with session.lock:
+        if session.tab != tab:
+            # Another page load (or a second open tab) of this browser has not been sent anything yet
+            session.tab = tab
+            session.rendered.clear()
+    return session
+
+class ClientIdMiddleware:
+    """ASGI middleware giving every browser a random, long-lived SESSION_COOKIE on its first request"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        header = b'; '.join(v for k, v in scope.get('headers', []) if k == b'cookie').decode('latin-1')
+        if _client_id_from_header(header) is not None:
+            await self.app(scope, receive, send)
+            return
+        value = secrets.token_urlsafe(24)
+        # Visible to this request too, so a handler in it already sees the client id
+        headers = [(k, v) for k, v in scope.get('headers', []) if k != b'cookie']
+        headers.append((b'cookie', f"{header + '; ' if header else ''}{SESSION_COOKIE}={value}".encode('latin-1')))
+        scope = dict(scope, headers=headers)
+        cookie = (f"{SESSION_COOKIE}={value}; Path=/; Max-Age={SESSION_COOKIE_MAX_AGE}; "
+                  f"HttpOnly; SameSite=Lax").encode('latin-1')
+
+        async def send_with_cookie(message):
+            if message['type'] == 'http.response.start':
+                message = dict(message, headers=list(message.get('headers', [])) + [(b'set-cookie', cookie)])
+            await send(message)
+        await self.app(scope, receive, send_with_cookie)
+
+def get_app_middleware():
+    """Middleware for demo.launch(app_kwargs={"middleware": ...})"""
+    from starlette.middleware import Middleware
+    return [Middleware(ClientIdMiddleware)]
+
 # ============== HELPER FUNCTIONS ==============
 
-def is_valid_pokemon(name):
-    """Check if a name is a valid Pokémon by querying the API"""
+def is_valid_pokemon(name, deadline=None):
+    """Check if a name is a valid Pokémon (local name index, API fallback)"""
+    index = get_name_index()
+    if index is not None:
+        return ' '.join(_normalize_name_text(name)) in index['aliases']
     try:
-        res = requests.get(f"https://pokeapi.co/api/v2/pokemon/{name.lower()}", timeout=3)
+        res = pokeapi_get(f"{POKEAPI_BASE_URL}/pokemon/{name.lower()}", timeout=3, deadline=deadline)
         return res.status_code == 200
     except:
         return False
 
-def extract_pokemon_name(user_input):
-    """Extract Pokémon name from natural language input using PokeAPI validation"""
-    words = user_input.lower().split()
-    
-    stop_words = {'what', 'is', 'the', 'best', 'counter', 'for', 'against', 'how', 'to', 
-                  'beat', 'defeat', 'a', 'an', 'can', 'i', 'find', 'me', 'about', 'tell',
-                  'show', 'give', 'info', 'information', 'on', 'of', 'with', 'good', 'are',
-                  'which', 'pokemon', 'pokémon', 'type', 'types', 'weak', 'weakness', 
-                  'strong', 'strength', 'stats', 'moves', 'move', 'and', 'or', 'vs', 'versus',
-                  'color', 'colour', 'colored', 'coloured', 'tall', 'height', 'high', 'size',
-                  'heavy', 'weight', 'weigh', 'much', 'does', 'mass', 'physical', 'body',
-                  'appearance', 'look', 'looks', 'like', 'describe', 'description', 'compare',
-                  'comparison', 'between', 'battle', 'fight', 'would', 'win', 'trivia', 'fact',
-                  'facts', 'fun', 'interesting', 'scenario', 'if', 'my', 'facing', 'should',
-                  'do', 'abilities', 'ability', 'evolution', 'evolve', 'evolves', 'location',
-                  'where', 'catch', 'found', 'habitat', 'team', 'build'}
-    
-    potential_names = [word.strip('?!.,') for word in words if word.strip('?!.,') not in stop_words]
-    
-    for word in potential_names:
-        if word and is_valid_pokemon(word):
-            return word
-    
-    for word in words:
-        clean_word = word.strip('?!.,')
-        if clean_word and len(clean_word) > 2 and is_valid_pokemon(clean_word):
-            return clean_word
-    
-    return None
+@metrics.timed('extract')
+def extract_pokemon_name(user_input, deadline=None):
+    """Extract Pokémon name from natural language input using the local name index"""
+    index = get_name_index()
+    if index is not None:
+        names = resolve_pokemon_names(user_input, index)
+        return names[0] if names else None
+
+    return _extract_names_via_api([user_input], deadline)[0]
+
+def _extract_names_via_api(texts, deadline=None):
+    """Fallback when no name index is available: validate the candidate words of
+    every text against the API in one concurrent batch, first valid word per text.
+    All the checks share the deadline, so a slow API costs one timeout, not one per word."""
+    candidates = [
+        [w for w in (word.strip('?!.,') for word in text.lower().split()) if w and w not in STOP_WORDS]
+        for text in texts
+    ]
+    words = list(dict.fromkeys(w for words in candidates for w in words))
+    valid = dict(zip(words, fetch_concurrently(functools.partial(is_valid_pokemon, deadline=deadline), *words)))
+    return [next((w for w in words if valid[w]), None) for words in candidates]
 
 # NEW: Extract two Pokémon names for comparison
-def extract_two_pokemon_names(user_input):
+@metrics.timed('extract_pair')
+def extract_two_pokemon_names(user_input, deadline=None):
     """Extract two Pokémon names from input like 'diglett vs pikachu'"""
     parts = re.split(r'\b(vs|versus)\b', user_input, flags=re.IGNORECASE)
     if len(parts) >= 3:
         part1 = parts[0].strip()
         part2 = parts[2].strip()
         
-        name1 = extract_pokemon_name(part1)
-        name2 = extract_pokemon_name(part2)
+        if get_name_index() is not None:
+            name1 = extract_pokemon_name(part1)
+            name2 = extract_pokemon_name(part2)
+        else:
+            name1, name2 = _extract_names_via_api([part1, part2], deadline)
         
         if name1 and name2 and name1 != name2:
             return name1, name2
     return None, None
 
 
-def get_pokemon_data(name):
-    try:
-        res = requests.get(f"https://pokeapi.co/api/v2/pokemon/{name.lower()}", timeout=5)
-        res.raise_for_status()
-        return res.json()
-    except:
+@functools.lru_cache(maxsize=2048)
+def _offline_record(name):
+    data = offline_dex.pokemon(name)
+    return PokemonRecord.from_pokeapi(data) if data else None
+
+@metrics.timed('fetch')
+def get_pokemon_data(name, deadline=None):
+    """PokemonRecord for a name or id, or None"""
+    name = str(name).lower()
+    if offline_dex is not None:
+        record = _offline_record(name)
+        if record:
+            return record
+    record = fetch_pokeapi(f"pokemon/{name}", deadline=deadline, cache=record_cache, transform=_record_from_pokeapi)
+    if record and name.isdigit():
+        # Store under the name too so a follow-up lookup by name is a cache hit
+        record_cache.set(f"pokemon/{record.name}", record)
+    return record
+
+def get_learnset(name, deadline=None):
+    """[[move, level], ...] for a Pokémon, fetched on first use (usually already cached by the
+    lookup that built its record)"""
+    name = str(name).lower()
+    if offline_dex is not None:
+        learnset = offline_dex.learnset(name)
+        if learnset is not None:
+            return learnset
+    return fetch_pokeapi(f"pokemon/{name}", deadline=deadline, cache=learnset_cache, transform=learnset_from_pokeapi)
+
+def get_pokemon_species_data(name, deadline=None):
+    name = str(name).lower()
+    if offline_dex is not None:
+        data = offline_dex.species(name)
+        if data:
+            return data
+    return fetch_pokeapi(f"pokemon-species/{name}", deadline=deadline)
+
+def get_ability_data(name, deadline=None):
+    if offline_dex is not None:
+        data = offline_dex.ability(name)
+        if data:
+            return data
+    return fetch_pokeapi(f"ability/{name}", deadline=deadline)
+
+def get_evolution_chain(species_data, deadline=None):
+    """/evolution-chain record of a species, or None"""
+    chain = (species_data or {}).get('evolution_chain')
+    if not chain:
         return None
+    return fetch_pokeapi(chain['url'].split('/api/v2/', 1)[-1].strip('/'), deadline=deadline)
+
+# ============== FOLLOW-UP PREFETCH ==============
+
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "1") == "1"
+PREFETCH_QUEUE_SIZE = int(os.getenv("PREFETCH_QUEUE_SIZE", "32"))
+PREFETCH_WORKERS = int(os.getenv("PREFETCH_WORKERS", "2"))
+# What follow-up questions ask about; a topic's facts join the prompt only when it is asked about
+FOLLOW_UP_TOPICS = {
+    'evolution': ('evolve', 'evolves', 'evolved', 'evolution', 'evolutions', 'evo', 'prevolution', 'evolusi', 'berevolusi', '进化'),
+    'abilities': ('ability', 'abilities', 'kebolehan', 'keupayaan', '特性'),
+    'species': ('legendary', 'mythical', 'generation', 'gen', 'catch', 'capture', 'pokedex', 'dex', 'baby', 'lagenda', '传说', '世代'),
+    'moves': ('move', 'moves', 'moveset', 'movepool', 'learn', 'learns', 'learnset', 'gerakan', 'jurus', '招式', '技能'),
+}
+LEARNSET_FACT_LIMIT = 30  # moves listed per learn method in the follow-up block
+
+def follow_up_topics(text):
+    """FOLLOW_UP_TOPICS the question asks about, e.g. ['evolution'] for "where does it evolve?" """
+    normalized = normalize_query(text)
+    words = set(normalized.split())
+    return [
+        topic for topic, keys in FOLLOW_UP_TOPICS.items()
+        if any(k in words or (not k.isascii() and k in normalized) for k in keys)
+    ]
 
-def get_pokemon_species_data(name):
+def evolution_lines(chain):
+    """Every branch of an /evolution-chain record: ['eevee → vaporeon', 'eevee → jolteon', ...]"""
+    lines = []
+    def walk(node, path):
+        path = path + [node['species']['name']]
+        if not node.get('evolves_to'):
+            lines.append(' → '.join(path))
+        for child in node.get('evolves_to', []):
+            walk(child, path)
+    walk(chain['chain'], [])
+    return lines
+
+def follow_up_facts(pokemon_data, topics, deadline=None):
+    """Verified-data block on the asked-about topics. Usually served from what the prefetcher
+    warmed; anything missing is fetched within deadline (joining a prefetch still in flight)."""
+    species_name = pokemon_data.species
+    # Evolution questions alone need no species record once the evolution index is loaded
+    needs_species = 'species' in topics or ('evolution' in topics and get_evolution_index() is None)
+    species = get_pokemon_species_data(species_name, deadline) if needs_species else None
+    facts = []
+    if 'evolution' in topics:
+        evolution = evolution_info(species_name)
+        if evolution is not None:
+            def step(name, how):
+                return f"{name} ({how})" if how else name
+            if evolution['from']:
+                facts.append(f"- Evolves from: {step(*evolution['from'])}")
+            if evolution['into']:
+                branching = " (branching, one of)" if len(evolution['into']) > 1 else ""
+                facts.append(f"- Evolves into{branching}: {', '.join(step(*child) for child in evolution['into'])}")
+            if len(evolution['lines']) == 1 and not evolution['from'] and not evolution['into']:
+                facts.append("- Does not evolve")
+            else:
+                facts.append(f"- Evolution family: {'; '.join(evolution['lines'])}")
+        else:
+            chain = get_evolution_chain(species, deadline)
+            if chain:
+                facts.append(f"- Evolution line: {'; '.join(evolution_lines(chain))}")
+            if species and species.get('evolves_from_species'):
+                facts.append(f"- Evolves from: {species['evolves_from_species']['name']}")
+    if 'abilities' in topics:
+        for name, is_hidden in pokemon_data.abilities:
+            ability = get_ability_data(name, deadline) or {}
+            effect = next((e['short_effect'] for e in ability.get('effect_entries', []) if e['language']['name'] == 'en'), None)
+            hidden = " (hidden)" if is_hidden else ""
+            facts.append(f"- Ability {name}{hidden}: {' '.join(effect.split()) if effect else 'no description'}")
+    if 'species' in topics and species:
+        flags = [f for f in ('legendary', 'mythical', 'baby') if species.get(f'is_{f}')]
+        generation = (species.get('generation') or {}).get('name', 'unknown')
+        facts.append(f"- Generation: {generation}, capture rate {species.get('capture_rate')}, {', '.join(flags) or 'not legendary or mythical'}")
+        entry = next((e['flavor_text'] for e in species.get('flavor_text_entries', []) if e['language']['name'] == 'en'), None)
+        if entry:
+            facts.append(f"- Pokédex entry: {' '.join(entry.split())}")
+    if 'moves' in topics:
+        learnset = get_learnset(pokemon_data.name, deadline) or []
+        by_level = sorted((level, move) for move, level in learnset if level)
+        other = [move for move, level in learnset if not level]
+        if by_level:
+            facts.append(f"- Level-up moves: {', '.join(f'{move} (Lv {level})' for level, move in by_level[:LEARNSET_FACT_LIMIT])}")
+        if other:
+            more = f" and {len(other) - LEARNSET_FACT_LIMIT} more" if len(other) > LEARNSET_FACT_LIMIT else ""
+            facts.append(f"- Learned by TM, breeding or tutor: {', '.join(other[:LEARNSET_FACT_LIMIT])}{more}")
+    if not facts:
+        return ""
+    body = "\n".join(f"        {fact}" for fact in facts)
+    return f"""
+        [SYSTEM: FOLLOW-UP DATA]
+        Verified facts about {pokemon_data.name.capitalize()}:
+{body}
+        """
+
+class Prefetcher:
+    """Warms what follow-up questions about a just-resolved Pokémon need: species, evolution chain,
+    ability and learnset records (through the PokeAPI caches) and its type matchups and counters.
+    A bounded queue served newest first by a few background threads; when it is full the oldest
+    entry is dropped. Work is skipped while PokeAPI is struggling (breaker not closed, or
+    user requests already queueing for the rate limiter), so it never competes with them."""
+
+    def __init__(self, max_queued=PREFETCH_QUEUE_SIZE, workers=PREFETCH_WORKERS):
+        self.max_queued = max_queued
+        self.workers = workers
+        self.stats = {'scheduled': 0, 'dropped': 0, 'skipped': 0, 'done': 0, 'errors': 0}
+        self._queue = deque()
+        self._queued = set()
+        self._recent = OrderedDict()  # names warmed lately, not queued again
+        self._threads = []
+        self._cond = threading.Condition()
+
+    def schedule(self, pokemon_data):
+        if not PREFETCH_ENABLED or not pokemon_data:
+            return
+        name = pokemon_data.name
+        with self._cond:
+            if name in self._queued or name in self._recent:
+                return
+            if len(self._queue) >= self.max_queued:
+                self._queued.discard(self._queue.popleft().name)
+                self.stats['dropped'] += 1
+            self._queue.append(pokemon_data)
+            self._queued.add(name)
+            self.stats['scheduled'] += 1
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._run, name=f'prefetch-{len(self._threads)}', daemon=True)
+                self._threads.append(thread)
+                thread.start()
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                data = self._queue.pop()
+                self._queued.discard(data.name)
+            self._warm(data)
+
+    def _warm(self, data):
+        if pokeapi_breaker.state != 'closed' or pokeapi_limiter.waiting:
+            outcome = 'skipped'
+        else:
+            try:
+                species = get_pokemon_species_data(data.species)
+                if get_evolution_index() is None:
+                    get_evolution_chain(species)
+                for name, _ in data.abilities:
+                    get_ability_data(name)
+                get_learnset(data.name)
+                build_data_context(data)  # type matchups, counters and the verified-data block
+                outcome = 'done'
+            except Exception as e:
+                print(f"⚠️ Warning: prefetch for {data.name} failed ({e})")
+                outcome = 'errors'
+        with self._cond:
+            self.stats[outcome] += 1
+            if outcome == 'done':
+                self._recent[data.name] = True
+                while len(self._recent) > 256:
+                    self._recent.popitem(last=False)
+
+prefetcher = Prefetcher()
+
+# ============== STATIC ASSETS ==============
+
+STATIC_CHUNK_SIZE = 64 * 1024
+STATIC_MAX_AGE = int(os.getenv("STATIC_MAX_AGE", "86400"))
+
+# Extra HTTP routes mounted next to the Gradio app: (path, endpoint, methods); see get_extra_routes
+extra_routes = []
+
+def get_extra_routes():
+    """extra_routes as Starlette routes, for demo.launch(app_kwargs={"routes": ...})"""
+    from starlette.routing import Route
+    return [Route(path, endpoint, methods=methods) for path, endpoint, methods in extra_routes]
+
+def _parse_range(header, size):
+    """(start, end) for a single 'bytes=' range, None to ignore the header; ValueError if unsatisfiable"""
+    unit, _, spec = header.partition('=')
+    if unit.strip().lower() != 'bytes' or ',' in spec:
+        return None  # multi-range requests just get the whole file
+    first, _, last = spec.strip().partition('-')
     try:
-        res = requests.get(f"https://pokeapi.co/api/v2/pokemon-species/{name.lower()}", timeout=5)
-        res.raise_for_status()
-        return res.json()
-    except:
+        if not first:
+            start, end = max(size - int(last), 0), size - 1
+        else:
+            start, end = int(first), min(int(last), size - 1) if last else size - 1
+    except ValueError:
         return None
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, end
+
+def _iter_file(path, start, length):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(STATIC_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+def static_file_response(request, path, media_type, max_age=STATIC_MAX_AGE):
+    """Serve a file in chunks with ETag / If-None-Match, Range / If-Range and Cache-Control"""
+    from starlette.responses import Response, StreamingResponse
+
+    try:
+        st = os.stat(path)
+    except OSError:
+        return Response(status_code=404)
+    size = st.st_size
+    etag = f'"{size:x}-{st.st_mtime_ns:x}"'
+    headers = {
+        'ETag': etag,
+        'Last-Modified': formatdate(st.st_mtime, usegmt=True),
+        'Cache-Control': f'public, max-age={max_age}',
+        'Accept-Ranges': 'bytes',
+    }
+
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match and (if_none_match.strip() == '*' or etag in [t.strip() for t in if_none_match.split(',')]):
+        return Response(status_code=304, headers=headers)
+
+    start, end, status = 0, size - 1, 200
+    range_header = request.headers.get('range')
+    if range_header and request.headers.get('if-range', etag) == etag:
+        try:
+            parsed = _parse_range(range_header, size)
+        except ValueError:
+            return Response(status_code=416, headers={**headers, 'Content-Range': f'bytes */{size}'})
+        if parsed:
+            start, end = parsed
+            status = 206
+            headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+    headers['Content-Length'] = str(end - start + 1)
+
+    if request.method == 'HEAD':
+        return Response(status_code=status, headers=headers, media_type=media_type)
+    return StreamingResponse(_iter_file(path, start, end - start + 1), status_code=status, headers=headers, media_type=media_type)
 
 # ============== MUSIC HELPER FUNCTION ==============
 
-def get_bg_music_html(file_name="theme.mp3"):
+MUSIC_FILE = "theme.mp3"
+MUSIC_ROUTE = "/media/theme.mp3"
+
+extra_routes.append((
+    MUSIC_ROUTE,
+    lambda request: static_file_response(request, MUSIC_FILE, 'audio/mpeg'),
+    ['GET', 'HEAD']
+))
+
+def get_bg_music_html(file_name=MUSIC_FILE):
     """
-    Reads a local audio file, encodes it to base64, and returns a floating HTML player.
+    Returns a floating HTML player that streams the track from MUSIC_ROUTE.
+    Nothing is downloaded until the user presses play, so the page weight does not depend on the file size.
     """
     # Check if file exists to prevent errors
     if not os.path.exists(file_name):
         print(f"⚠️ Warning: Music file '{file_name}' not found.")
         return ""
-    
-    try:
-        with open(file_name, "rb") as f:
-            data = f.read()
-            b64 = base64.b64encode(data).decode()
-        
-        # HTML for a floating player (Bottom Right)
-        # autoplay: tries to play automatically
-        # loop: repeats the music
-        # controls: allows user to mute/unmute and change volume
-        return f"""
+
+    # HTML for a floating player (Bottom Right)
+    # preload="none": the browser fetches the track (with range requests) only when played
+    # loop: repeats the music
+    # controls: allows user to play/pause, mute/unmute and change volume
+    return f"""
         <div style="
             position: fixed; 
             bottom: 20px; 
@@ -256,23 +1995,332 @@ def get_bg_music_html(file_name="theme.mp3"):
             gap: 10px;
         ">
             <span style="font-size: 1.2rem;">🎵</span>
-            <audio controls autoplay loop style="height: 30px; width: 200px;">
-                <source src="data:audio/mp3;base64,{b64}" type="audio/mp3">
+            <audio controls loop preload="none" style="height: 30px; width: 200px;">
+                <source src="{MUSIC_ROUTE}" type="audio/mpeg">
             </audio>
         </div>
         """
-    except Exception as e:
-        print(f"Error loading music: {e}")
-        return ""
+
+# ============== ASSET PROXY ==============
+
+ASSET_DIR = os.path.join(DATA_DIR, "assets")
+ASSET_CACHE_MB = int(os.getenv("ASSET_CACHE_MB", "256"))
+ASSET_MAX_AGE = int(os.getenv("ASSET_MAX_AGE", str(30 * 24 * 3600)))
+ASSET_TIMEOUT = float(os.getenv("ASSET_TIMEOUT", "10"))
+ASSET_ROUTE = "/assets"
+ASSET_VARIANTS = ('artwork', 'shiny', 'sprite', 'cry')
+THUMBNAIL_SIZES = (48, 96, 150)  # a fixed set, so the cache holds at most three thumbnails per image
+ASSET_MEDIA_TYPES = {'.png': 'image/png', '.ogg': 'audio/ogg', '.mp3': 'audio/mpeg', '.gif': 'image/gif'}
+
+def pokemon_asset_url(pokemon_data, variant='artwork'):
+    """Upstream URL of a Pokémon's official artwork, shiny artwork, small sprite or cry"""
+    if variant == 'cry':
+        return pokemon_data.cry
+    if variant == 'sprite':
+        return pokemon_data.sprite
+    if variant == 'shiny':
+        return pokemon_data.artwork_shiny or pokemon_data.sprite_shiny or pokemon_data.sprite
+    return pokemon_data.artwork or pokemon_data.sprite
+
+class AssetCache:
+    """Sprites, artwork and cries downloaded on first use into a size-bounded directory, least
+    recently used files evicted first. Files are named after a hash of their source URL and never
+    rewritten, so their ETags stay valid."""
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.stats = {'hits': 0, 'downloads': 0, 'download_errors': 0, 'evictions': 0}
+        self._files = None  # path -> size, least recently used first (loaded on first use)
+        self._size = 0
+        self._downloads = {}  # url -> Event, one download per url at a time
+        self._lock = threading.Lock()
+
+    def _load(self):
+        # Caller holds the lock; after a restart the oldest files count as least recently used
+        if self._files is not None:
+            return
+        entries = []
+        if os.path.isdir(self.directory):
+            for entry in os.scandir(self.directory):
+                if entry.is_file() and not entry.name.endswith('.tmp'):
+                    st = entry.stat()
+                    entries.append((st.st_mtime, entry.path, st.st_size))
+        self._files = OrderedDict((path, size) for _, path, size in sorted(entries))
+        self._size = sum(self._files.values())
+
+    def __len__(self):
+        with self._lock:
+            self._load()
+            return len(self._files)
+
+    @property
+    def total_bytes(self):
+        """Bytes of all the files in the cache"""
+        with self._lock:
+            self._load()
+            return self._size
+
+    def path_for(self, url, suffix=''):
+        ext = os.path.splitext(url.split('?')[0])[1].lower() or '.bin'
+        return os.path.join(self.directory, hashlib.sha1(url.encode('utf-8')).hexdigest()[:20] + suffix + ext)
+
+    def cached(self, path):
+        """path if the file is in the cache (and mark it used), else None"""
+        with self._lock:
+            self._load()
+            if path not in self._files:
+                return None
+            self._files.move_to_end(path)
+            self.stats['hits'] += 1
+            return path
+
+    def add(self, path, data):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._load()
+            self._size += len(data) - self._files.get(path, 0)
+            self._files[path] = len(data)
+            self._files.move_to_end(path)
+            while self._size > self.max_bytes and len(self._files) > 1:
+                old_path, old_size = self._files.popitem(last=False)
+                self._size -= old_size
+                self.stats['evictions'] += 1
+                try:
+                    os.remove(old_path)
+                except OSError:
+                    pass
+        return path
+
+    def discard(self, path):
+        """Remove a file from the cache, e.g. a download that turned out to be corrupt"""
+        with self._lock:
+            self._load()
+            self._size -= self._files.pop(path, 0)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def get(self, url):
+        """Local path of url, downloading it first if needed; None when it cannot be fetched"""
+        path = self.path_for(url)
+        if self.cached(path):
+            return path
+        with self._lock:
+            done = self._downloads.get(url)
+            leader = done is None
+            if leader:
+                done = self._downloads[url] = threading.Event()
+        if not leader:
+            done.wait(ASSET_TIMEOUT)
+            return self.cached(path)
+        try:
+            res = get_http_session().get(url, timeout=ASSET_TIMEOUT)
+            res.raise_for_status()
+            self.add(path, res.content)
+            EXTERNAL_CALLS.inc(service='assets', outcome='ok')
+            with self._lock:
+                self.stats['downloads'] += 1
+            return path
+        except Exception as e:
+            EXTERNAL_CALLS.inc(service='assets', outcome='error')
+            with self._lock:
+                self.stats['download_errors'] += 1
+            print(f"⚠️ Warning: could not download asset {url} ({e})")
+            return None
+        finally:
+            with self._lock:
+                self._downloads.pop(url, None)
+            done.set()
+
+    def local_or_remote(self, url):
+        """Local path if url is cached already, otherwise url itself while it downloads in the background"""
+        if not url:
+            return url
+        path = self.cached(self.path_for(url))
+        if path:
+            return path
+        background_executor.submit(self.get, url)
+        return url
+
+    def thumbnail(self, url, size):
+        """Local path of url scaled down to fit size x size (PNG); the original if Pillow is missing or
+        cannot scale it. A file Pillow cannot read at all is evicted (and downloaded again next time)."""
+        path = self.path_for(url, f"-{size}")
+        if self.cached(path):
+            return path
+        original = self.get(url)
+        if original is None:
+            return None
+        try:
+            from PIL import Image
+        except ImportError:
+            return original
+        try:
+            image = Image.open(original)
+            image.load()
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Warning: discarding unreadable asset {url} ({e})")
+            self.discard(original)
+            return None
+        try:
+            with image:
+                image.thumbnail((size, size), Image.LANCZOS)
+                buffer = io.BytesIO()
+                image.save(buffer, format='PNG', optimize=True)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Warning: could not scale asset {url} ({e})")
+            return original
+        return self.add(path, buffer.getvalue())
+
+asset_cache = AssetCache(ASSET_DIR, ASSET_CACHE_MB * 1024 * 1024)
+
+def asset_response(request):
+    """GET /assets/{variant}/{name}[?size=N]: a Pokémon's artwork, shiny artwork, sprite or cry, from the local cache"""
+    from starlette.responses import Response
+
+    variant, name = request.path_params['variant'], request.path_params['name']
+    size = request.query_params.get('size')
+    if variant not in ASSET_VARIANTS or (size is not None and (not size.isdigit() or int(size) not in THUMBNAIL_SIZES)):
+        return Response(status_code=404)
+    # Only names the app itself links to: a typo or a crawler must not turn into PokeAPI lookups
+    index = get_name_index()
+    if index is not None and name not in index['names']:
+        return Response(status_code=404)
+    data = get_pokemon_data(name)
+    url = pokemon_asset_url(data, variant) if data else None
+    if not url:
+        return Response(status_code=404)
+    if size and variant != 'cry':
+        path = asset_cache.thumbnail(url, int(size))
+    else:
+        path = asset_cache.get(url)
+    if path is None:
+        return Response(status_code=502)
+    media_type = ASSET_MEDIA_TYPES.get(os.path.splitext(path)[1], 'application/octet-stream')
+    return static_file_response(request, path, media_type, ASSET_MAX_AGE)
+
+extra_routes.append((ASSET_ROUTE + "/{variant}/{name}", asset_response, ['GET', 'HEAD']))
+
+def asset_src(pokemon_name, variant='artwork', size=None):
+    """URL of a Pokémon asset on the local proxy, for <img>/<audio> tags in HTML fragments"""
+    return f"{ASSET_ROUTE}/{variant}/{pokemon_name}" + (f"?size={size}" if size else "")
+
+# ============== METRICS ENDPOINT ==============
+
+METRICS_ROUTE = "/metrics"
+
+@metrics.register_collector
+def collect_app_metrics():
+    """Cache, prompt and session figures the app already keeps, read at scrape time"""
+    families = []
+    caches = (('pokeapi', get_cache_stats(pokeapi_cache)), ('pokemon_record', get_cache_stats(record_cache)),
+              ('learnset', get_cache_stats(learnset_cache)), ('answer', get_answer_cache_stats()))
+    for cache, stats in caches:
+        families.append((f'pokeassistant_{cache}_cache_events_total', 'counter', f'{cache} cache lookups and evictions by event',
+                         [({'event': event}, stats[event]) for event in
+                          ('hits', 'disk_hits', 'stale_hits', 'misses', 'coalesced', 'evictions', 'expired', 'refreshes', 'refresh_errors')]))
+        families.append((f'pokeassistant_{cache}_cache_entries', 'gauge', f'Entries in the in-memory {cache} cache',
+                         [({}, stats['size'])]))
+    prompts = get_prompt_stats()
+    families.append(('pokeassistant_prompts_total', 'counter', 'Prompts sent to Gemini', [({}, prompts['requests'])]))
+    families.append(('pokeassistant_prompt_tokens_total', 'counter', 'Prompt tokens sent to Gemini',
+                     [({'source': 'estimated'}, prompts['estimated_prompt_tokens']),
+                      ({'source': 'reported'}, prompts['reported_prompt_tokens'])]))
+    families.append(('pokeassistant_prefetch_total', 'counter', 'Follow-up prefetches by outcome',
+                     [({'outcome': outcome}, value) for outcome, value in prefetcher.stats.items()]))
+    assets = asset_cache.stats
+    families.append(('pokeassistant_asset_cache_events_total', 'counter', 'Asset proxy cache hits, downloads and evictions',
+                     [({'event': event}, value) for event, value in assets.items()]))
+    families.append(('pokeassistant_asset_cache_bytes', 'gauge', 'Bytes held in the asset cache', [({}, asset_cache.total_bytes)]))
+    families.append(('pokeassistant_sessions', 'gauge', 'Sessions held in memory', [({}, len(session_store))]))
+    limiters = get_limiter_stats()
+    families.append(('pokeassistant_upstream_in_flight', 'gauge', 'Calls in flight per upstream',
+                     [({'upstream': name}, stats['in_flight']) for name, stats in limiters.items()]))
+    families.append(('pokeassistant_upstream_queue_depth', 'gauge', 'Calls waiting for an upstream rate limiter slot',
+                     [({'upstream': name}, stats['waiting']) for name, stats in limiters.items()]))
+    breakers = get_breaker_stats()
+    families.append(('pokeassistant_circuit_open', 'gauge', 'Whether the upstream circuit breaker is open (0.5 = half open)',
+                     [({'upstream': name}, {'closed': 0, 'half_open': 0.5, 'open': 1}[stats['state']]) for name, stats in breakers.items()]))
+    families.append(('pokeassistant_circuit_opened_total', 'counter', 'Times the upstream circuit breaker opened',
+                     [({'upstream': name}, stats['opened']) for name, stats in breakers.items()]))
+    families.append(('pokeassistant_upstream_admitted_total', 'counter', 'Calls let through per upstream',
+                     [({'upstream': name}, stats['admitted']) for name, stats in limiters.items()]))
+    return families
+
+def metrics_response(request):
+    from starlette.responses import Response
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+# Only mounted when metrics are collected; otherwise the route does not exist at all
+if metrics.ENABLED:
+    extra_routes.append((METRICS_ROUTE, metrics_response, ['GET']))
 
 # ============== NEW INTELLIGENCE FUNCTIONS ==============
 
-def check_domain_compliance(user_input):
-    """Guardrail: Uses Gemini to ensure the query is related to Pokemon."""
-    pokemon_keywords = ['pokemon', 'poke', 'pikachu', 'charizard', 'nintendo', 'game', 'anime', 'type', 'move', 'gym', 'trainer', 'battle']
-    if any(kw in user_input.lower() for kw in pokemon_keywords):
-        return True
+# Words that on their own make a message clearly Pokémon/gaming related (en + ms)
+GAME_VOCABULARY = frozenset({
+    'pokemon', 'poke', 'pokedex', 'pokeball', 'nintendo', 'game', 'games', 'gaming', 'anime', 'manga',
+    'type', 'types', 'move', 'moves', 'moveset', 'gym', 'gyms', 'trainer', 'trainers', 'battle', 'battles',
+    'evolve', 'evolves', 'evolution', 'shiny', 'legendary', 'mythical', 'starter', 'starters', 'ability',
+    'abilities', 'stats', 'nature', 'natures', 'ev', 'evs', 'iv', 'ivs', 'stab', 'tera', 'raid', 'raids',
+    'nuzlocke', 'competitive', 'smogon', 'vgc', 'ou', 'uber', 'counter', 'counters', 'weakness', 'weaknesses',
+    'resist', 'resistance', 'super', 'effective', 'team', 'pokedex', 'region', 'kanto', 'johto', 'hoenn',
+    'sinnoh', 'unova', 'kalos', 'alola', 'galar', 'hisui', 'paldea', 'ash', 'misty', 'brock', 'rocket',
+    'switch', 'gameboy', 'mario', 'zelda', 'kirby', 'tcg', 'card', 'cards', 'catch', 'breeding', 'hatch',
+    'jenis', 'gerakan', 'pasukan', 'evolusi', 'permainan', 'jurulatih', 'lawan', 'kuat', 'lemah',
+})
+GREETINGS = frozenset({
+    'hi', 'hello', 'hey', 'yo', 'sup', 'hiya', 'howdy', 'morning', 'evening', 'thanks', 'thank', 'thx',
+    'you', 'bye', 'goodbye', 'ok', 'okay', 'cool', 'nice', 'good', 'great', 'lol', 'there', 'halo', 'hai',
+    'terima', 'kasih', 'selamat', 'pagi', 'petang', 'malam', 'jumpa', 'lagi',
+})
+OFF_TOPIC_VOCABULARY = frozenset({
+    'recipe', 'recipes', 'cook', 'cooking', 'bake', 'baking', 'ingredients', 'math', 'equation', 'calculus',
+    'algebra', 'integral', 'derivative', 'politics', 'political', 'election', 'president', 'government',
+    'stock', 'stocks', 'crypto', 'bitcoin', 'invest', 'investing', 'mortgage', 'loan', 'tax', 'taxes',
+    'weather', 'forecast', 'homework', 'essay', 'resume', 'python', 'javascript', 'sql', 'programming',
+    'diagnosis', 'symptoms', 'medicine', 'doctor', 'lawyer', 'legal', 'religion', 'translate', 'dating',
+    'resepi', 'masak', 'matematik', 'politik', 'cuaca', 'saham', 'cukai',
+})
+CJK_POKEMON_KEYWORDS = ('宝可梦', '寶可夢', '精灵', '口袋妖怪', '神奇宝贝', '皮卡丘', '道馆', '训练家', '属性', '技能', '进化', '任天堂', '游戏', '动漫', '对战', '队伍')
+CJK_GREETINGS = ('你好', '您好', '谢谢', '再见', '早上好', '晚上好', '嗨')
+CJK_OFF_TOPIC = ('食谱', '做饭', '数学', '方程', '政治', '选举', '股票', '天气', '作业', '税')
+
+@metrics.timed('domain_classify')
+def classify_domain(user_input):
+    """Local guardrail: 'ALLOWED', 'BLOCKED', or None when the input is ambiguous
+    and should go to the LLM guard. Runs in microseconds, no network."""
+    tokens = _normalize_name_text(user_input)
+    score = 0
+    index = get_name_index()
+    if index is not None:
+        score += 3 * len(_match_phrases(tokens, index['aliases'], index['max_words'], STOP_WORDS))
+        # Single-word moves/abilities are often plain English ("rest", "pressure"), so they count less
+        for _, length in _match_phrases(tokens, index['vocabulary'], 3, STOP_WORDS):
+            score += 2 if length > 1 else 1
+    score += 2 * sum(1 for t in tokens if t in GAME_VOCABULARY or t in TYPE_COLORS)
+    score += 2 * sum(1 for kw in CJK_POKEMON_KEYWORDS if kw in user_input)
+    off_topic = sum(1 for t in tokens if t in OFF_TOPIC_VOCABULARY) + sum(1 for kw in CJK_OFF_TOPIC if kw in user_input)
+
+    if score >= 4 or (score >= 2 and not off_topic):
+        return 'ALLOWED'
+    if off_topic and score == 0:
+        return 'BLOCKED'
+    if not off_topic and len(tokens) <= 5 and (
+        (tokens and all(t in GREETINGS for t in tokens)) or any(g in user_input for g in CJK_GREETINGS)
+    ):
+        return 'ALLOWED'
+    return None
 
+@metrics.timed('domain_llm')
+def llm_domain_check(user_input, deadline=None):
+    """Guardrail: Uses Gemini to decide whether ambiguous input is related to Pokemon."""
     prompt = f"""
     Analyze if the following user input is related to Pokémon, Nintendo, video games, anime culture, or casual chit-chat (greetings).
     Input: "{user_input}"
@@ -280,47 +2328,152 @@ def check_domain_compliance(user_input):
     Reply with only one word: "ALLOWED" or "BLOCKED".
     """
     try:
-        model = genai.GenerativeModel("gemini-2.5-flash-lite")
-        response = model.generate_content(prompt)
+        model = get_genai().GenerativeModel("gemini-2.5-flash-lite")
+        with gemini_breaker, gemini_limiter:
+            response = model.generate_content(prompt, request_options=gemini_request_options(deadline))
+        EXTERNAL_CALLS.inc(service='gemini_guard', outcome='ok')
         return "ALLOWED" in response.text.strip().upper()
+    except (UpstreamBusy, CircuitOpen, DeadlineExceeded):
+        return True  # Fail open like any other guard error, without counting it as an upstream failure
     except:
+        EXTERNAL_CALLS.inc(service='gemini_guard', outcome='error')
         return True
 
-def get_intelligent_response(user_message, pokemon_context_data=None, sentiment="neutral", language='en'):
-    """Generate an intelligent response with language support."""
-    global conversation_history
+def check_domain_compliance(user_input):
+    """Guardrail: ensure the query is related to Pokemon (local classifier first, LLM only if ambiguous)."""
+    verdict = classify_domain(user_input)
+    if verdict is not None:
+        return verdict == 'ALLOWED'
+    return llm_domain_check(user_input)
+
+FALLBACK_MESSAGES = {
+    'en': "I'm having trouble connecting to the network, but I'm still here! Try asking about a specific Pokémon like 'Pikachu' or 'Charizard' so I can look up their stats directly.",
+    'ms': "Saya menghadapi masalah sambungan rangkaian, tetapi saya masih di sini! Cuba tanya tentang Pokémon tertentu seperti 'Pikachu' atau 'Charizard' supaya saya boleh cari statistik mereka terus.",
+    'zh': "我在连接网络时遇到了问题，但我还在这里！试着询问特定的宝可梦，比如'皮卡丘'或'喷火龙'，这样我可以直接查找它们的数据。"
+}
+
+# Shown when the Gemini limiter sheds the request (see RateLimiter)
+BUSY_MESSAGES = {
+    'en': "Lots of trainers are asking questions right now! ⏳ Give me a few seconds and ask again.",
+    'ms': "Ramai jurulatih sedang bertanya sekarang! ⏳ Beri saya beberapa saat dan tanya sekali lagi.",
+    'zh': "现在有很多训练家在提问！⏳ 请稍等几秒钟再问一次。"
+}
+
+# ============== CONVERSATION CONTEXT ==============
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))  # verbatim recent turns
+SUMMARY_TOKEN_BUDGET = int(os.getenv("SUMMARY_TOKEN_BUDGET", "300"))  # rolling summary of older turns
+
+prompt_stats = {'requests': 0, 'estimated_prompt_tokens': 0, 'reported_prompt_tokens': 0, 'summarized_turns': 0}
+_prompt_stats_lock = threading.Lock()
+PROMPT_TOKENS = metrics.histogram('pokeassistant_prompt_size_tokens', 'Prompt size per Gemini request, as reported by Gemini (estimated when it does not say)',
+                                  buckets=(250, 500, 1000, 2000, 4000, 8000, 16000))
+_data_context_cache = OrderedDict()
+_data_context_lock = threading.Lock()
+
+def estimate_tokens(text):
+    """Cheap token estimate: ~4 characters per token, one per CJK character"""
+    cjk = sum(1 for ch in text if '\u3000' <= ch <= '\u9fff')
+    return cjk + (len(text) - cjk + 3) // 4
+
+def _first_sentence(text, limit):
+    sentence = re.split(r'(?<=[.!?。！？])\s', text.strip(), maxsplit=1)[0]
+    return sentence if len(sentence) <= limit else sentence[:limit].rstrip() + '…'
+
+def summarize_turn(entry):
+    """One-line extractive summary of a conversation turn (no extra LLM call)"""
+    user = _first_sentence(entry['user'], 120)
+    assistant = _first_sentence(entry['assistant'].replace('\n', ' ').replace('*', ''), 160)
+    return f"- User: {user} → Assistant: {assistant}"
+
+def build_conversation_context(session):
+    """Newest turns verbatim until CONTEXT_TOKEN_BUDGET is used; anything older is folded
+    (once, then cached on the session) into the rolling summary."""
+    with session.lock:
+        kept, used = [], 0
+        for entry in reversed(session.conversation_history):
+            turn = f"User: {entry['user']}\nAssistant: {entry['assistant'][:500]}...\n\n"
+            cost = estimate_tokens(turn)
+            if kept and used + cost > CONTEXT_TOKEN_BUDGET:
+                break
+            kept.append(turn)
+            used += cost
+        folded = len(session.conversation_history) - len(kept)
+        if folded:
+            session.fold_turns(folded)
+            with _prompt_stats_lock:
+                prompt_stats['summarized_turns'] += folded
+
+        context = ""
+        if session.summary_lines:
+            context += "\n## Earlier in this conversation (summary):\n" + "\n".join(session.summary_lines) + "\n"
+        if kept:
+            context += "\n## Recent Conversation:\n" + "".join(reversed(kept))
+        return context
+
+def build_data_context(pokemon_context_data):
+    """Verified-data block for a Pokémon; built once per Pokémon and reused"""
+    if not pokemon_context_data:
+        return ""
+    key = pokemon_context_data.name
+    with _data_context_lock:
+        cached = _data_context_cache.get(key)
+        if cached is not None:
+            _data_context_cache.move_to_end(key)
+            return cached
+
+    p_name = pokemon_context_data.name.capitalize()
+    types = pokemon_context_data.types
+    stats = pokemon_context_data.stats
+    abilities = [name for name, _ in pokemon_context_data.abilities]
+    matchups = weakness_table(types)
+    weak_to = [f"{t} ({m:g}x)" for m in (4.0, 2.0) for t in matchups.get(m, [])]
+    resists = [f"{t} ({m:g}x)" for m in (0.5, 0.25) for t in matchups.get(m, [])]
+    counters = best_counters(types, exclude=pokemon_context_data.name)
     
-    conversation_context = ""
-    if conversation_history:
-        recent_history = conversation_history[-10:]
-        conversation_context = "\n## Recent Conversation:\n"
-        for entry in recent_history:
-            conversation_context += f"User: {entry['user']}\nAssistant: {entry['assistant'][:500]}...\n\n"
-            
-    data_context = ""
-    if pokemon_context_data:
-        p_name = pokemon_context_data.get('name', 'Unknown').capitalize()
-        types = [t['type']['name'] for t in pokemon_context_data.get('types', [])]
-        stats = {s['stat']['name']: s['base_stat'] for s in pokemon_context_data.get('stats', [])}
-        abilities = [a['ability']['name'] for a in pokemon_context_data.get('abilities', [])]
-        
-        data_context = f"""
+    data_context = f"""
         [SYSTEM: REAL-TIME DATA INJECTION]
         Use this verified data to answer the user:
         - Pokémon: {p_name}
         - Types: {', '.join(types)}
         - Stats: {json.dumps(stats)}
         - Abilities: {', '.join(abilities)}
+        - Weak to: {', '.join(weak_to) or 'nothing'}
+        - Resists: {', '.join(resists) or 'nothing'}
+        - Immune to: {', '.join(matchups.get(0.0, [])) or 'nothing'}
         """
+    if counters:
+        data_context += f"""- Best counters: {', '.join(name for name, _, _ in counters)}
+        """
+    with _data_context_lock:
+        _data_context_cache[key] = data_context
+        while len(_data_context_cache) > 256:
+            _data_context_cache.popitem(last=False)
+    return data_context
+
+def get_prompt_stats():
+    with _prompt_stats_lock:
+        stats = dict(prompt_stats)
+    if stats['requests']:
+        stats['avg_estimated_prompt_tokens'] = stats['estimated_prompt_tokens'] / stats['requests']
+    return stats
+
+def build_prompt(user_message, pokemon_context_data=None, sentiment="neutral", language='en', session=None, verified_context=""):
+    """Assemble the full Gemini prompt: cached system prompt, budgeted conversation context, verified data.
+    verified_context carries extra computed facts, e.g. the optimized team for team-building questions."""
+    session = session or SessionState()
+    conversation_context = build_conversation_context(session)
+    data_context = build_data_context(pokemon_context_data)
         
     preferences_context = ""
-    if favorites:
-        preferences_context += f"\n## Favorites: {', '.join([p.capitalize() for p in favorites])}\n"
+    if session.favorites:
+        preferences_context += f"\n## Favorites: {', '.join([p.capitalize() for p in session.favorites])}\n"
 
-    full_prompt = f"""{get_system_prompt(language)}
+    return f"""{get_system_prompt(language)}
 
 {conversation_context}
 {data_context}
+{verified_context}
 {preferences_context}
 
 ## Current Interaction:
@@ -334,29 +2487,151 @@ User Message: {user_message}
 
 Respond now:"""
 
+# ============== ANSWER CACHE ==============
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "1") == "1"
+# Words that make a question depend on earlier turns, so its answer must not be reused
+FOLLOW_UP_WORDS = frozenset({
+    'it', 'its', 'he', 'she', 'they', 'them', 'their', 'him', 'her', 'this', 'that', 'these', 'those',
+    'again', 'more', 'else', 'also', 'previous', 'earlier', 'above', 'same', 'instead', 'then', 'one',
+    'dia', 'ini', 'itu', 'lagi', '它', '它的', '这个', '那个', '再',
+})
+
+# Expired answers are kept ANSWER_CACHE_STALE_TTL longer, only as a fallback while Gemini is failing
+answer_cache = ResponseCache(
+    ANSWER_CACHE_PATH,
+    max_entries=int(os.getenv("ANSWER_CACHE_SIZE", "512")),
+    ttl=int(os.getenv("ANSWER_CACHE_TTL", str(24 * 3600))),
+    table='answers',
+    stale_ttl=int(os.getenv("ANSWER_CACHE_STALE_TTL", str(7 * 24 * 3600)))
+)
+
+def normalize_query(text):
+    """Case, width and punctuation-insensitive form of a question ("Pikachu stats?!" -> "pikachu stats")"""
+    text = unicodedata.normalize('NFKC', text).lower()
+    text = re.sub(r"[^\w\s'-]", ' ', text)
+    return ' '.join(text.split())
+
+def answer_cache_key(user_message, pokemon_names, intent, language, session=None):
+    """Canonical answer-cache key, or None for context-dependent follow-ups that must not be cached.
+    A question naming no Pokémon in a conversation that is already going ("which one is faster?")
+    may lean on earlier turns in ways FOLLOW_UP_WORDS cannot catch, so it is not cached either."""
+    if not ANSWER_CACHE_ENABLED:
+        return None
+    normalized = normalize_query(user_message)
+    if not normalized or FOLLOW_UP_WORDS & set(normalized.split()):
+        return None
+    if not pokemon_names and session is not None and (session.conversation_history or session.summary_lines):
+        return None
+    raw = json.dumps([normalized, list(pokemon_names), intent, language], ensure_ascii=False)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+def session_answer_key(cache_key, session):
+    """cache_key narrowed to the session's favorites, which build_prompt puts in the prompt;
+    sessions without favorites share the plain key"""
+    if not cache_key or not session.favorites:
+        return cache_key
+    raw = json.dumps([cache_key, sorted(session.favorites)], ensure_ascii=False)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+def get_answer_cache_stats():
+    stats = dict(answer_cache.stats, size=len(answer_cache))
+    lookups = stats['hits'] + stats['disk_hits'] + stats['misses']
+    stats['hit_rate'] = (stats['hits'] + stats['disk_hits']) / lookups if lookups else 0.0
+    return stats
+
+LLM_FIRST_TOKEN = metrics.histogram('pokeassistant_llm_first_token_seconds', 'Time from sending the prompt to the first streamed Gemini chunk')
+
+def stream_intelligent_response(user_message, pokemon_context_data=None, sentiment="neutral", language='en', session=None, cache_key=None, verified_context="", deadline=None):
+    """Stream the answer from Gemini, yielding the text accumulated so far after every chunk.
+    The exchange is added to the session's conversation history once the stream completes.
+    With a cache_key (see answer_cache_key) repeat questions are answered from the answer cache,
+    and while Gemini is failing an expired cached answer is better than the fallback message."""
+    session = session or SessionState()
+    cache_key = session_answer_key(cache_key, session)
+    if cache_key:
+        cached = answer_cache.get(cache_key)
+        if cached is not None:
+            session.add_exchange(user_message, cached)
+            yield cached
+            return
+
+    full_prompt = build_prompt(user_message, pokemon_context_data, sentiment, language, session, verified_context)
+    estimated_tokens = estimate_tokens(full_prompt)
+    reported_tokens = None
+    assistant_response = ""
+    complete = False
+    first_chunk = True
     try:
-        model = genai.GenerativeModel("gemini-2.5-flash-lite")
-        response = model.generate_content(full_prompt)
-        
-        if response and response.text:
-            assistant_response = response.text.strip()
-            
-            conversation_history.append({'user': user_message, 'assistant': assistant_response})
-            if len(conversation_history) > 20:
-                conversation_history = conversation_history[-20:]
-                
-            return assistant_response
-            
-        raise Exception("Empty response from AI")
+        request_options = gemini_request_options(deadline)
+        gemini_breaker.allow()
+        gemini_limiter.acquire()  # held until the stream ends
+    except (UpstreamBusy, CircuitOpen, DeadlineExceeded) as e:
+        print(f"⏳ {e}")
+        stale = answer_cache.get(cache_key, allow_stale=True) if cache_key else None
+        if stale is not None:
+            session.add_exchange(user_message, stale)
+            yield stale
+        else:
+            yield (BUSY_MESSAGES if isinstance(e, UpstreamBusy) else FALLBACK_MESSAGES).get(language, FALLBACK_MESSAGES['en'])
+        return
+    try:
+        model = get_genai().GenerativeModel("gemini-2.5-flash-lite")
+        sent_at = time.perf_counter()
+        for chunk in model.generate_content(full_prompt, stream=True, request_options=request_options):
+            if first_chunk:
+                LLM_FIRST_TOKEN.observe(time.perf_counter() - sent_at)
+                first_chunk = False
+            usage = getattr(chunk, 'usage_metadata', None)
+            if usage is not None and getattr(usage, 'prompt_token_count', None):
+                reported_tokens = usage.prompt_token_count
+            try:
+                text = chunk.text
+            except ValueError:  # chunk without text parts (e.g. safety metadata)
+                continue
+            if text:
+                assistant_response += text
+                yield assistant_response
+
+        if not assistant_response.strip():
+            raise Exception("Empty response from AI")
+        complete = True
+        gemini_breaker.record_success()
+        EXTERNAL_CALLS.inc(service='gemini', outcome='ok')
 
     except Exception as e:
+        gemini_breaker.record_failure()
+        EXTERNAL_CALLS.inc(service='gemini', outcome='error')
         print(f"❌ GEMINI API ERROR: {str(e)}")
-        fallback_messages = {
-            'en': "I'm having trouble connecting to the network, but I'm still here! Try asking about a specific Pokémon like 'Pikachu' or 'Charizard' so I can look up their stats directly.",
-            'ms': "Saya menghadapi masalah sambungan rangkaian, tetapi saya masih di sini! Cuba tanya tentang Pokémon tertentu seperti 'Pikachu' atau 'Charizard' supaya saya boleh cari statistik mereka terus.",
-            'zh': "我在连接网络时遇到了问题，但我还在这里！试着询问特定的宝可梦，比如'皮卡丘'或'喷火龙'，这样我可以直接查找它们的数据。"
-        }
-        return fallback_messages.get(language, fallback_messages['en'])
+        if not assistant_response.strip():
+            stale = answer_cache.get(cache_key, allow_stale=True) if cache_key else None
+            if stale is not None:
+                session.add_exchange(user_message, stale)
+                yield stale
+            else:
+                yield FALLBACK_MESSAGES.get(language, FALLBACK_MESSAGES['en'])
+            return
+    finally:
+        gemini_limiter.release()
+        with _prompt_stats_lock:
+            prompt_stats['requests'] += 1
+            prompt_stats['estimated_prompt_tokens'] += estimated_tokens
+            prompt_stats['reported_prompt_tokens'] += reported_tokens or 0
+        PROMPT_TOKENS.observe(reported_tokens or estimated_tokens)
+
+    if assistant_response != assistant_response.strip():
+        assistant_response = assistant_response.strip()
+        yield assistant_response
+    session.add_exchange(user_message, assistant_response)
+    if cache_key and complete:  # never cache a stream that broke off halfway
+        answer_cache.set(cache_key, assistant_response)
+
+def get_intelligent_response(user_message, pokemon_context_data=None, sentiment="neutral", language='en', session=None, cache_key=None, verified_context="", deadline=None):
+    """Generate an intelligent response with language support (blocking)."""
+    response = ""
+    for response in stream_intelligent_response(user_message, pokemon_context_data, sentiment, language, session, cache_key, verified_context, deadline):
+        pass
+    return response
 
 def analyze_user_input(user_input):
     """Simple local analysis to detect sentiment and intent."""
@@ -386,16 +2661,26 @@ def analyze_user_input(user_input):
 
 # ============== UI HELPER FUNCTIONS ==============
 
+# Rendered fragments are memoized: the same Pokémon, chips and chat entries come up again and again
+
 def create_type_badges(types):
+    return _type_badges(tuple(types))
+
+@functools.lru_cache(maxsize=512)
+def _type_badges(types):
     return " ".join([
         f'<span style="background: {TYPE_COLORS.get(t, "#888")}; color: white; padding: 4px 12px; border-radius: 12px; font-weight: bold; font-size: 0.85em; text-transform: uppercase; margin-right: 5px;">{t}</span>'
         for t in types
     ])
 
 def create_stats_html(stats, max_stat=255):
-    hp, atk, defense = stats['hp'], stats['attack'], stats['defense']
-    sp_atk, sp_def, speed = stats['special-attack'], stats['special-defense'], stats['speed']
-    
+    return _stats_html(
+        stats['hp'], stats['attack'], stats['defense'],
+        stats['special-attack'], stats['special-defense'], stats['speed'], max_stat
+    )
+
+@functools.lru_cache(maxsize=2048)
+def _stats_html(hp, atk, defense, sp_atk, sp_def, speed, max_stat):
     return f"""
     <div style="margin-top: 16px; display: grid; gap: 10px;">
         <div style="display: grid; grid-template-columns: 70px 1fr 40px; align-items: center; gap: 12px;">
@@ -443,51 +2728,39 @@ def create_stats_html(stats, max_stat=255):
     </div>
     """
 
-def add_to_history(pokemon_name):
-    global search_history
-    if pokemon_name not in search_history:
-        search_history.insert(0, pokemon_name)
-        if len(search_history) > 10:
-            search_history = search_history[:10]
-
-def toggle_favorite(pokemon_name, language='en'):
-    global favorites
-    if pokemon_name in favorites:
-        favorites.remove(pokemon_name)
-        return TRANSLATIONS[language]['removed_fav'].format(name=pokemon_name.capitalize())
-    else:
-        favorites.append(pokemon_name)
+def add_to_history(session, pokemon_name):
+    session.add_search(pokemon_name)
+
+def toggle_favorite(session, pokemon_name, language='en'):
+    if session.toggle_favorite(pokemon_name):
         return TRANSLATIONS[language]['added_fav'].format(name=pokemon_name.capitalize())
+    return TRANSLATIONS[language]['removed_fav'].format(name=pokemon_name.capitalize())
+
+@functools.lru_cache(maxsize=1024)
+def _history_chip(pokemon_name):
+    thumb = f'<img src="{asset_src(pokemon_name, "sprite", 48)}" alt="" loading="lazy" onerror="this.remove()" style="width: 20px; height: 20px; vertical-align: middle; margin-right: 4px;">'
+    return f'<span style="background: #21262d; color: #8b949e; padding: 4px 10px; border-radius: 8px; margin: 2px; font-size: 0.8em; cursor: pointer;">{thumb}{pokemon_name.capitalize()}</span>'
+
+@functools.lru_cache(maxsize=1024)
+def _favorite_chip(pokemon_name):
+    return f'<span style="background: linear-gradient(135deg, #f85149, #da3633); color: white; padding: 4px 10px; border-radius: 8px; margin: 2px; font-size: 0.8em;">❤️ {pokemon_name.capitalize()}</span>'
 
-def get_history_html(language='en'):
+def get_history_html(session, language='en'):
+    search_history = session.search_history if session else []
     if not search_history:
         return f'<span style="color: #8b949e;">{TRANSLATIONS[language]["no_searches"]}</span>'
-    return " ".join([
-        f'<span style="background: #21262d; color: #8b949e; padding: 4px 10px; border-radius: 8px; margin: 2px; font-size: 0.8em; cursor: pointer;">{p.capitalize()}</span>'
-        for p in search_history[:5]
-    ])
+    return " ".join([_history_chip(p) for p in search_history[:5]])
 
-def get_favorites_html(language='en'):
+def get_favorites_html(session, language='en'):
+    favorites = session.favorites if session else []
     if not favorites:
         return f'<span style="color: #8b949e;">{TRANSLATIONS[language]["no_favorites"]}</span>'
-    return " ".join([
-        f'<span style="background: linear-gradient(135deg, #f85149, #da3633); color: white; padding: 4px 10px; border-radius: 8px; margin: 2px; font-size: 0.8em;">❤️ {p.capitalize()}</span>'
-        for p in favorites[:5]
-    ])
+    return " ".join([_favorite_chip(p) for p in favorites[:5]])
 
-def get_chat_history_html(language='en'):
-    """NEW: Generate HTML for chat history display"""
-    global chat_display_history
-    if not chat_display_history:
-        return f'<div style="color: #8b949e; text-align: center; padding: 20px;">{TRANSLATIONS[language]["no_history"]}</div>'
-    
-    html = '<div style="display: flex; flex-direction: column; gap: 12px; max-height: 400px; overflow-y: auto; padding: 10px;">'
-    for entry in reversed(chat_display_history[-10:]):  # Show last 10 messages
-        timestamp = entry.get('timestamp', '')
-        user_msg = entry.get('user', '')
-        ai_msg = entry.get('assistant', '')[:200] + '...' if len(entry.get('assistant', '')) > 200 else entry.get('assistant', '')
-        
-        html += f'''
+@functools.lru_cache(maxsize=1024)
+def _chat_entry_html(timestamp, user_msg, assistant_msg):
+    ai_msg = assistant_msg[:200] + '...' if len(assistant_msg) > 200 else assistant_msg
+    return f'''
         <div style="background: rgba(88, 166, 255, 0.1); border-left: 3px solid #58a6ff; padding: 10px; border-radius: 8px;">
             <div style="color: #58a6ff; font-size: 0.75rem; margin-bottom: 4px;">{timestamp}</div>
             <div style="color: #c9d1d9; font-size: 0.85rem;"><strong>You:</strong> {user_msg}</div>
@@ -496,33 +2769,113 @@ def get_chat_history_html(language='en'):
             <div style="color: #c9d1d9; font-size: 0.85rem;"><strong>Assistant:</strong> {ai_msg}</div>
         </div>
         '''
+
+def get_chat_history_html(session, language='en'):
+    """NEW: Generate HTML for chat history display"""
+    chat_display_history = session.chat_display_history if session else []
+    if not chat_display_history:
+        return f'<div style="color: #8b949e; text-align: center; padding: 20px;">{TRANSLATIONS[language]["no_history"]}</div>'
+    
+    html = '<div style="display: flex; flex-direction: column; gap: 12px; max-height: 400px; overflow-y: auto; padding: 10px;">'
+    for entry in reversed(chat_display_history[-10:]):  # Show last 10 messages
+        html += _chat_entry_html(entry.get('timestamp', ''), entry.get('user', ''), entry.get('assistant', ''))
     html += '</div>'
     return html
 
-def clear_chat_history(language='en'):
+SIDEBAR_RENDERERS = {
+    'history': get_history_html,
+    'favorites': get_favorites_html,
+    'chat': get_chat_history_html,
+}
+
+def mark_rendered(session, slot, stamp):
+    """Record that `slot` now shows `stamp` for this client; False if it already did (nothing to send)"""
+    if session is None:
+        return True
+    with session.lock:
+        if session.rendered.get(slot) == stamp:
+            return False
+        session.rendered[slot] = stamp
+        return True
+
+def render_sidebar(session, slot, language='en', force=False):
+    """Sidebar HTML for `slot`, or a gr.update() no-op when the client is already up to date"""
+    import gradio as gr
+
+    if session is not None:
+        with session.lock:
+            stamp = (session.versions[slot], language)
+            if force:
+                session.rendered[slot] = stamp
+            elif not mark_rendered(session, slot, stamp):
+                return gr.update()
+    return SIDEBAR_RENDERERS[slot](session, language)
+
+def sidebar_outputs(session, language='en'):
+    """history_output, favorites_output, chat_history_output - only the ones that changed"""
+    return tuple(render_sidebar(session, slot, language) for slot in ('history', 'favorites', 'chat'))
+
+def clear_chat_history(session, language='en'):
     """NEW: Clear chat history"""
-    global chat_display_history, conversation_history
-    chat_display_history = []
-    conversation_history = []
-    return get_chat_history_html(language), TRANSLATIONS[language]['history_cleared']
+    session.clear_chat()
+    return render_sidebar(session, 'chat', language), TRANSLATIONS[language]['history_cleared']
+
+@metrics.timed('render_matchups')
+def create_matchup_html(pokemon_data, language='en'):
+    """Weakness/resistance table and dex-wide counters for the counter panel"""
+    return _matchup_html(pokemon_data.name, pokemon_data.types, language)
+
+@functools.lru_cache(maxsize=512)
+def _matchup_html(pokemon_name, types, language):
+    rows = ""
+    for multiplier, attacking_types in weakness_table(types).items():
+        color = '#f85149' if multiplier > 1 else '#3fb950'
+        rows += f"""
+        <div style="display: grid; grid-template-columns: 50px 1fr; align-items: center; gap: 10px; margin-bottom: 8px;">
+            <span style="color: {color}; font-weight: 600; font-size: 0.85rem;">{multiplier:g}×</span>
+            <div style="line-height: 2;">{create_type_badges(attacking_types)}</div>
+        </div>"""
+
+    counters = best_counters(types, exclude=pokemon_name)
+    counters_html = ""
+    if counters:
+        items = " ".join(
+            f'<span style="background: #21262d; color: #c9d1d9; padding: 4px 10px; border-radius: 12px; font-size: 0.85rem;">'
+            f'{name.capitalize()} <span style="color: #8b949e;">{dealt:g}× / {taken:g}×</span></span>'
+            for name, dealt, taken in counters
+        )
+        counters_html = f"""
+        <h4 style="color: #ffcb05; margin: 16px 0 10px 0;">{TRANSLATIONS[language]['best_counters']}</h4>
+        <div style="display: flex; flex-wrap: wrap; gap: 6px;">{items}</div>"""
+
+    return f"""
+    <div style="padding: 20px; background: rgba(22, 27, 34, 0.9); border-radius: 16px; border: 1px solid rgba(255,255,255,0.1); margin-top: 15px;">
+        <h4 style="color: #ffcb05; margin: 0 0 12px 0;">{TRANSLATIONS[language]['matchups']}</h4>
+        {rows}
+        {counters_html}
+    </div>
+    """
 
 # NEW: Function to create head-to-head comparison HTML
+@metrics.timed('render_comparison')
 def create_comparison_html(pokemon1_data, pokemon2_data, show_shiny=False, language='en'):
     """Generates HTML for comparing two Pokémon"""
     if not pokemon1_data or not pokemon2_data:
         return "<p>Error fetching Pokémon data for comparison.</p>"
 
-    p1_name = pokemon1_data['name'].capitalize()
-    p2_name = pokemon2_data['name'].capitalize()
+    p1_name = pokemon1_data.name.capitalize()
+    p2_name = pokemon2_data.name.capitalize()
     
-    p1_types = [t['type']['name'] for t in pokemon1_data['types']]
-    p2_types = [t['type']['name'] for t in pokemon2_data['types']]
+    p1_types = pokemon1_data.types
+    p2_types = pokemon2_data.types
     
-    p1_stats = {s['stat']['name']: s['base_stat'] for s in pokemon1_data['stats']}
-    p2_stats = {s['stat']['name']: s['base_stat'] for s in pokemon2_data['stats']}
+    p1_stats = pokemon1_data.stats
+    p2_stats = pokemon2_data.stats
 
-    p1_sprite = pokemon1_data['sprites']['other']['official-artwork'].get('front_shiny' if show_shiny else 'front_default') or pokemon1_data['sprites']['front_default']
-    p2_sprite = pokemon2_data['sprites']['other']['official-artwork'].get('front_shiny' if show_shiny else 'front_default') or pokemon2_data['sprites']['front_default']
+    # Thumbnails from the local asset proxy: the artwork is shown at most 150px wide
+    variant = 'shiny' if show_shiny else 'artwork'
+    p1_sprite = asset_src(pokemon1_data.name, variant, 150)
+    p2_sprite = asset_src(pokemon2_data.name, variant, 150)
 
     p1_type_badges = create_type_badges(p1_types)
     p2_type_badges = create_type_badges(p2_types)
@@ -556,111 +2909,247 @@ def create_comparison_html(pokemon1_data, pokemon2_data, show_shiny=False, langu
 
 # ============== MAIN RESPONSE FUNCTIONS ==============
 
-def chat_response(user_input, show_shiny=False, current_pokemon_state=None, language='en'):
-    """Main chat response function with memory and language support."""
-    global search_history, favorites, chat_display_history
-    
-    if not check_domain_compliance(user_input):
-        domain_messages = {
-            'en': "🚫 I can only talk about Pokémon and related gaming topics! Let's get back to training! 🧢",
-            'ms': "🚫 Saya hanya boleh bercakap tentang Pokémon dan topik permainan berkaitan! Mari kembali berlatih! 🧢",
-            'zh': "🚫 我只能谈论宝可梦和相关的游戏话题！让我们回到训练吧！🧢"
-        }
-        return (
-            gr.update(visible=False),
-            "🚫 Domain Restriction", 
-            "", "", 
-            f"<div style='padding: 20px; color: #f85149;'>{domain_messages[language]}</div>", 
-            "", "", "", 
-            current_pokemon_state,
-            get_history_html(language), get_favorites_html(language), get_chat_history_html(language), "", gr.update(visible=False)
-        )
+def add_chat_display_entry(session, user_input, ai_response):
+    timestamp = datetime.now().strftime("%H:%M")
+    session.add_chat_entry({
+        'timestamp': timestamp,
+        'user': user_input,
+        'assistant': ai_response
+    })
 
-    if not user_input.strip():
-        return (
-            gr.update(visible=False), 
-            "Please enter a Pokémon name or question!", 
-            "", "", "", "", "", "", 
-            current_pokemon_state, 
-            get_history_html(language), get_favorites_html(language), get_chat_history_html(language), "", gr.update(visible=False)
-        )
+def _answer_update(current_pokemon_state, desc_html, chat_history_html=None):
+    """Outputs tuple that only touches desc_output (and optionally the chat history)"""
+    import gradio as gr
+
+    return (
+        gr.update(), gr.update(), gr.update(), gr.update(),
+        desc_html,
+        gr.update(), gr.update(), gr.update(),
+        current_pokemon_state,
+        gr.update(), gr.update(),
+        chat_history_html if chat_history_html is not None else gr.update(),
+        gr.update(), gr.update()
+    )
+
+# Outputs that make up the card: sprite, name, types, stats, counters, extra, cry url, cry label, cry player
+CARD_OUTPUTS = frozenset((0, 1, 2, 3, 5, 6, 7, 12, 13))
+
+def skip_unchanged_card(session, card_key, frame):
+    """Turn the card outputs into no-ops when this client already shows the card identified by card_key"""
+    import gradio as gr
+
+    if mark_rendered(session, 'card', card_key):
+        return frame
+    return tuple(gr.update() if i in CARD_OUTPUTS else value for i, value in enumerate(frame))
+
+def stream_answer(session, user_input, pokemon_data, sentiment, language, current_pokemon_state, render, cache_key=None, verified_context="", deadline=None):
+    """Stream the LLM answer into desc_output, then record it in the chat history."""
+    ai_response = ""
+    for ai_response in stream_intelligent_response(user_input, pokemon_data, sentiment, language, session, cache_key, verified_context, deadline):
+        yield _answer_update(current_pokemon_state, render(ai_response + " ▌"))
+
+    add_chat_display_entry(session, user_input, ai_response)
+    yield _answer_update(current_pokemon_state, render(ai_response), render_sidebar(session, 'chat', language))
+
+DOMAIN_MESSAGES = {
+    'en': "🚫 I can only talk about Pokémon and related gaming topics! Let's get back to training! 🧢",
+    'ms': "🚫 Saya hanya boleh bercakap tentang Pokémon dan topik permainan berkaitan! Mari kembali berlatih! 🧢",
+    'zh': "🚫 我只能谈论宝可梦和相关的游戏话题！让我们回到训练吧！🧢"
+}
+
+def domain_blocked_outputs(session, current_pokemon_state, language='en'):
+    import gradio as gr
+
+    return skip_unchanged_card(session, ('blocked', language), (
+        gr.update(visible=False),
+        "🚫 Domain Restriction", 
+        "", "", 
+        f"<div style='padding: 20px; color: #f85149;'>{DOMAIN_MESSAGES[language]}</div>", 
+        "", "", "", 
+        current_pokemon_state,
+        *sidebar_outputs(session, language), "", gr.update(visible=False)
+    ))
+
+def plan_request(user_input, current_pokemon_state, language, trace, deadline, known_pokemon=None, session=None):
+    """Everything before the answer, without any UI: domain check, name extraction and data fetch.
+
+    Returns a dict whose 'path' is 'blocked', 'comparison' (with 'names' and 'pokemon', two records),
+    'single' (one record) or 'general' (none), plus the 'cache_key' for the answer and, for single
+    and general, the 'analysis' of the input and whether the name came from the previous turn.
+    The session only decides whether a general answer may be cached (see answer_cache_key)."""
+    # Local guardrail decides most inputs instantly; only ambiguous ones go to the
+    # LLM guard, which then runs alongside name extraction and data fetching
+    with trace.span('domain_check'):
+        verdict = 'ALLOWED' if known_pokemon is not None else classify_domain(user_input)
+    if verdict == 'BLOCKED':
+        trace.label(path='blocked')
+        return {'path': 'blocked'}
+    data_deadline = deadline.stage(DATA_DEADLINE)
+    domain_guard = background_executor.submit(llm_domain_check, user_input, data_deadline) if verdict is None else None
+
+    def domain_allowed():
+        # The guard fails open, so does running out of time waiting for it
+        if domain_guard is None:
+            return True
+        with trace.span('domain_wait'):
+            try:
+                return domain_guard.result(timeout=data_deadline.remaining())
+            except FutureTimeout:
+                return True
 
     # NEW: Check for head-to-head comparison first
-    pokemon1_name, pokemon2_name = extract_two_pokemon_names(user_input)
+    with trace.span('extract'):
+        pokemon1_name, pokemon2_name = extract_two_pokemon_names(user_input, data_deadline) if known_pokemon is None else (None, None)
     
     if pokemon1_name and pokemon2_name:
-        p1_data = get_pokemon_data(pokemon1_name)
-        p2_data = get_pokemon_data(pokemon2_name)
-
-        if p1_data and p2_data:
-            current_pokemon_state = f"{pokemon1_name} vs {pokemon2_name}" # Update state to reflect comparison
-            comparison_html = create_comparison_html(p1_data, p2_data, show_shiny, language)
-            
-            # Generate AI response for comparison
-            ai_response = get_intelligent_response(user_input, None, "neutral", language) # Pass None as context since we have custom display
-            
-            # NEW: Add to chat display history
-            timestamp = datetime.now().strftime("%H:%M")
-            chat_display_history.append({
-                'timestamp': timestamp,
-                'user': user_input,
-                'assistant': ai_response
-            })
-            if len(chat_display_history) > 50:
-                chat_display_history = chat_display_history[-50:]
-
-            combined_response_html = f"""
-            <div style="padding: 25px; background: rgba(22, 27, 34, 0.9); border-radius: 16px; border: 1px solid rgba(255,255,255,0.1);">
-                <div style="margin-bottom: 25px;">{comparison_html}</div>
-                <div style="color: #c9d1d9; line-height: 1.8; white-space: pre-wrap; padding-top: 20px; border-top: 1px solid rgba(255,255,255,0.05);">{ai_response}</div>
-            </div>
-            """
+        with trace.span('fetch'):
+            p1_data, p2_data = fetch_concurrently(functools.partial(get_pokemon_data, deadline=data_deadline), pokemon1_name, pokemon2_name)
 
-            return (
-                gr.update(visible=False), # Hide single sprite
-                f"# {pokemon1_name.capitalize()} vs {pokemon2_name.capitalize()}", 
-                "", "", # Hide single type/stats
-                combined_response_html, # Show comparison and AI response
-                "", "", "", 
-                current_pokemon_state, # Update state
-                get_history_html(language), get_favorites_html(language), get_chat_history_html(language), "", gr.update(visible=False)
-            )
+        if not domain_allowed():
+            trace.label(path='blocked')
+            return {'path': 'blocked'}
 
+        if p1_data and p2_data:
+            trace.label(path='comparison')
+            return {
+                'path': 'comparison',
+                'names': (pokemon1_name, pokemon2_name),
+                'pokemon': (p1_data, p2_data),
+                'cache_key': answer_cache_key(user_input, [pokemon1_name, pokemon2_name], 'comparison', language),
+            }
 
     # Original single Pokémon logic
-    pokemon_name = extract_pokemon_name(user_input)
+    with trace.span('extract'):
+        pokemon_name = extract_pokemon_name(user_input, data_deadline) if known_pokemon is None else known_pokemon.name
+    resolved_from_context = False
     
     if not pokemon_name and current_pokemon_state:
         pronouns = ['it', 'its', 'he', 'she', 'they', 'this pokemon', 'him', 'her']
         if any(p in user_input.lower().split() for p in pronouns):
             pokemon_name = current_pokemon_state
+            resolved_from_context = True
 
     input_analysis = analyze_user_input(user_input)
-    user_sentiment = input_analysis.get('sentiment', 'neutral')
+
+    with trace.span('fetch'):
+        if known_pokemon is not None:
+            pokemon_data = known_pokemon
+        else:
+            pokemon_data = get_pokemon_data(pokemon_name, data_deadline) if pokemon_name else None
+
+    if not domain_allowed():
+        trace.label(path='blocked')
+        return {'path': 'blocked'}
+
+    trace.label(path='single' if pokemon_data else 'general')
+    # The next question is likely about the same Pokémon ("how does it evolve?")
+    prefetcher.schedule(pokemon_data)
+    # Pronoun follow-ups depend on the previous turn, so they bypass the answer cache
+    cache_key = None
+    if not resolved_from_context:
+        cache_key = answer_cache_key(user_input, [pokemon_name] if pokemon_data else [], input_analysis['intent'], language, session)
+    return {
+        'path': 'single' if pokemon_data else 'general',
+        'name': pokemon_name if pokemon_data else None,
+        'pokemon': pokemon_data,
+        'analysis': input_analysis,
+        'resolved_from_context': resolved_from_context,
+        'cache_key': cache_key,
+    }
+
+def verified_context_for(plan, user_input, trace, deadline=None):
+    """Extra verified data for the prompt. Team questions get a real optimized team (built around the
+    mentioned Pokémon, if any) instead of an invented one; questions about a Pokémon's evolution,
+    abilities or species get those facts (see follow_up_facts)."""
+    blocks = []
+    if plan['analysis']['intent'] == 'team_building':
+        with trace.span('team'):
+            blocks.append(build_team_context(user_input, plan['pokemon']))
+    topics = follow_up_topics(user_input) if plan['pokemon'] else []
+    if topics:
+        with trace.span('follow_up'):
+            blocks.append(follow_up_facts(plan['pokemon'], topics, deadline.stage(DATA_DEADLINE) if deadline else None))
+    return "".join(blocks)
+
+def chat_response(user_input, show_shiny=False, current_pokemon_state=None, language='en', session=None, known_pokemon=None):
+    """Main chat response handler with memory and language support.
+
+    Generator: the Pokémon card is yielded as soon as its data is available,
+    then the assistant's answer streams into desc_output token by token.
+    History and favorites live on `session` (see get_session).
+    known_pokemon is an already fetched record for the Pokémon named by user_input (the RANDOM
+    button); it skips the domain check, name resolution and fetch.
+    Upstream calls share a REQUEST_DEADLINE budget, DATA_DEADLINE of it for everything before the card.
+    With METRICS_ENABLED=1 every request is traced stage by stage (see metrics.py)."""
+    trace = metrics.trace()
+    CHAT_IN_FLIGHT.inc()
+    try:
+        yield from _chat_response(user_input, show_shiny, current_pokemon_state, language, session, trace, Deadline(REQUEST_DEADLINE), known_pokemon)
+    finally:
+        CHAT_IN_FLIGHT.dec()
+        trace.finish()
+
+def _chat_response(user_input, show_shiny, current_pokemon_state, language, session, trace, deadline, known_pokemon=None):
+    import gradio as gr
+
+    session = session or SessionState()
+    if not user_input.strip():
+        trace.label(path='empty')
+        yield skip_unchanged_card(session, ('empty',), (
+            gr.update(visible=False), 
+            "Please enter a Pokémon name or question!", 
+            "", "", "", "", "", "", 
+            current_pokemon_state, 
+            *sidebar_outputs(session, language), "", gr.update(visible=False)
+        ))
+        return
+
+    plan = plan_request(user_input, current_pokemon_state, language, trace, deadline, known_pokemon, session)
+    if plan['path'] == 'blocked':
+        yield domain_blocked_outputs(session, current_pokemon_state, language)
+        return
+
+    if plan['path'] == 'comparison':
+        pokemon1_name, pokemon2_name = plan['names']
+        p1_data, p2_data = plan['pokemon']
+        current_pokemon_state = f"{pokemon1_name} vs {pokemon2_name}" # Update state to reflect comparison
+        with trace.span('render'):
+            comparison_html = create_comparison_html(p1_data, p2_data, show_shiny, language)
+
+        def render_comparison(ai_response):
+            return f"""
+            <div style="padding: 25px; background: rgba(22, 27, 34, 0.9); border-radius: 16px; border: 1px solid rgba(255,255,255,0.1);">
+                <div style="margin-bottom: 25px;">{comparison_html}</div>
+                <div style="color: #c9d1d9; line-height: 1.8; white-space: pre-wrap; padding-top: 20px; border-top: 1px solid rgba(255,255,255,0.05);">{ai_response}</div>
+            </div>
+            """
+
+        yield skip_unchanged_card(session, ('comparison', pokemon1_name, pokemon2_name, bool(show_shiny), language), (
+            gr.update(visible=False), # Hide single sprite
+            f"# {pokemon1_name.capitalize()} vs {pokemon2_name.capitalize()}", 
+            "", "", # Hide single type/stats
+            render_comparison("▌"), # Show comparison, AI response streams in below
+            "", "", "", 
+            current_pokemon_state, # Update state
+            *sidebar_outputs(session, language), "", gr.update(visible=False)
+        ))
+        # Pass None as context since we have custom display
+        with trace.span('llm'):
+            yield from stream_answer(session, user_input, None, "neutral", language, current_pokemon_state, render_comparison, plan['cache_key'], deadline=deadline)
+        return
+
+    pokemon_name, pokemon_data = plan['name'], plan['pokemon']
+    user_sentiment = plan['analysis'].get('sentiment', 'neutral')
     sentiment_color = '#ffcb05'
     if user_sentiment == 'positive': sentiment_color = '#3fb950'
     if user_sentiment == 'frustrated': sentiment_color = '#f85149'
 
-    pokemon_data = None
-    if pokemon_name:
-        pokemon_data = get_pokemon_data(pokemon_name)
-        if pokemon_data:
-            current_pokemon_state = pokemon_name
-            add_to_history(pokemon_name)
-
-    ai_response = get_intelligent_response(user_input, pokemon_data, user_sentiment, language)
-    
-    # NEW: Add to chat display history
-    timestamp = datetime.now().strftime("%H:%M")
-    chat_display_history.append({
-        'timestamp': timestamp,
-        'user': user_input,
-        'assistant': ai_response
-    })
-    if len(chat_display_history) > 50:
-        chat_display_history = chat_display_history[-50:]
+    if pokemon_data:
+        current_pokemon_state = pokemon_name
+        add_to_history(session, pokemon_name)
 
-    answer_html = f'''
+    def render_answer(ai_response):
+        return f"""
     <div style="padding: 25px; background: rgba(22, 27, 34, 0.9); border-radius: 16px; border: 1px solid rgba(255,255,255,0.1);">
         <div style="margin-bottom: 15px; padding-bottom: 10px; border-bottom: 1px solid rgba(255,255,255,0.05); display: flex; justify-content: flex-end; align-items: center; gap: 8px;">
             <span style="color: #8b949e; font-size: 0.8rem;">Mood detected:</span>
@@ -670,81 +3159,198 @@ def chat_response(user_input, show_shiny=False, current_pokemon_state=None, lang
         </div>
         <div style="color: #c9d1d9; line-height: 1.8; white-space: pre-wrap;">{ai_response}</div>
     </div>
-    '''
+    """
 
     if pokemon_data:
-        name = pokemon_data['name'].capitalize()
-        types = [t['type']['name'] for t in pokemon_data['types']]
-        stats = {s['stat']['name']: s['base_stat'] for s in pokemon_data['stats']}
+        name = pokemon_data.name.capitalize()
+        types = pokemon_data.types
+        stats = pokemon_data.stats
         
-        if show_shiny:
-            sprite = pokemon_data['sprites']['other']['official-artwork'].get('front_shiny') or pokemon_data['sprites']['front_default']
-        else:
-            sprite = pokemon_data['sprites']['other']['official-artwork']['front_default'] or pokemon_data['sprites']['front_default']
+        # Local copies once downloaded (gr.Image/gr.Audio then serve them from disk), the upstream URL until then
+        sprite = asset_cache.local_or_remote(pokemon_asset_url(pokemon_data, 'shiny' if show_shiny else 'artwork'))
             
-        type_badges = create_type_badges(types)
-        stats_html = create_stats_html(stats)
-        cry_url = pokemon_data.get('cries', {}).get('latest', '')
+        with trace.span('render'):
+            type_badges = create_type_badges(types)
+            stats_html = create_stats_html(stats)
+            cry_url = asset_cache.local_or_remote(pokemon_asset_url(pokemon_data, 'cry')) or ''
+            matchup_html = create_matchup_html(pokemon_data, language)
         
-        return (
+        # Render the card right away (unless it is already on screen); the answer streams in afterwards
+        yield skip_unchanged_card(session, ('pokemon', pokemon_data.name, bool(show_shiny), language), (
             gr.update(value=sprite, visible=True),
             f"# {name}", 
             type_badges, 
             stats_html, 
-            answer_html,
-            "", "", 
+            render_answer("▌"),
+            gr.update(value=matchup_html, visible=True),
+            "", 
             cry_url, 
             current_pokemon_state,
-            get_history_html(language), 
-            get_favorites_html(language), 
-            get_chat_history_html(language),
+            *sidebar_outputs(session, language),
             '<p style="color: #8b949e;">🔊 Pokémon Cry</p>', 
             gr.update(visible=True)
-        )
+        ))
     else:
-        return (
+        yield skip_unchanged_card(session, ('none', language), (
             gr.update(visible=False), 
             f"# 💬 {TRANSLATIONS[language]['title']}", 
             "", "", 
-            answer_html, 
+            render_answer("▌"), 
             "", "", "", 
             current_pokemon_state, 
-            get_history_html(language), 
-            get_favorites_html(language), 
-            get_chat_history_html(language),
+            *sidebar_outputs(session, language),
             "", 
             gr.update(visible=False)
-        )
-
-def random_pokemon_handler(show_shiny, current_state, language='en'):
-    """Handle random Pokémon button"""
-    random_id = random.randint(1, 898)
+        ))
+
+    verified_context = verified_context_for(plan, user_input, trace, deadline)
+    with trace.span('llm'):
+        yield from stream_answer(session, user_input, pokemon_data, user_sentiment, language, current_pokemon_state, render_answer, plan['cache_key'], verified_context, deadline)
+
+def answer_question(user_input, language='en', session=None, current_pokemon_state=None):
+    """Headless chat_response: the same pipeline (domain check, extraction, fetch, LLM), returning
+    a plain dict instead of UI frames. Used by batch.py.
+
+    'status' is 'ok', 'blocked', 'empty' or 'unavailable' (Gemini busy or failing, the answer is the
+    fallback message); 'state' is the current_pokemon_state for a follow-up question."""
+    session = session or SessionState()
+    trace = metrics.trace()
+    deadline = Deadline(REQUEST_DEADLINE)
+    result = {'question': user_input, 'language': language, 'pokemon': [], 'state': current_pokemon_state}
     try:
-        res = requests.get(f"https://pokeapi.co/api/v2/pokemon/{random_id}")
-        if res.status_code == 200:
-            name = res.json()['name']
-            return chat_response(name, show_shiny, current_state, language)
-    except:
-        pass
-    return chat_response("pikachu", show_shiny, current_state, language)
+        if not user_input.strip():
+            trace.label(path='empty')
+            return dict(result, status='empty', path='empty', answer="Please enter a Pokémon name or question!")
+        plan = plan_request(user_input, current_pokemon_state, language, trace, deadline, session=session)
+        result['path'] = plan['path']
+        if plan['path'] == 'blocked':
+            return dict(result, status='blocked', answer=DOMAIN_MESSAGES[language])
+
+        if plan['path'] == 'comparison':
+            result['pokemon'] = list(plan['names'])
+            result['state'] = f"{plan['names'][0]} vs {plan['names'][1]}"
+            with trace.span('llm'):
+                answer = get_intelligent_response(user_input, None, "neutral", language, session, plan['cache_key'], deadline=deadline)
+        else:
+            if plan['pokemon']:
+                result['pokemon'] = [plan['name']]
+                result['state'] = plan['name']
+            verified_context = verified_context_for(plan, user_input, trace, deadline)
+            with trace.span('llm'):
+                answer = get_intelligent_response(user_input, plan['pokemon'], plan['analysis'].get('sentiment', 'neutral'),
+                                                  language, session, plan['cache_key'], verified_context, deadline)
+        add_chat_display_entry(session, user_input, answer)
+        unavailable = answer in FALLBACK_MESSAGES.values() or answer in BUSY_MESSAGES.values()
+        return dict(result, status='unavailable' if unavailable else 'ok', answer=answer)
+    finally:
+        trace.finish()
+
+
+# ============== RANDOM POKÉMON ==============
+
+RANDOM_POOL_SIZE = int(os.getenv("RANDOM_POOL_SIZE", "4"))
+FALLBACK_DEX_SIZE = 1025  # National Dex size, used when no name index is available
+
+def pick_random_pokemon():
+    """Name (or id) of a random default-form Pokémon from the whole current dex"""
+    index = get_name_index()
+    if index is not None and index['default_forms']:
+        return random.choice(index['default_forms'])
+    return random.randint(1, FALLBACK_DEX_SIZE)
+
+def fetch_random_pokemon(deadline=None, attempts=3):
+    for _ in range(attempts):
+        data = get_pokemon_data(pick_random_pokemon(), deadline)
+        if data:
+            return data
+    return None
 
-def handle_favorite_toggle(pokemon_name, language='en'):
+def prerender_pokemon(data):
+    """Fill the memoized card fragments for data (badges, stats, matchups in every language)
+    and download its artwork and cry into the asset cache"""
+    create_type_badges(data.types)
+    create_stats_html(data.stats)
+    for language in TRANSLATIONS:
+        create_matchup_html(data, language)
+    for variant in ('artwork', 'cry'):
+        url = pokemon_asset_url(data, variant)
+        if url:
+            asset_cache.get(url)
+
+class RandomPool:
+    """A few random Pokémon fetched and pre-rendered ahead of time, so RANDOM shows one at once.
+    Every take() tops the pool back up on the shared fetch pool."""
+
+    def __init__(self, size=RANDOM_POOL_SIZE):
+        self.size = size
+        self.stats = {'served': 0, 'empty': 0}
+        self._ready = deque()
+        self._refilling = False
+        self._lock = threading.Lock()
+
+    def take(self):
+        with self._lock:
+            data = self._ready.popleft() if self._ready else None
+            self.stats['served' if data else 'empty'] += 1
+        self.refill()
+        return data
+
+    def refill(self):
+        if self.size <= 0:
+            return
+        with self._lock:
+            if self._refilling or len(self._ready) >= self.size:
+                return
+            self._refilling = True
+        background_executor.submit(self._fill)
+
+    def _fill(self):
+        failures = 0
+        try:
+            while failures < 3:  # don't keep hammering an upstream that is failing
+                with self._lock:
+                    if len(self._ready) >= self.size:
+                        break
+                data = fetch_random_pokemon(attempts=1)
+                if data is None:
+                    failures += 1
+                    continue
+                prerender_pokemon(data)
+                with self._lock:
+                    self._ready.append(data)
+        except Exception as e:
+            print(f"⚠️ Warning: random Pokémon prefetch failed ({e})")
+        finally:
+            with self._lock:
+                self._refilling = False
+
+random_pool = RandomPool()
+
+def random_pokemon_handler(show_shiny, current_state, language='en', session=None):
+    """Handle random Pokémon button: one record from the prefetched pool (or one fetch), rendered without re-fetching"""
+    data = random_pool.take() or fetch_random_pokemon(Deadline(DATA_DEADLINE))
+    if data:
+        yield from chat_response(data.name, show_shiny, current_state, language, session, known_pokemon=data)
+        return
+    yield from chat_response("pikachu", show_shiny, current_state, language, session)
+
+def handle_favorite_toggle(session, pokemon_name, language='en'):
     if pokemon_name:
-        msg = toggle_favorite(pokemon_name, language)
-        return msg, get_favorites_html(language)
+        msg = toggle_favorite(session, pokemon_name, language)
+        return msg, render_sidebar(session, 'favorites', language)
     no_selection = {
         'en': "No Pokémon selected!",
         'ms': "Tiada Pokémon dipilih!",
         'zh': "未选择宝可梦！"
     }
-    return no_selection[language], get_favorites_html(language)
+    return no_selection[language], render_sidebar(session, 'favorites', language)
 
-def change_language(lang, current_state):
+def change_language(session, lang, current_state):
     """Handle language change"""
     return (
-        get_history_html(lang),
-        get_favorites_html(lang),
-        get_chat_history_html(lang),
+        render_sidebar(session, 'history', lang, force=True),
+        render_sidebar(session, 'favorites', lang, force=True),
+        render_sidebar(session, 'chat', lang, force=True),
         TRANSLATIONS[lang]['placeholder'],
         TRANSLATIONS[lang]['send'],
         TRANSLATIONS[lang]['random'],
@@ -753,177 +3359,480 @@ def change_language(lang, current_state):
         current_state
     )
 
+# ============== JSON API ==============
+
+API_PREFIX = "/v1"
+API_TOKEN = os.getenv("API_TOKEN", "")  # clients send "Authorization: Bearer <API_TOKEN>"; unset, the API is not served
+API_MAX_AGE = int(os.getenv("API_MAX_AGE", "3600"))
+API_BATCH_MAX = int(os.getenv("API_BATCH_MAX", "50"))
+API_BATCH_CONCURRENCY = int(os.getenv("API_BATCH_CONCURRENCY", "8"))
+API_BODY_CACHE_SIZE = 512
+# answer_question statuses that are not a plain 200
+ASK_HTTP_STATUS = {'empty': 400, 'unavailable': 503}
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+@functools.lru_cache(maxsize=2048)
+def api_pokemon_name(name):
+    """Canonical name for a Pokémon named in a URL or request body ("Mr. Mime" -> "mr-mime")"""
+    name = str(name).strip()
+    if name.isdigit():
+        return name
+    names = resolve_pokemon_names(name)
+    return names[0] if names else '-'.join(name.lower().split())
+
+def pokemon_summary(data):
+    """The card as structured data: facts, stats, type matchups, counters and asset URLs"""
+    return {
+        'id': data.id,
+        'name': data.name,
+        'types': list(data.types),
+        'stats': data.stats,
+        'base_stat_total': data.total,
+        'abilities': [{'name': name, 'hidden': hidden} for name, hidden in data.abilities],
+        'height_m': data.height / 10,
+        'weight_kg': data.weight / 10,
+        'matchups': {f"{multiplier:g}": attacking for multiplier, attacking in weakness_table(data.types).items()},
+        'counters': [{'name': name, 'dealt': dealt, 'taken': taken} for name, dealt, taken in best_counters(data.types, exclude=data.name)],
+        'assets': {variant: asset_src(data.name, variant) for variant in ASSET_VARIANTS},
+        'evolution': _evolution_summary(data.species),
+    }
+
+def _evolution_summary(species_name):
+    evolution = evolution_info(species_name)
+    if evolution is None:
+        return None
+    return {
+        'from': dict(zip(('name', 'how'), evolution['from'])) if evolution['from'] else None,
+        'into': [{'name': name, 'how': how} for name, how in evolution['into']],
+        'family': evolution['lines'],
+    }
+
+# name -> (record, evolution index, summary, encoded summary); reused for as long as the cache hands
+# out the same record (and the evolution index has not finished loading in the meantime)
+_summary_cache = OrderedDict()
+_summary_lock = threading.Lock()
+
+def _cached_summary(data):
+    evolution_index = get_evolution_index()
+    with _summary_lock:
+        entry = _summary_cache.get(data.name)
+        if entry is not None and entry[0] is data and entry[1] is evolution_index:
+            _summary_cache.move_to_end(data.name)
+            return entry[2:]
+    summary = pokemon_summary(data)
+    entry = (data, evolution_index, summary, json.dumps(summary, ensure_ascii=False).encode('utf-8'))
+    with _summary_lock:
+        _summary_cache[data.name] = entry
+        while len(_summary_cache) > API_BODY_CACHE_SIZE:
+            _summary_cache.popitem(last=False)
+    return entry[2:]
+
+def _api_record(name):
+    data = get_pokemon_data(api_pokemon_name(name), Deadline(DATA_DEADLINE))
+    if not data:
+        raise ApiError(404, f"unknown Pokémon: {name}")
+    return data
+
+def api_pokemon(name):
+    """GET /v1/pokemon/{name} as (summary dict, encoded body)"""
+    return _cached_summary(_api_record(name))
+
+def api_compare(a, b):
+    """GET /v1/compare?a=&b=: both summaries, stat differences (a - b) and the best STAB multiplier each way"""
+    if not a or not b:
+        raise ApiError(400, "compare needs two Pokémon, a and b")
+    first, second = fetch_concurrently(_api_summary_or_error, a, b)
+    for result in (first, second):
+        if isinstance(result, ApiError):
+            raise result
+
+    def best_hit(attacker, defender):
+        profile = defensive_profile(defender['types'])
+        return max((float(profile[TYPE_INDEX[t]]) for t in attacker['types'] if t in TYPE_INDEX), default=1.0)
+
+    def leader(key):
+        x, y = key(first), key(second)
+        return first['name'] if x > y else second['name'] if y > x else None
+
+    return {
+        'pokemon': [first, second],
+        'stat_difference': {stat: first['stats'][stat] - second['stats'].get(stat, 0) for stat in first['stats']},
+        'effectiveness': {f"{first['name']}_vs_{second['name']}": best_hit(first, second),
+                          f"{second['name']}_vs_{first['name']}": best_hit(second, first)},
+        'faster': leader(lambda p: p['stats'].get('speed', 0)),
+        'higher_total': leader(lambda p: p['base_stat_total']),
+    }
+
+def _api_summary_or_error(name):
+    try:
+        return api_pokemon(name)[0]
+    except ApiError as e:
+        return e
+
+def api_ask(payload):
+    """POST /v1/ask {"question", "language"?, "state"?}: answer_question's result; "state" carries a
+    follow-up's subject ("What are its moves?") over from the previous answer"""
+    question = payload.get('question')
+    language = payload.get('language') or 'en'
+    if not isinstance(question, str):
+        raise ApiError(400, "ask needs a question")
+    if language not in TRANSLATIONS:
+        raise ApiError(400, f"unsupported language: {language}")
+    result = answer_question(question, language, current_pokemon_state=payload.get('state'))
+    return ASK_HTTP_STATUS.get(result['status'], 200), result
+
+def api_call(request_item):
+    """One item of a /v1/batch request -> (HTTP status, body)"""
+    if not isinstance(request_item, dict):
+        return 400, {'error': "batch items are objects with an op"}
+    op = request_item.get('op')
+    try:
+        if op == 'pokemon':
+            return 200, api_pokemon(request_item.get('name', ''))[0]
+        if op == 'compare':
+            return 200, api_compare(request_item.get('a'), request_item.get('b'))
+        if op == 'ask':
+            return api_ask(request_item)
+        return 400, {'error': f"unknown op: {op}"}
+    except ApiError as e:
+        return e.status, {'error': str(e)}
+
+def _api_json(body, status=200, max_age=0):
+    from starlette.responses import Response
+
+    if not isinstance(body, bytes):
+        body = json.dumps(body, ensure_ascii=False).encode('utf-8')
+    cache_control = f"public, max-age={max_age}" if max_age else "no-store"
+    return Response(body, status_code=status, media_type='application/json', headers={'Cache-Control': cache_control})
+
+def _api_denied(request):
+    if not API_TOKEN or not hmac.compare_digest(request.headers.get('authorization', ''), f"Bearer {API_TOKEN}"):
+        return _api_json({'error': 'unauthorized'}, 401)
+    return None
+
+async def _api_payload(request):
+    try:
+        payload = await request.json()
+    except ValueError:
+        raise ApiError(400, "body must be JSON")
+    if not isinstance(payload, dict):
+        raise ApiError(400, "body must be a JSON object")
+    return payload
+
+# The handlers are async and hand the blocking pipeline to the threadpool, so slow upstream
+# calls never hold up the event loop (or the Gradio queue, which these routes bypass)
+
+async def pokemon_endpoint(request):
+    from starlette.concurrency import run_in_threadpool
+
+    if denied := _api_denied(request):
+        return denied
+    try:
+        _, body = await run_in_threadpool(api_pokemon, request.path_params['name'])
+    except ApiError as e:
+        return _api_json({'error': str(e)}, e.status)
+    return _api_json(body, max_age=API_MAX_AGE)
+
+async def compare_endpoint(request):
+    from starlette.concurrency import run_in_threadpool
+
+    if denied := _api_denied(request):
+        return denied
+    try:
+        body = await run_in_threadpool(api_compare, request.query_params.get('a'), request.query_params.get('b'))
+    except ApiError as e:
+        return _api_json({'error': str(e)}, e.status)
+    return _api_json(body, max_age=API_MAX_AGE)
+
+async def ask_endpoint(request):
+    from starlette.concurrency import run_in_threadpool
+
+    if denied := _api_denied(request):
+        return denied
+    try:
+        status, body = await run_in_threadpool(api_ask, await _api_payload(request))
+    except ApiError as e:
+        return _api_json({'error': str(e)}, e.status)
+    return _api_json(body, status)
+
+async def batch_endpoint(request):
+    """POST /v1/batch {"requests": [{"op": "pokemon"|"compare"|"ask", ...}]}: results in request order,
+    API_BATCH_CONCURRENCY of them worked on at once"""
+    import asyncio
+    from starlette.concurrency import run_in_threadpool
+
+    if denied := _api_denied(request):
+        return denied
+    try:
+        items = (await _api_payload(request)).get('requests')
+    except ApiError as e:
+        return _api_json({'error': str(e)}, e.status)
+    if not isinstance(items, list):
+        return _api_json({'error': "batch needs a list of requests"}, 400)
+    if len(items) > API_BATCH_MAX:
+        return _api_json({'error': f"at most {API_BATCH_MAX} requests per batch"}, 413)
+
+    slots = asyncio.Semaphore(API_BATCH_CONCURRENCY)
+
+    async def run(item):
+        async with slots:
+            status, body = await run_in_threadpool(api_call, item)
+        return {'status': status, 'body': body}
+
+    return _api_json({'results': await asyncio.gather(*(run(item) for item in items))})
+
+API_ROUTES = [
+    (API_PREFIX + "/pokemon/{name}", pokemon_endpoint, ['GET']),
+    (API_PREFIX + "/compare", compare_endpoint, ['GET']),
+    (API_PREFIX + "/ask", ask_endpoint, ['POST']),
+    (API_PREFIX + "/batch", batch_endpoint, ['POST']),
+]
+
+# The app is shared publicly, so without a token the API (a Gemini proxy) is not mounted at all
+if API_TOKEN:
+    extra_routes.extend(API_ROUTES)
+
 # ============== BUILD GRADIO UI ==============
 
-with gr.Blocks(title="Pokémon Battle Assistant") as demo:
+def create_demo():
+    """Build the Gradio UI; nothing UI-related is imported or constructed until this is called"""
+    import gradio as gr
+
+    with gr.Blocks(title="Pokémon Battle Assistant") as demo:
     
-    current_pokemon_state = gr.State(None)
-    language_state = gr.State('en')
+        current_pokemon_state = gr.State(None)
+        language_state = gr.State('en')
     
-    gr.HTML("""
-        <style>
-            @import url('https://fonts.googleapis.com/css2?family=Inter:wght@400;500;600;700&display=swap');
+        gr.HTML("""
+            <style>
+                @import url('https://fonts.googleapis.com/css2?family=Inter:wght@400;500;600;700&display=swap');
             
-            .gradio-container { 
-                background: #0d1117 !important;
-                background-image: 
-                    radial-gradient(circle at 20% 80%, rgba(238, 21, 21, 0.08) 0%, transparent 50%),
-                    radial-gradient(circle at 80% 20%, rgba(59, 76, 202, 0.08) 0%, transparent 50%),
-                    radial-gradient(circle at 50% 50%, rgba(255, 203, 5, 0.05) 0%, transparent 60%) !important;
-                font-family: 'Inter', sans-serif !important;
-                min-height: 100vh;
-            }
+                .gradio-container { 
+                    background: #0d1117 !important;
+                    background-image: 
+                        radial-gradient(circle at 20% 80%, rgba(238, 21, 21, 0.08) 0%, transparent 50%),
+                        radial-gradient(circle at 80% 20%, rgba(59, 76, 202, 0.08) 0%, transparent 50%),
+                        radial-gradient(circle at 50% 50%, rgba(255, 203, 5, 0.05) 0%, transparent 60%) !important;
+                    font-family: 'Inter', sans-serif !important;
+                    min-height: 100vh;
+                }
             
-            footer { display: none !important; }
+                footer { display: none !important; }
             
-            .card-section {
-                background: rgba(22, 27, 34, 0.9);
-                border: 1px solid rgba(255, 255, 255, 0.1);
-                border-radius: 16px;
-                padding: 24px;
-                margin-bottom: 16px;
-            }
+                .card-section {
+                    background: rgba(22, 27, 34, 0.9);
+                    border: 1px solid rgba(255, 255, 255, 0.1);
+                    border-radius: 16px;
+                    padding: 24px;
+                    margin-bottom: 16px;
+                }
             
-            .section-header {
-                display: flex;
-                align-items: center;
-                gap: 8px;
-                margin-bottom: 12px;
-                padding-bottom: 8px;
-                border-bottom: 1px solid rgba(255, 255, 255, 0.1);
-            }
+                .section-header {
+                    display: flex;
+                    align-items: center;
+                    gap: 8px;
+                    margin-bottom: 12px;
+                    padding-bottom: 8px;
+                    border-bottom: 1px solid rgba(255, 255, 255, 0.1);
+                }
             
-            audio { width: 100%; margin-top: 10px; }
-        </style>
+                audio { width: 100%; margin-top: 10px; }
+            </style>
         
-        <div style="text-align: center; padding: 40px 20px 30px;">
-            <h1 style="font-size: 2.5rem; font-weight: 700; color: #ffffff; margin-bottom: 8px; letter-spacing: -0.5px;">
-                <span style="color: #ffcb05;">⚡</span> PokéAssistant <span style="color: #ffcb05;">⚡</span>
-            </h1>
-            <p style="color: #8b949e; font-size: 1.05rem;">
-                Your intelligent Pokémon companion • Powered by <span style="color: #f85149;">Gemini AI</span>
-            </p>
-        </div>
-    """)
-    
-    # --- 🎵 MUSIC PLAYER INTEGRATION ---
-    # Make sure 'theme.mp3' exists in your directory
-    music_html = get_bg_music_html("theme.mp3")
-    gr.HTML(music_html)
-    # -----------------------------------
-    
-    # NEW: Improved Language selector using flags
-    with gr.Row():
-        with gr.Column(scale=1):
-            pass
-        with gr.Column(scale=2):
-            with gr.Row():
-                lang_en = gr.Button("🇬🇧", size="sm", variant="secondary")  # Emoji flag
-                lang_ms = gr.Button("🇲🇾", size="sm", variant="secondary")  # Emoji flag
-                lang_zh = gr.Button("🇨🇳", size="sm", variant="secondary")  # Emoji flag
-    
-    with gr.Row(equal_height=False):
-        with gr.Column(scale=1, min_width=300):
-            gr.HTML('''
-                <div class="card-section">
-                    <div class="section-header">
-                        <span style="color: #ffffff; font-weight: 600; font-size: 1.1rem;">Chat with PokéAssistant</span>
+            <div style="text-align: center; padding: 40px 20px 30px;">
+                <h1 style="font-size: 2.5rem; font-weight: 700; color: #ffffff; margin-bottom: 8px; letter-spacing: -0.5px;">
+                    <span style="color: #ffcb05;">⚡</span> PokéAssistant <span style="color: #ffcb05;">⚡</span>
+                </h1>
+                <p style="color: #8b949e; font-size: 1.05rem;">
+                    Your intelligent Pokémon companion • Powered by <span style="color: #f85149;">Gemini AI</span>
+                </p>
+            </div>
+        """)
+    
+        # --- 🎵 MUSIC PLAYER INTEGRATION ---
+        # Make sure 'theme.mp3' exists in your directory
+        music_html = get_bg_music_html(MUSIC_FILE)
+        gr.HTML(music_html)
+        # -----------------------------------
+    
+        # NEW: Improved Language selector using flags
+        with gr.Row():
+            with gr.Column(scale=1):
+                pass
+            with gr.Column(scale=2):
+                with gr.Row():
+                    lang_en = gr.Button("🇬🇧", size="sm", variant="secondary")  # Emoji flag
+                    lang_ms = gr.Button("🇲🇾", size="sm", variant="secondary")  # Emoji flag
+                    lang_zh = gr.Button("🇨🇳", size="sm", variant="secondary")  # Emoji flag
+    
+        with gr.Row(equal_height=False):
+            with gr.Column(scale=1, min_width=300):
+                gr.HTML('''
+                    <div class="card-section">
+                        <div class="section-header">
+                            <span style="color: #ffffff; font-weight: 600; font-size: 1.1rem;">Chat with PokéAssistant</span>
+                        </div>
                     </div>
-                </div>
-            ''')
-            user_input = gr.Textbox(
-                placeholder="Ask me anything! 'Who is Garchomp?', 'What are its moves?', 'Build a team'",
-                label="",
-                show_label=False,
-                container=False,
-                lines=2
-            )
+                ''')
+                user_input = gr.Textbox(
+                    placeholder="Ask me anything! 'Who is Garchomp?', 'What are its moves?', 'Build a team'",
+                    label="",
+                    show_label=False,
+                    container=False,
+                    lines=2
+                )
             
-            with gr.Row():
-                search_btn = gr.Button("SEND", variant="primary", size="lg")
-                random_btn = gr.Button("RANDOM", variant="secondary", size="lg")
+                with gr.Row():
+                    search_btn = gr.Button("SEND", variant="primary", size="lg")
+                    random_btn = gr.Button("RANDOM", variant="secondary", size="lg")
                 
-            shiny_toggle = gr.Checkbox(label="✨ Show Shiny", value=False)
+                shiny_toggle = gr.Checkbox(label="✨ Show Shiny", value=False)
             
-            favorite_btn = gr.Button("❤️ Add to Favorites", variant="secondary", size="sm")
-            favorite_status = gr.Markdown("")
+                favorite_btn = gr.Button("❤️ Add to Favorites", variant="secondary", size="sm")
+                favorite_status = gr.Markdown("")
             
-            gr.HTML('<p style="color: #8b949e; margin: 24px 0 12px; font-size: 0.85rem; font-weight: 500;">📜 RECENT SEARCHES</p>')
-            history_output = gr.HTML(get_history_html('en'))
+                gr.HTML('<p style="color: #8b949e; margin: 24px 0 12px; font-size: 0.85rem; font-weight: 500;">📜 RECENT SEARCHES</p>')
+                history_output = gr.HTML(get_history_html(None, 'en'))
             
-            gr.HTML('<p style="color: #8b949e; margin: 24px 0 12px; font-size: 0.85rem; font-weight: 500;">❤️ FAVORITES</p>')
-            favorites_output = gr.HTML(get_favorites_html('en'))
+                gr.HTML('<p style="color: #8b949e; margin: 24px 0 12px; font-size: 0.85rem; font-weight: 500;">❤️ FAVORITES</p>')
+                favorites_output = gr.HTML(get_favorites_html(None, 'en'))
             
-            # NEW: Chat History Section
-            chat_history_header = gr.HTML('<p style="color: #8b949e; margin: 24px 0 12px; font-size: 0.85rem; font-weight: 500;">💬 CHAT HISTORY</p>')
-            clear_history_btn = gr.Button("🗑️ Clear History", variant="secondary", size="sm")
-            chat_history_output = gr.HTML(get_chat_history_html('en'))
+                # NEW: Chat History Section
+                gr.HTML('<p style="color: #8b949e; margin: 24px 0 12px; font-size: 0.85rem; font-weight: 500;">💬 CHAT HISTORY</p>')
+                clear_history_btn = gr.Button("🗑️ Clear History", variant="secondary", size="sm")
+                chat_history_output = gr.HTML(get_chat_history_html(None, 'en'))
         
-        with gr.Column(scale=2, min_width=500):
-            gr.HTML('''
-                <div class="card-section" style="margin-bottom: 0;">
-                    <div class="section-header">
-                        <span style="font-size: 1.2rem;">📊</span>
-                        <span style="color: #ffffff; font-weight: 600; font-size: 1.1rem;">Assistant Response</span>
+            with gr.Column(scale=2, min_width=500):
+                gr.HTML('''
+                    <div class="card-section" style="margin-bottom: 0;">
+                        <div class="section-header">
+                            <span style="font-size: 1.2rem;">📊</span>
+                            <span style="color: #ffffff; font-weight: 600; font-size: 1.1rem;">Assistant Response</span>
+                        </div>
                     </div>
-                </div>
-            ''')
+                ''')
             
-            with gr.Row(equal_height=True) as pokemon_info_row:
-                sprite_output = gr.Image(label="", show_label=False, height=220, width=220, container=False, visible=False)
-                with gr.Column():
-                    name_output = gr.Markdown("", elem_id="pokemon-name")
-                    type_output = gr.HTML("")
-                    stats_output = gr.HTML("")
+                with gr.Row(equal_height=True):
+                    sprite_output = gr.Image(label="", show_label=False, height=220, width=220, container=False, visible=False)
+                    with gr.Column():
+                        name_output = gr.Markdown("", elem_id="pokemon-name")
+                        type_output = gr.HTML("")
+                        stats_output = gr.HTML("")
             
-            cry_section = gr.HTML('', visible=False)
-            cry_audio = gr.Audio(label="", show_label=False, type="filepath", visible=False)
-            cry_url_hidden = gr.Textbox(visible=False)
+                cry_section = gr.HTML('', visible=False)
+                cry_audio = gr.Audio(label="", show_label=False, type="filepath", visible=False)
+                cry_url_hidden = gr.Textbox(visible=False)
             
-            desc_output = gr.HTML("")
+                desc_output = gr.HTML("")
             
-            counter_output = gr.HTML(visible=False)
-            extra_output = gr.Markdown(visible=False)
-    
-    outputs = [
-        sprite_output, name_output, type_output, stats_output, 
-        desc_output, counter_output, extra_output, 
-        cry_url_hidden, current_pokemon_state, 
-        history_output, favorites_output, chat_history_output,
-        cry_section, cry_audio
-    ]
+                counter_output = gr.HTML(visible=False)
+                extra_output = gr.Markdown(visible=False)
     
-    # Event handlers
-    def chat_with_lang(user_input, show_shiny, current_state, lang):
-        return chat_response(user_input, show_shiny, current_state, lang)
+        outputs = [
+            sprite_output, name_output, type_output, stats_output, 
+            desc_output, counter_output, extra_output, 
+            cry_url_hidden, current_pokemon_state, 
+            history_output, favorites_output, chat_history_output,
+            cry_section, cry_audio
+        ]
     
-    search_btn.click(fn=chat_with_lang, inputs=[user_input, shiny_toggle, current_pokemon_state, language_state], outputs=outputs)
-    user_input.submit(fn=chat_with_lang, inputs=[user_input, shiny_toggle, current_pokemon_state, language_state], outputs=outputs)
+        # Event handlers (gr.Request identifies the browser session)
+        def chat_with_lang(user_input, show_shiny, current_state, lang, request: gr.Request):
+            session = get_session(request)
+            try:
+                yield from chat_response(user_input, show_shiny, current_state, lang, session)
+            finally:
+                session_store.save(session)
     
-    random_btn.click(fn=random_pokemon_handler, inputs=[shiny_toggle, current_pokemon_state, language_state], outputs=outputs)
+        def random_with_session(show_shiny, current_state, lang, request: gr.Request):
+            session = get_session(request)
+            try:
+                yield from random_pokemon_handler(show_shiny, current_state, lang, session)
+            finally:
+                session_store.save(session)
     
-    favorite_btn.click(fn=handle_favorite_toggle, inputs=[current_pokemon_state, language_state], outputs=[favorite_status, favorites_output])
+        def favorite_with_session(pokemon_name, lang, request: gr.Request):
+            session = get_session(request)
+            result = handle_favorite_toggle(session, pokemon_name, lang)
+            session_store.save(session)
+            return result
     
-    # NEW: Clear history button
-    clear_history_btn.click(fn=clear_chat_history, inputs=[language_state], outputs=[chat_history_output, favorite_status])
+        def clear_with_session(lang, request: gr.Request):
+            session = get_session(request)
+            result = clear_chat_history(session, lang)
+            session_store.save(session)
+            return result
     
-    # Language switching
-    def set_language(lang, current_state):
-        result = change_language(lang, current_state)
-        return result + (lang,)
+        # The chat handlers share one concurrency limit, so a burst of questions cannot starve the light handlers
+        chat_queue = dict(concurrency_limit=CHAT_CONCURRENCY, concurrency_id='chat')
+        search_btn.click(fn=chat_with_lang, inputs=[user_input, shiny_toggle, current_pokemon_state, language_state], outputs=outputs, **chat_queue)
+        user_input.submit(fn=chat_with_lang, inputs=[user_input, shiny_toggle, current_pokemon_state, language_state], outputs=outputs, **chat_queue)
     
-    lang_outputs = [history_output, favorites_output, chat_history_output, user_input, search_btn, random_btn, shiny_toggle, favorite_btn, current_pokemon_state, language_state]
+        random_btn.click(fn=random_with_session, inputs=[shiny_toggle, current_pokemon_state, language_state], outputs=outputs, **chat_queue)
     
-    lang_en.click(fn=lambda cs: set_language('en', cs), inputs=[current_pokemon_state], outputs=lang_outputs)
-    lang_ms.click(fn=lambda cs: set_language('ms', cs), inputs=[current_pokemon_state], outputs=lang_outputs)
-    lang_zh.click(fn=lambda cs: set_language('zh', cs), inputs=[current_pokemon_state], outputs=lang_outputs)
+        favorite_btn.click(fn=favorite_with_session, inputs=[current_pokemon_state, language_state], outputs=[favorite_status, favorites_output])
     
-    def update_cry(url):
-        if url and url.startswith('http'):
-            return url
-        return None
+        # NEW: Clear history button
+        clear_history_btn.click(fn=clear_with_session, inputs=[language_state], outputs=[chat_history_output, favorite_status])
+    
+        # Language switching
+        def set_language(lang, current_state, request):
+            result = change_language(get_session(request), lang, current_state)
+            return result + (lang,)
+    
+        def set_english(current_state, request: gr.Request):
+            return set_language('en', current_state, request)
     
-    cry_url_hidden.change(fn=update_cry, inputs=[cry_url_hidden], outputs=[cry_audio])
+        def set_malay(current_state, request: gr.Request):
+            return set_language('ms', current_state, request)
+    
+        def set_chinese(current_state, request: gr.Request):
+            return set_language('zh', current_state, request)
+    
+        lang_outputs = [history_output, favorites_output, chat_history_output, user_input, search_btn, random_btn, shiny_toggle, favorite_btn, current_pokemon_state, language_state]
+    
+        lang_en.click(fn=set_english, inputs=[current_pokemon_state], outputs=lang_outputs)
+        lang_ms.click(fn=set_malay, inputs=[current_pokemon_state], outputs=lang_outputs)
+        lang_zh.click(fn=set_chinese, inputs=[current_pokemon_state], outputs=lang_outputs)
+    
+        def update_cry(url):
+            # Remote cry URL, or the local copy from the asset cache
+            if url and (url.startswith('http') or os.path.isfile(url)):
+                return url
+            return None
+    
+        cry_url_hidden.change(fn=update_cry, inputs=[cry_url_hidden], outputs=[cry_audio])
+
+        # A reload (or a second tab) picks the browser's saved session back up
+        def restore_session(request: gr.Request):
+            return sidebar_outputs(get_session(request))
+
+        demo.load(fn=restore_session, outputs=[history_output, favorites_output, chat_history_output])
+
+    return demo
+
+_demo = None
+
+def __getattr__(name):
+    # `main.demo` (e.g. for the gradio CLI or Spaces) builds the UI on first access
+    global _demo
+    if name == 'demo':
+        if _demo is None:
+            _demo = create_demo()
+        return _demo
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 if __name__ == "__main__":
-    demo.launch(share=True)
\ No newline at end of file
+    get_genai()  # Fail fast on a missing GEMINI_API_KEY
+    get_name_index()  # Load (or build once) before the first question arrives
+    get_evolution_index()  # Downloaded in the background if there is neither a file nor a snapshot
+    random_pool.refill()
+    # State is per session now, so handlers can safely run concurrently
+    demo = create_demo()
+    demo.queue(default_concurrency_limit=QUEUE_CONCURRENCY, max_size=QUEUE_MAX_SIZE)
+    demo.launch(share=True, allowed_paths=[ASSET_DIR],
+                app_kwargs={"routes": get_extra_routes(), "middleware": get_app_middleware()})
\ No newline at end of file
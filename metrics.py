@@ -0,0 +1,269 @@
+"""
+Minimal in-process metrics: counters, gauges, histograms and stage spans, rendered in the
+Prometheus text exposition format.
+
+Everything is off unless METRICS_ENABLED=1. When it is off, counters and histograms
+return immediately, `timed` hands back the undecorated function and `span` / `trace`
+return shared no-op objects, so instrumented code pays next to nothing.
+
+    import metrics
+    FETCHES = metrics.counter('app_fetches_total', 'Fetches by outcome', ('outcome',))
+    FETCHES.inc(outcome='ok')
+
+    @metrics.timed('fetch')            # pokeassistant_stage_seconds{stage="fetch"}
+    def fetch(...): ...
+
+    trace = metrics.trace()            # per-request breakdown of stages
+    with trace.span('render'): ...
+    trace.label(path='single')
+    trace.finish()                     # pokeassistant_request_seconds{path="single"}, logs slow requests
+"""
+
+import functools
+import json
+import math
+import os
+import threading
+import time
+from contextlib import nullcontext
+
+ENABLED = os.getenv("METRICS_ENABLED", "0") == "1"
+SLOW_REQUEST_SECONDS = float(os.getenv("METRICS_SLOW_REQUEST_SECONDS", "5"))
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_registry = []
+_collectors = []
+_NULL = nullcontext()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+def _number(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# ============== METRIC TYPES ==============
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        if not ENABLED:
+            return
+        key = tuple(str(labels.get(n, '')) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, self.labelnames, key, value) for key, value in sorted(self._values.items())]
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._values = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        if not ENABLED:
+            return
+        key = tuple(str(labels.get(n, '')) for n in self.labelnames)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    row[i] += 1
+                    break
+            row[-2] += value
+            row[-1] += 1
+
+    def samples(self):
+        out = []
+        with self._lock:
+            items = sorted((key, list(row)) for key, row in self._values.items())
+        for key, row in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, row):
+                cumulative += count
+                out.append((self.name + '_bucket', self.labelnames + ('le',), key + (_number(bound),), cumulative))
+            out.append((self.name + '_sum', self.labelnames, key, row[-2]))
+            out.append((self.name + '_count', self.labelnames, key, row[-1]))
+        return out
+
+
+def counter(name, documentation, labelnames=()):
+    metric = Counter(name, documentation, labelnames)
+    _registry.append(metric)
+    return metric
+
+
+def gauge(name, documentation, labelnames=()):
+    metric = Gauge(name, documentation, labelnames)
+    _registry.append(metric)
+    return metric
+
+
+def histogram(name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+    metric = Histogram(name, documentation, labelnames, buckets)
+    _registry.append(metric)
+    return metric
+
+
+def register_collector(fn):
+    """fn() -> [(name, kind, documentation, [(labels dict, value), ...])], called only at scrape time"""
+    _collectors.append(fn)
+    return fn
+
+
+# ============== STAGES ==============
+
+STAGE_SECONDS = histogram('pokeassistant_stage_seconds', 'Time spent in each pipeline stage', ('stage',))
+STAGE_ERRORS = counter('pokeassistant_stage_errors_total', 'Exceptions raised out of a pipeline stage', ('stage',))
+REQUEST_SECONDS = histogram('pokeassistant_request_seconds', 'End-to-end chat request time', ('path',))
+
+
+class _Span:
+    __slots__ = ('stage', 'trace', 'started')
+
+    def __init__(self, stage, trace=None):
+        self.stage = stage
+        self.trace = trace
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.started
+        STAGE_SECONDS.observe(elapsed, stage=self.stage)
+        if exc_type is not None and issubclass(exc_type, Exception):
+            STAGE_ERRORS.inc(stage=self.stage)
+        if self.trace is not None:
+            self.trace.stages[self.stage] = self.trace.stages.get(self.stage, 0.0) + elapsed
+        return False
+
+
+def span(stage):
+    """Context manager timing one stage into pokeassistant_stage_seconds"""
+    return _Span(stage) if ENABLED else _NULL
+
+
+def timed(stage):
+    """Decorator form of span(); returns the function untouched when metrics are off"""
+    def decorate(fn):
+        if not ENABLED:
+            return fn
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _Span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+class Trace:
+    """Stage breakdown of one request; slow requests are logged as one JSON line"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.labels = {}
+
+    def span(self, stage):
+        return _Span(stage, self)
+
+    def label(self, **labels):
+        self.labels.update(labels)
+
+    def finish(self, **labels):
+        labels = dict(self.labels, **labels)
+        total = time.perf_counter() - self.started
+        REQUEST_SECONDS.observe(total, **labels)
+        if total >= SLOW_REQUEST_SECONDS:
+            print(json.dumps({
+                'event': 'slow_request',
+                'total_ms': round(total * 1000, 1),
+                'stages_ms': {k: round(v * 1000, 1) for k, v in self.stages.items()},
+                **labels,
+            }))
+        return total
+
+
+class _NullTrace:
+    stages = {}
+    labels = {}
+
+    def span(self, stage):
+        return _NULL
+
+    def label(self, **labels):
+        pass
+
+    def finish(self, **labels):
+        return 0.0
+
+
+_NULL_TRACE = _NullTrace()
+
+
+def trace():
+    return Trace() if ENABLED else _NULL_TRACE
+
+
+# ============== EXPOSITION ==============
+
+def render():
+    """All metrics and collector output in the Prometheus text format"""
+    lines = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, labelnames, values, value in metric.samples():
+            lines.append(f"{name}{_labels(labelnames, values)} {_number(value)}")
+    for collect in _collectors:
+        try:
+            families = collect()
+        except Exception as e:
+            lines.append(f"# collector {getattr(collect, '__name__', collect)} failed: {_escape(e)}")
+            continue
+        for name, kind, documentation, samples in families:
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{_labels(labels.keys(), labels.values())} {_number(value)}")
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,230 @@
+"""
+Six-member team optimizer over the whole dex.
+
+A team is scored on super-effective STAB coverage (how many defending types at
+least one member hits for 2x or more), defensive coverage (how many attacking
+types at least one member resists), stacked weaknesses, repeated types and
+average base stats. Teams are grown with a beam search and then polished with
+a swap-one-member local search.
+
+Several searches with different starting anchors run one after another in the
+calling thread, for as long as the time budget lasts; each is a few vectorized
+passes over the dex arrays, so a process pool would cost more in shipping work
+to it than it saves. The winning team is then re-checked against the plain
+type_chart dict by verify_team.
+"""
+
+import time
+
+import numpy as np
+
+TEAM_SIZE = 6
+BEAM_WIDTH = 8
+MAX_SWAP_PASSES = 20
+
+# Score weights
+W_OFFENSE = 1.0      # per defending type hit super-effectively
+W_DEFENSE = 1.0      # per attacking type resisted by at least one member
+W_STACKED = 1.5      # per extra unanswered weakness on the same attacking type
+W_DUPLICATE = 1.0    # per repeated type on the team
+W_STATS = 0.005      # per point of average base stat total
+
+
+# ============== SCORING MODEL ==============
+
+class _Model:
+    """Per-Pokémon coverage vectors derived once from the type matrix and dex arrays"""
+
+    def __init__(self, matrix, types, stats, species, standard):
+        n_types = matrix.shape[0]
+        first, second = types[:, 0], types[:, 1]
+        dual = second >= 0
+        second = np.where(dual, second, first)
+
+        # taken[c, a]: multiplier attacking type a deals to candidate c
+        self.taken = matrix[:, first].T * np.where(dual[:, None], matrix[:, second].T, 1)
+        # offense[c, d]: best STAB multiplier candidate c deals to defending type d
+        self.offense = np.maximum(matrix[first], matrix[second])
+        self.onehot = np.zeros((len(types), n_types), dtype=np.int16)
+        self.onehot[np.arange(len(types)), first] = 1
+        self.onehot[np.arange(len(types))[dual], second[dual]] = 1
+        self.weak = (self.taken > 1).astype(np.int16)
+        self.resist = (self.taken < 1).astype(np.int16)
+        self.bst = stats.sum(axis=1).astype(np.float32)
+        self.species = species
+        self.standard = standard
+        self.n_types = n_types
+
+    def eligible(self, allow_all):
+        return np.ones_like(self.standard) if allow_all else self.standard
+
+    def state(self, members):
+        members = list(members)
+        if not members:
+            zeros = np.zeros(self.n_types, dtype=np.int16)
+            return np.zeros(self.n_types, dtype=np.float32), zeros, zeros, zeros, 0.0
+        return (
+            self.offense[members].max(axis=0),
+            self.weak[members].sum(axis=0),
+            self.resist[members].sum(axis=0),
+            self.onehot[members].sum(axis=0),
+            float(self.bst[members].sum()),
+        )
+
+    def score_extensions(self, members, eligible=None):
+        """Score of `members + [c]` for every candidate c (-inf where c is not eligible)"""
+        offense, weak, resist, type_count, bst = self.state(members)
+        size = len(members) + 1
+
+        new_offense = np.maximum(offense, self.offense)
+        new_weak = weak + self.weak
+        new_resist = resist + self.resist
+        new_types = type_count + self.onehot
+
+        score = (
+            W_OFFENSE * (new_offense >= 2).sum(axis=1)
+            + W_DEFENSE * (new_resist > 0).sum(axis=1)
+            - W_STACKED * np.maximum(new_weak - new_resist - 1, 0).sum(axis=1)
+            - W_DUPLICATE * np.maximum(new_types - 1, 0).sum(axis=1)
+            + W_STATS * (bst + self.bst) / size
+        )
+        if eligible is not None:
+            score[~eligible | np.isin(self.species, self.species[members])] = -np.inf
+        return score
+
+    def score(self, members):
+        return float(self.score_extensions(members[:-1])[members[-1]]) if members else 0.0
+
+
+def _expired(deadline):
+    return deadline is not None and time.perf_counter() >= deadline
+
+def _search(model, seed, locked, allow_all=False, deadline=None):
+    """Beam search from the locked members (plus a seed-dependent anchor), then swap-one local search.
+    Past deadline (a time.perf_counter() value) the team is finished greedily and not polished."""
+    eligible = model.eligible(allow_all)
+    locked = list(locked)
+    start = list(locked)
+    if len(start) < TEAM_SIZE:
+        # Different seeds start from different strong anchors so the workers explore different teams
+        scores = model.score_extensions(start, eligible)
+        ranked = np.argsort(-scores, kind='stable')[:np.isfinite(scores).sum()]
+        if len(ranked):
+            start.append(int(ranked[seed % min(len(ranked), 4 * BEAM_WIDTH)]))
+
+    beam = [(model.score(start), start)]
+    while len(beam[0][1]) < TEAM_SIZE:
+        if _expired(deadline):
+            beam = beam[:1]
+        extended = {}
+        for _, members in beam:
+            scores = model.score_extensions(members, eligible)
+            for c in np.argsort(-scores, kind='stable')[:BEAM_WIDTH]:
+                if not np.isfinite(scores[c]):
+                    break
+                team = members + [int(c)]
+                extended.setdefault(frozenset(team), (float(scores[c]), team))
+        if not extended:
+            break
+        beam = sorted(extended.values(), key=lambda item: -item[0])[:BEAM_WIDTH]
+
+    best_score, best = beam[0]
+    for _ in range(MAX_SWAP_PASSES):
+        improved = False
+        for slot in range(len(locked), len(best)):
+            if _expired(deadline):
+                return best_score, best
+            rest = best[:slot] + best[slot + 1:]
+            scores = model.score_extensions(rest, eligible)
+            c = int(np.argmax(scores))
+            if scores[c] > best_score + 1e-9:
+                best_score, best = float(scores[c]), rest[:slot] + [c] + rest[slot:]
+                improved = True
+        if not improved:
+            break
+    return best_score, best
+
+
+# ============== OPTIMIZER ==============
+
+class TeamOptimizer:
+    """
+    Builds teams from dex arrays:
+      type_chart - {attacking type: {defending type: multiplier}}, used to verify the result
+      matrix   - (T, T) the same chart as a dense array, rows attacking types, in type_order
+      names    - (N,) Pokémon names
+      types    - (N, 2) type indices into the matrix rows, -1 for no second type
+      stats    - (N, 6) base stats
+      species  - (N,) species key, so two forms of the same species are never picked together
+      standard - (N,) bool, candidates allowed by default (e.g. fully evolved, non-legendary)
+    """
+
+    def __init__(self, type_chart, matrix, type_order, names, types, stats, species, standard, searches=4, timeout=0.8):
+        self.type_chart = type_chart
+        self.type_order = tuple(type_order)
+        self.names = [str(n) for n in names]
+        self.row_of = {name: i for i, name in enumerate(self.names)}
+        self.types = np.asarray(types)
+        self.searches = max(searches, 1)
+        self.timeout = timeout
+        # Read-only once built, so concurrent build() calls can share it
+        self._model = _Model(np.asarray(matrix, dtype=np.float32), self.types, np.asarray(stats, dtype=np.float32),
+                             np.asarray(species), np.asarray(standard, dtype=bool))
+
+    def build(self, locked=(), allow_legendary=False):
+        """
+        Best team found within the time budget, with its verified coverage:
+        {'members', 'types', 'score', 'coverage', 'elapsed'}
+        """
+        started = time.perf_counter()
+        locked_rows = [self.row_of[name] for name in locked if name in self.row_of][:TEAM_SIZE]
+        deadline = started + self.timeout
+
+        # The first search always finishes (greedily, once the budget is spent); further anchors only while time is left
+        results = []
+        for seed in range(self.searches):
+            if results and _expired(deadline):
+                break
+            results.append(_search(self._model, seed, locked_rows, allow_legendary, deadline=deadline))
+
+        score, members = max(results, key=lambda item: item[0])
+        member_types = [
+            [self.type_order[t] for t in self.types[row] if t >= 0]
+            for row in members
+        ]
+        return {
+            'members': [self.names[row] for row in members],
+            'types': member_types,
+            'score': score,
+            'coverage': verify_team(member_types, self.type_chart),
+            'elapsed': time.perf_counter() - started,
+        }
+
+
+# ============== VERIFICATION ==============
+
+def verify_team(member_types, type_chart):
+    """
+    Independent coverage check straight from the type_chart dict (no matrix involved):
+      offense_gaps       - defending types no member hits super-effectively with a STAB type
+      defense_gaps       - attacking types no member resists or is immune to
+      stacked_weaknesses - attacking types that hit three or more members super-effectively
+    """
+    all_types = list(type_chart)
+    offense_gaps = [
+        defender for defender in all_types
+        if max(type_chart[t].get(defender, 1) for types in member_types for t in types) < 2
+    ]
+    defense_gaps, stacked = [], []
+    for attacker in all_types:
+        taken = [np.prod([type_chart[attacker].get(t, 1) for t in types]) for types in member_types]
+        if min(taken) >= 1:
+            defense_gaps.append(attacker)
+        if sum(m > 1 for m in taken) >= 3:
+            stacked.append(attacker)
+    return {
+        'offense_gaps': offense_gaps,
+        'defense_gaps': defense_gaps,
+        'stacked_weaknesses': stacked,
+        'covered': not offense_gaps and not defense_gaps,
+    }
@@ -0,0 +1,41 @@
+"""
+Shared fixtures. main.py reads its configuration at import time, so the `main` fixture points it at
+a temporary data dir and the local PokeAPI stand-in from benchmarks/fakes.py before importing it;
+nothing here talks to the real PokeAPI or Gemini.
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from fakes import FakeGenAI, FakePokeAPI  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def pokeapi():
+    with FakePokeAPI() as api:
+        yield api
+
+
+@pytest.fixture(scope='session')
+def main(pokeapi):
+    data_dir = tempfile.mkdtemp(prefix='pokeassistant-tests-')
+    os.environ['POKEAPI_BASE_URL'] = pokeapi.base_url
+    os.environ['POKE_DATA_DIR'] = data_dir
+    os.environ['PREFETCH_ENABLED'] = '0'
+    # The fake answers at once; the limiters would only set the pace (they have tests of their own)
+    os.environ['POKEAPI_RATE'] = '0'
+    os.environ['GEMINI_RPM'] = '0'
+    os.environ.setdefault('GEMINI_API_KEY', 'offline-tests')
+
+    import main
+    main._genai = FakeGenAI()
+    # Built up front, as the benchmark does, rather than downloaded in the background mid-test
+    main.build_evolution_index()
+    return main
@@ -0,0 +1,64 @@
+import pytest
+
+
+@pytest.fixture
+def cache_on(main, monkeypatch):
+    monkeypatch.setattr(main, 'ANSWER_CACHE_ENABLED', True)
+    main.answer_cache.clear()
+
+
+def with_history(main):
+    session = main.SessionState()
+    session.add_exchange("Tell me about pikachu and raichu", "Raichu is what pikachu evolves into.")
+    return session
+
+
+def test_key_ignores_case_and_punctuation(main, cache_on):
+    key = main.answer_cache_key("Pikachu stats?!", ['pikachu'], 'stats', 'en')
+    assert key == main.answer_cache_key("  pikachu STATS ", ['pikachu'], 'stats', 'en')
+    assert key != main.answer_cache_key("Pikachu stats?!", ['pikachu'], 'stats', 'ms')
+    assert key != main.answer_cache_key("Pikachu stats?!", ['raichu'], 'stats', 'en')
+
+
+def test_opt_out(main, monkeypatch):
+    monkeypatch.setattr(main, 'ANSWER_CACHE_ENABLED', False)
+    assert main.answer_cache_key("Pikachu stats", ['pikachu'], 'stats', 'en') is None
+
+
+@pytest.mark.parametrize('question', ["What are its moves?", "Tell me more", "", "?!"])
+def test_follow_ups_and_empty_questions_are_not_cached(main, cache_on, question):
+    assert main.answer_cache_key(question, [], 'general', 'en') is None
+
+
+def test_general_question_mid_conversation_is_not_cached(main, cache_on):
+    session = with_history(main)
+    assert main.answer_cache_key("Which is faster?", [], 'general', 'en', session) is None
+    assert main.answer_cache_key("Which is faster?", [], 'general', 'en', main.SessionState()) is not None
+    assert main.answer_cache_key("Is pikachu fast?", ['pikachu'], 'stats', 'en', session) is not None
+
+
+def test_favorites_narrow_the_key(main, cache_on):
+    key = main.answer_cache_key("Build me a team", [], 'team', 'en')
+    session, other = main.SessionState(), main.SessionState()
+    assert main.session_answer_key(key, session) == key
+
+    session.favorites[:] = ['pikachu', 'eevee']
+    other.favorites[:] = ['eevee', 'pikachu']
+    assert main.session_answer_key(key, session) != key
+    assert main.session_answer_key(key, session) == main.session_answer_key(key, other)
+    assert main.session_answer_key(None, session) is None
+
+
+def test_repeat_question_is_answered_from_the_cache(main, cache_on):
+    main._genai.reset_counts()
+    first = main.answer_question("What is the best starter?")
+    second = main.answer_question("what is the best starter")
+    assert second['answer'] == first['answer']
+    assert main._genai.calls['stream'] == 1
+
+
+def test_general_question_in_a_conversation_goes_to_gemini(main, cache_on):
+    main.answer_question("What is the best starter?")
+    main._genai.reset_counts()
+    main.answer_question("What is the best starter?", session=with_history(main))
+    assert main._genai.calls['stream'] == 1
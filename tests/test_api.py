@@ -0,0 +1,85 @@
+import pytest
+
+TOKEN = 'test-token'
+AUTH = {'Authorization': f"Bearer {TOKEN}"}
+
+
+@pytest.fixture
+def client(main, monkeypatch):
+    from starlette.applications import Starlette
+    from starlette.routing import Route
+    from starlette.testclient import TestClient
+
+    monkeypatch.setattr(main, 'API_TOKEN', TOKEN)
+    app = Starlette(routes=[Route(path, endpoint, methods=methods) for path, endpoint, methods in main.API_ROUTES])
+    return TestClient(app)
+
+
+def test_api_is_not_mounted_without_a_token(main):
+    assert main.API_TOKEN == ''
+    mounted = {path for path, _, _ in main.extra_routes}
+    assert not mounted & {path for path, _, _ in main.API_ROUTES}
+
+
+@pytest.mark.parametrize('method, path', [
+    ('GET', '/v1/pokemon/pikachu'),
+    ('GET', '/v1/compare?a=pikachu&b=charizard'),
+    ('POST', '/v1/ask'),
+    ('POST', '/v1/batch'),
+])
+@pytest.mark.parametrize('headers', [{}, {'Authorization': 'Bearer wrong'}, {'Authorization': TOKEN}])
+def test_calls_without_the_token_get_401(client, method, path, headers):
+    res = client.request(method, path, headers=headers, json={'question': 'Who is Pikachu?'})
+    assert res.status_code == 401
+
+
+def test_unset_token_denies_everything(main, client, monkeypatch):
+    monkeypatch.setattr(main, 'API_TOKEN', '')
+    assert client.get('/v1/pokemon/pikachu', headers={'Authorization': 'Bearer '}).status_code == 401
+
+
+def test_compare_shape(client):
+    res = client.get('/v1/compare?a=pikachu&b=charizard', headers=AUTH)
+    assert res.status_code == 200
+    body = res.json()
+
+    assert set(body) == {'pokemon', 'stat_difference', 'effectiveness', 'faster', 'higher_total'}
+    first, second = body['pokemon']
+    assert (first['name'], second['name']) == ('pikachu', 'charizard')
+    assert body['stat_difference'] == {stat: first['stats'][stat] - second['stats'][stat] for stat in first['stats']}
+    assert set(body['effectiveness']) == {'pikachu_vs_charizard', 'charizard_vs_pikachu'}
+    assert body['faster'] in ('pikachu', 'charizard', None)
+    assert body['higher_total'] in ('pikachu', 'charizard', None)
+
+
+@pytest.mark.parametrize('query, status', [('?a=pikachu', 400), ('?a=pikachu&b=missingno', 404)])
+def test_compare_errors(client, query, status):
+    assert client.get('/v1/compare' + query, headers=AUTH).status_code == status
+
+
+def test_batch_over_the_limit_gets_413(main, client, monkeypatch):
+    monkeypatch.setattr(main, 'API_BATCH_MAX', 2)
+    res = client.post('/v1/batch', headers=AUTH, json={'requests': [{'op': 'pokemon', 'name': 'pikachu'}] * 3})
+    assert res.status_code == 413
+
+
+def test_batch_results_keep_request_order(client):
+    res = client.post('/v1/batch', headers=AUTH, json={'requests': [
+        {'op': 'pokemon', 'name': 'pikachu'},
+        {'op': 'teleport'},
+        {'op': 'compare', 'a': 'pikachu', 'b': 'charizard'},
+    ]})
+    assert res.status_code == 200
+    results = res.json()['results']
+    assert [r['status'] for r in results] == [200, 400, 200]
+    assert results[0]['body']['name'] == 'pikachu'
+    assert 'stat_difference' in results[2]['body']
+
+
+@pytest.mark.parametrize('payload', [{'requests': 'pikachu'}, ['pikachu']])
+def test_malformed_batch_gets_400(client, payload):
+    assert client.post('/v1/batch', headers=AUTH, json=payload).status_code == 400
+
+
+def test_ask_needs_a_question(client):
+    assert client.post('/v1/ask', headers=AUTH, json={'language': 'en'}).status_code == 400
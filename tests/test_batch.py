@@ -0,0 +1,53 @@
+import json
+
+import batch
+
+
+def write_lines(path, text):
+    path.write_text(text, encoding='utf-8')
+
+
+def test_checkpoint_skips_a_torn_last_line(tmp_path):
+    out = tmp_path / 'answers.jsonl'
+    write_lines(out, json.dumps({'id': 1, 'status': 'ok'}) + '\n'
+                     + json.dumps({'id': 2, 'status': 'error'}) + '\n'
+                     + '{"id": 3, "status": "o')
+    assert batch.load_checkpoint(str(out)) == {1}
+
+
+def test_checkpoint_of_a_missing_file_is_empty(tmp_path):
+    assert batch.load_checkpoint(str(tmp_path / 'missing.jsonl')) == set()
+
+
+def test_resume_starts_on_a_fresh_line(tmp_path):
+    out = tmp_path / 'answers.jsonl'
+    write_lines(out, json.dumps({'id': 1, 'status': 'ok'}) + '\n{"id": 2, "sta')
+    with batch.open_output(str(out)) as f:
+        f.write(json.dumps({'id': 2, 'status': 'ok'}) + '\n')
+
+    lines = out.read_text(encoding='utf-8').splitlines()
+    assert lines[1] == '{"id": 2, "sta'
+    assert json.loads(lines[2]) == {'id': 2, 'status': 'ok'}
+    assert batch.load_checkpoint(str(out)) == {1, 2}
+
+
+def test_resume_after_a_clean_stop_adds_no_blank_line(tmp_path):
+    out = tmp_path / 'answers.jsonl'
+    write_lines(out, json.dumps({'id': 1, 'status': 'ok'}) + '\n')
+    with batch.open_output(str(out)) as f:
+        f.write(json.dumps({'id': 2, 'status': 'ok'}) + '\n')
+    assert len(out.read_text(encoding='utf-8').splitlines()) == 2
+
+
+def test_restart_truncates(tmp_path):
+    out = tmp_path / 'answers.jsonl'
+    write_lines(out, json.dumps({'id': 1, 'status': 'ok'}) + '\n')
+    with batch.open_output(str(out), restart=True):
+        pass
+    assert out.read_text(encoding='utf-8') == ''
+
+
+def test_answered_ids_are_skipped(tmp_path):
+    lines = ['{"id": 1, "question": "Who is Pikachu?"}', '"What is Eevee?"', 'not json', '{"id": 3}']
+    items = list(batch.read_questions(lines, skip={1}))
+    assert items == [{'question': 'What is Eevee?', 'id': 2}]
@@ -0,0 +1,140 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def test_lru_evicts_least_recently_used(main):
+    cache = main.ResponseCache(max_entries=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1  # 'b' is now the oldest
+    cache.set('c', 3)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert cache.stats['evictions'] == 1
+
+
+def test_expired_entry_is_a_miss(main):
+    cache = main.ResponseCache(ttl=0.05)
+    cache.set('a', 1)
+    assert cache.get('a') == 1
+    time.sleep(0.06)
+
+    assert cache.get('a') is None
+    assert cache.stats['expired'] == 1 and cache.stats['misses'] == 1
+
+
+def test_disk_tier_survives_a_new_instance(main, tmp_path):
+    path = str(tmp_path / 'cache.db')
+    main.ResponseCache(path).set('k', {'id': 25})
+
+    second = main.ResponseCache(path)
+    assert second.get('k') == {'id': 25}
+    assert second.stats['disk_hits'] == 1
+    assert second.get('k') == {'id': 25}
+    assert second.stats['hits'] == 1  # promoted to memory
+
+
+def test_failed_fetch_is_not_cached(main):
+    cache = main.ResponseCache()
+    assert cache.get_or_fetch('k', lambda: None) is None
+    assert cache.get_or_fetch('k', lambda: 'value') == 'value'
+    assert cache.stats['misses'] == 2
+
+
+def test_stale_entry_is_served_within_stale_ttl_only(main):
+    cache = main.ResponseCache(ttl=0.05, stale_ttl=0.1)
+    cache.set('a', 1)
+    time.sleep(0.06)
+    assert cache.get('a') is None
+    assert cache.get('a', allow_stale=True) == 1
+    time.sleep(0.1)
+    assert cache.get('a', allow_stale=True) is None
+
+
+def test_get_or_fetch_serves_stale_and_refreshes_in_background(main):
+    refresh_pool = ThreadPoolExecutor(max_workers=1)
+    cache = main.ResponseCache(ttl=0.05, stale_ttl=60, refresh_executor=refresh_pool)
+    cache.set('a', 'old')
+    time.sleep(0.06)
+
+    fetched = []
+    def fetch():
+        fetched.append(1)
+        return 'new'
+
+    assert cache.get_or_fetch('a', fetch, ttl=60) == 'old'
+    refresh_pool.shutdown(wait=True)
+    assert fetched == [1]
+    assert cache.stats['stale_hits'] == 1 and cache.stats['refreshes'] == 1
+    assert cache.get('a') == 'new'
+
+
+def test_failed_refresh_keeps_the_stale_value(main):
+    refresh_pool = ThreadPoolExecutor(max_workers=1)
+    cache = main.ResponseCache(ttl=0.05, stale_ttl=60, refresh_executor=refresh_pool)
+    cache.set('a', 'old')
+    time.sleep(0.06)
+
+    def fetch():
+        raise ConnectionError("upstream down")
+
+    assert cache.get_or_fetch('a', fetch) == 'old'
+    refresh_pool.shutdown(wait=True)
+    assert cache.stats['refresh_errors'] == 1
+    assert cache.get('a', allow_stale=True) == 'old'
+
+
+def test_concurrent_misses_share_one_fetch(main):
+    cache = main.ResponseCache()
+    release = threading.Event()
+    calls = []
+    def fetch():
+        calls.append(1)
+        release.wait(2)
+        return 'value'
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_fetch('k', fetch))) for _ in range(5)]
+    for t in threads:
+        t.start()
+    wait_for(lambda: cache.stats['coalesced'] == 4)
+    release.set()
+    for t in threads:
+        t.join(2)
+
+    assert calls == [1]
+    assert results == ['value'] * 5
+    assert cache.stats['misses'] == 1
+
+
+def test_disk_tier_round_trips_through_encode_and_decode(main, tmp_path):
+    path = str(tmp_path / 'cache.db')
+    main.ResponseCache(path, encode=list, decode=tuple).set('k', (1, 2))
+
+    second = main.ResponseCache(path, encode=list, decode=tuple)
+    assert second.get('k') == (1, 2)
+
+
+def test_migrate_runs_once_per_database(main, tmp_path):
+    path = str(tmp_path / 'cache.db')
+    runs = []
+    main.ResponseCache(path).migrate(1, lambda: runs.append(1))
+    main.ResponseCache(path).migrate(1, lambda: runs.append(1))
+    assert runs == [1]
+
+
+def test_len_counts_entries_in_memory(main):
+    cache = main.ResponseCache(max_entries=2)
+    for key in 'abc':
+        cache.set(key, key)
+    assert len(cache) == 2
+    assert main.get_cache_stats(cache)['size'] == 2
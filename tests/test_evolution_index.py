@@ -0,0 +1,34 @@
+import pytest
+
+
+@pytest.fixture(scope='module')
+def index(main, tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('evolution') / 'evolution_graph.json')
+    return main._compile_evolution_index(main.build_evolution_index(path))
+
+
+def test_middle_of_a_line(main, index):
+    # The fakes chain ids in threes: 25 -> 26 -> 27
+    info = main.evolution_info('raichu', index)
+    assert info['from'] == ('pikachu', 'level 16')
+    assert info['into'] == [('fakemon27', 'level 32')]
+    assert info['lines'] == ['pikachu → raichu → fakemon27']
+
+
+def test_first_and_last_stage(main, index):
+    first = main.evolution_info('charmander', index)
+    assert first['from'] is None
+    assert [name for name, _ in first['into']] == ['fakemon5']
+
+    last = main.evolution_info('charizard', index)
+    assert last['from'][0] == 'fakemon5'
+    assert last['into'] == []
+    assert last['lines'] == first['lines'] == ['charmander → fakemon5 → charizard']
+
+
+def test_every_species_is_indexed(index):
+    assert len(index['names']) == 898
+
+
+def test_unknown_species(main, index):
+    assert main.evolution_info('missingno', index) is None
@@ -0,0 +1,74 @@
+import threading
+import time
+
+import pytest
+
+LATENCY = 0.2
+
+
+@pytest.fixture
+def slow_pokeapi(main, pokeapi, monkeypatch):
+    """The fake PokeAPI with LATENCY per response, and a spy on the shared session:
+    the threads that used it and the most requests it had in flight at once"""
+    monkeypatch.setattr(pokeapi, 'latency', LATENCY)
+    session = main.get_http_session()
+    seen = {'threads': set(), 'in_flight': 0, 'peak': 0}
+    lock = threading.Lock()
+    get = session.get
+    def spy(*args, **kwargs):
+        with lock:
+            seen['threads'].add(threading.current_thread().name)
+            seen['in_flight'] += 1
+            seen['peak'] = max(seen['peak'], seen['in_flight'])
+        try:
+            return get(*args, **kwargs)
+        finally:
+            with lock:
+                seen['in_flight'] -= 1
+    monkeypatch.setattr(session, 'get', spy)
+    return seen
+
+
+def test_compare_fetches_both_pokemon_at_once(main, slow_pokeapi):
+    started = time.monotonic()
+    first, second = main.fetch_concurrently(main.get_pokemon_data, 'fakemon301', 'fakemon302')
+    elapsed = time.monotonic() - started
+
+    assert (first.name, second.name) == ('fakemon301', 'fakemon302')  # argument order is kept
+    assert elapsed < 1.75 * LATENCY
+    assert slow_pokeapi['peak'] == 2
+    assert all(name.startswith('fetch') for name in slow_pokeapi['threads'])
+
+
+def test_pair_extraction_checks_candidates_concurrently(main, slow_pokeapi, monkeypatch):
+    monkeypatch.setattr(main, 'get_name_index', lambda: None)  # force the API fallback
+
+    started = time.monotonic()
+    names = main.extract_two_pokemon_names("fakemon303 vs fakemon304")
+    elapsed = time.monotonic() - started
+
+    assert names == ('fakemon303', 'fakemon304')
+    assert elapsed < 1.75 * LATENCY
+    assert slow_pokeapi['peak'] == 2
+
+
+def test_single_argument_runs_inline(main):
+    assert main.fetch_concurrently(lambda _: threading.current_thread(), None) == [threading.current_thread()]
+
+
+def test_session_is_shared_across_threads(main):
+    sessions = main.fetch_concurrently(lambda _: main.get_http_session(), *range(4))
+    assert all(s is main.get_http_session() for s in sessions)
+
+
+def test_busy_background_pool_does_not_hold_up_fetches(main, slow_pokeapi):
+    release = threading.Event()
+    for _ in range(main.BACKGROUND_WORKERS + 2):
+        main.background_executor.submit(release.wait, 5)
+    try:
+        started = time.monotonic()
+        first, second = main.fetch_concurrently(main.get_pokemon_data, 'fakemon305', 'fakemon306')
+        assert first and second
+        assert time.monotonic() - started < 1.75 * LATENCY
+    finally:
+        release.set()
@@ -0,0 +1,40 @@
+def families(main):
+    return {name: samples for name, _, _, samples in main.collect_app_metrics()}
+
+
+def test_app_metrics_read_public_accessors(main, tmp_path, monkeypatch):
+    assets = main.AssetCache(str(tmp_path / 'assets'), max_bytes=1 << 20)
+    assets.add(assets.path_for('http://example.test/a.png'), b'x' * 100)
+    sessions = main.SessionStore()
+    sessions.get('client-a')
+    sessions.get('client-b')
+    monkeypatch.setattr(main, 'asset_cache', assets)
+    monkeypatch.setattr(main, 'session_store', sessions)
+
+    found = families(main)
+    assert found['pokeassistant_asset_cache_bytes'] == [({}, 100)]
+    assert found['pokeassistant_sessions'] == [({}, 2)]
+    assert found['pokeassistant_answer_cache_entries'] == [({}, len(main.answer_cache))]
+
+
+def test_asset_cache_counts_files_already_on_disk(main, tmp_path):
+    directory = tmp_path / 'assets'
+    directory.mkdir()
+    (directory / 'old.png').write_bytes(b'x' * 10)
+    assets = main.AssetCache(str(directory), max_bytes=1 << 20)
+    assert len(assets) == 1
+    assert assets.total_bytes == 10
+
+
+def observations(histogram):
+    return sum(count for name, _, _, count in histogram.samples() if name.endswith('_count'))
+
+
+def test_prompt_size_is_recorded_not_printed(main, monkeypatch, capsys):
+    monkeypatch.setattr(main.metrics, 'ENABLED', True)
+    monkeypatch.setattr(main, 'ANSWER_CACHE_ENABLED', False)
+    before = observations(main.PROMPT_TOKENS)
+
+    main.answer_question("What is the best starter?")
+    assert observations(main.PROMPT_TOKENS) == before + 1
+    assert 'Prompt tokens' not in capsys.readouterr().out
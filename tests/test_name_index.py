@@ -0,0 +1,35 @@
+import pytest
+
+
+class SnapshotListings:
+    """The listing methods of a dex_snapshot reader that get_name_index uses"""
+
+    def pokemon_listing(self):
+        return [('pikachu', 25), ('garchomp', 445)]
+
+    def species_listing(self):
+        return [('pikachu', 25), ('garchomp', 445)]
+
+    def ability_listing(self):
+        return [('rough-skin', 24)]
+
+    def move_listing(self):
+        return [('swords-dance', 14), ('dragon-dance', 349)]
+
+
+@pytest.fixture
+def snapshot_index(main, monkeypatch, tmp_path):
+    monkeypatch.setattr(main, 'offline_dex', SnapshotListings())
+    monkeypatch.setattr(main, 'NAME_INDEX_PATH', str(tmp_path / 'missing.json'))
+    monkeypatch.setattr(main, '_name_index', None)
+    monkeypatch.setattr(main, '_name_index_failed_at', 0)
+    return main.get_name_index()
+
+
+def test_snapshot_index_keeps_move_and_ability_vocabulary(snapshot_index):
+    assert snapshot_index['vocabulary'] == {'swords dance': 'moves', 'dragon dance': 'moves', 'rough skin': 'abilities'}
+    assert snapshot_index['aliases']['garchomp'] == 'garchomp'
+
+
+def test_move_only_question_is_in_domain(main, snapshot_index):
+    assert main.classify_domain("What does swords dance do?") == 'ALLOWED'
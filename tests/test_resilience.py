@@ -0,0 +1,116 @@
+import threading
+import time
+
+import pytest
+
+
+def test_limiter_sheds_when_the_wait_is_too_long(main):
+    limiter = main.RateLimiter('test', rate=1, burst=2, max_concurrent=0, max_wait=0.5)
+    limiter.acquire()
+    limiter.acquire()
+
+    started = time.monotonic()
+    with pytest.raises(main.UpstreamBusy):
+        limiter.acquire()  # next token is ~1 s away
+    assert time.monotonic() - started < 0.1  # shed up front, not after waiting
+    assert limiter.stats == {'admitted': 2, 'shed': 1}
+
+
+def test_limiter_queues_for_a_concurrency_slot(main):
+    limiter = main.RateLimiter('test', rate=0, burst=1, max_concurrent=1, max_wait=2)
+    limiter.acquire()
+    admitted = threading.Event()
+    def second():
+        with limiter:
+            admitted.set()
+    t = threading.Thread(target=second)
+    t.start()
+
+    assert not admitted.wait(0.05)
+    limiter.release()
+    assert admitted.wait(1)
+    t.join(1)
+    assert limiter.stats == {'admitted': 2, 'shed': 0}
+
+
+def test_limiter_sheds_a_slot_wait_past_max_wait(main):
+    limiter = main.RateLimiter('test', rate=0, burst=1, max_concurrent=1, max_wait=0.05)
+    with limiter:
+        with pytest.raises(main.UpstreamBusy):
+            limiter.acquire()
+    assert limiter.in_flight == 0
+    assert limiter.stats['shed'] == 1
+
+
+
+def test_breaker_opens_after_threshold_failures(main):
+    breaker = main.CircuitBreaker('test', failure_threshold=3, reset_timeout=60)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == 'closed'
+    breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    with pytest.raises(main.CircuitOpen):
+        breaker.allow()
+    assert breaker.stats == {'opened': 1, 'rejected': 1}
+
+
+def test_success_resets_the_failure_count(main):
+    breaker = main.CircuitBreaker('test', failure_threshold=2, reset_timeout=60)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == 'closed'
+
+
+def test_half_open_allows_one_trial(main):
+    breaker = main.CircuitBreaker('test', failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+
+    breaker.allow()
+    assert breaker.state == 'half_open'
+    with pytest.raises(main.CircuitOpen):
+        breaker.allow()  # the trial is still out
+
+    breaker.record_success()
+    assert breaker.state == 'closed'
+    breaker.allow()
+
+
+def test_failed_trial_reopens(main):
+    breaker = main.CircuitBreaker('test', failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    assert breaker.stats['opened'] == 2
+    with pytest.raises(main.CircuitOpen):
+        breaker.allow()
+
+
+def test_context_manager_ignores_shed_and_expired_calls(main):
+    breaker = main.CircuitBreaker('test', failure_threshold=1, reset_timeout=60)
+    for exc in (main.UpstreamBusy, main.DeadlineExceeded):
+        with pytest.raises(exc):
+            with breaker:
+                raise exc()
+    assert breaker.state == 'closed'
+
+    with pytest.raises(ConnectionError):
+        with breaker:
+            raise ConnectionError()
+    assert breaker.state == 'open'
+
+
+def test_deadline_stage_never_outlives_the_request(main):
+    deadline = main.Deadline(0.05)
+    assert deadline.stage(10).expires_at == deadline.expires_at
+    assert deadline.timeout(10) <= 0.05
+    time.sleep(0.06)
+    with pytest.raises(main.DeadlineExceeded):
+        deadline.timeout(10)
@@ -0,0 +1,66 @@
+import pytest
+
+
+@pytest.mark.parametrize('header, expected', [
+    ('bytes=0-99', (0, 99)),
+    ('bytes=10-', (10, 999)),
+    ('bytes=-100', (900, 999)),
+    ('bytes=-5000', (0, 999)),  # suffix longer than the file: the whole file
+    ('bytes=990-5000', (990, 999)),  # end clamped to the last byte
+    ('bytes=999-999', (999, 999)),
+    ('items=0-10', None),  # unknown unit
+    ('bytes=0-10,20-30', None),  # multi-range: whole file
+    ('bytes=a-b', None),
+])
+def test_parse_range(main, header, expected):
+    assert main._parse_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize('header', ['bytes=1000-', 'bytes=2000-3000', 'bytes=50-10', 'bytes=-0'])
+def test_parse_range_unsatisfiable(main, header):
+    with pytest.raises(ValueError):
+        main._parse_range(header, 1000)
+
+
+def test_parse_range_empty_file(main):
+    with pytest.raises(ValueError):
+        main._parse_range('bytes=0-', 0)
+
+
+@pytest.fixture
+def client(main, tmp_path):
+    from starlette.applications import Starlette
+    from starlette.routing import Route
+    from starlette.testclient import TestClient
+
+    path = tmp_path / 'theme.mp3'
+    path.write_bytes(bytes(range(256)) * 4)
+    app = Starlette(routes=[Route('/theme.mp3', lambda request: main.static_file_response(request, str(path), 'audio/mpeg'),
+                                  methods=['GET', 'HEAD'])])
+    return TestClient(app)
+
+
+def test_range_request_gets_206(client):
+    res = client.get('/theme.mp3', headers={'Range': 'bytes=256-511'})
+    assert res.status_code == 206
+    assert res.headers['content-range'] == 'bytes 256-511/1024'
+    assert res.headers['content-length'] == '256'
+    assert res.content == bytes(range(256))
+
+
+def test_unsatisfiable_range_gets_416(client):
+    res = client.get('/theme.mp3', headers={'Range': 'bytes=1024-'})
+    assert res.status_code == 416
+    assert res.headers['content-range'] == 'bytes */1024'
+
+
+def test_stale_if_range_gets_the_whole_file(client):
+    res = client.get('/theme.mp3', headers={'Range': 'bytes=0-9', 'If-Range': '"not-the-etag"'})
+    assert res.status_code == 200
+    assert len(res.content) == 1024
+
+
+def test_matching_etag_gets_304(client):
+    etag = client.head('/theme.mp3').headers['etag']
+    res = client.get('/theme.mp3', headers={'If-None-Match': etag})
+    assert res.status_code == 304
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from team_builder import TEAM_SIZE, TeamOptimizer, verify_team
+
+DEX_SIZE = 1100
+
+
+@pytest.fixture(scope='module')
+def dex(main):
+    rng = np.random.default_rng(0)
+    n_types = len(main.TYPE_ORDER)
+    types = np.stack([rng.integers(0, n_types, DEX_SIZE), rng.integers(-1, n_types, DEX_SIZE)], axis=1).astype(np.int16)
+    types[types[:, 0] == types[:, 1], 1] = -1
+    return {
+        'names': [f"mon{i}" for i in range(DEX_SIZE)],
+        'types': types,
+        'stats': rng.integers(20, 160, (DEX_SIZE, 6)),
+        'species': np.arange(DEX_SIZE) // 2,  # every species has two forms
+        'standard': rng.random(DEX_SIZE) < 0.7,
+    }
+
+
+def optimizer(main, dex, **kwargs):
+    return TeamOptimizer(main.type_chart, main.get_type_matrix(), main.TYPE_ORDER, dex['names'], dex['types'],
+                         dex['stats'], dex['species'], dex['standard'], **kwargs)
+
+
+def test_team_is_six_standard_members_of_different_species(main, dex):
+    team = optimizer(main, dex).build()
+    rows = [int(name[3:]) for name in team['members']]
+
+    assert len(rows) == TEAM_SIZE
+    assert len({dex['species'][r] for r in rows}) == TEAM_SIZE
+    assert all(dex['standard'][r] for r in rows)
+    assert team['coverage'] == verify_team(team['types'], main.type_chart)
+
+
+def test_locked_member_is_kept(main, dex):
+    team = optimizer(main, dex).build(locked=['mon7'])
+    assert team['members'][0] == 'mon7'
+
+
+def test_spent_budget_still_gives_a_full_team_quickly(main, dex):
+    team = optimizer(main, dex, timeout=0).build()
+    assert len(team['members']) == TEAM_SIZE
+    assert team['elapsed'] < 0.2
+
+
+def test_more_searches_never_score_worse(main, dex):
+    one = optimizer(main, dex, searches=1, timeout=10).build()
+    several = optimizer(main, dex, searches=4, timeout=10).build()
+    assert several['score'] >= one['score']
+
+
+def test_team_context_records_the_build_time(main, dex, monkeypatch, capsys):
+    monkeypatch.setattr(main.metrics, 'ENABLED', True)
+    monkeypatch.setattr(main, 'get_team_optimizer', lambda: optimizer(main, dex))
+    def builds():
+        return sum(count for name, _, _, count in main.TEAM_BUILD_SECONDS.samples() if name.endswith('_count'))
+    before = builds()
+
+    assert main.build_team_context("Build me a team")
+    assert builds() == before + 1
+    assert 'Team optimized' not in capsys.readouterr().out